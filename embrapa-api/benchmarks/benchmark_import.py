@@ -0,0 +1,97 @@
+"""
+Benchmark da carga do /api/data/import-all: linha a linha vs. COPY vs. executemany.
+
+Cada caminho carrega os mesmos registros (preparados a partir dos JSONs em
+data/vitibrasil) numa tabela esvaziada antes da medição, como no import-all,
+dentro de uma transação que é desfeita ao final, portanto o conteúdo do banco
+não é alterado.
+
+Uso (a partir de embrapa-api/, com o banco configurado em .env):
+    python benchmarks/benchmark_import.py
+    python benchmarks/benchmark_import.py --modulos product sales --repeticoes 3
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config.database import engine
+from src.core.services import data_service
+from src.db.repositories.data_repository import copy_into_table, delete_all_from_table, insert_many_into_table
+
+INSERT_FUNCTIONS = {
+    "product": data_service.insert_into_product,
+    "process": data_service.insert_into_process,
+    "sales": data_service.insert_into_sales,
+    "import": data_service.insert_into_import,
+    "export": data_service.insert_into_export,
+}
+
+PREPARE_FUNCTIONS = {
+    "product": data_service.prepare_product_records,
+    "process": data_service.prepare_process_records,
+    "sales": data_service.prepare_sales_records,
+    "import": data_service.prepare_import_records,
+    "export": data_service.prepare_export_records,
+}
+
+
+def _linha_a_linha(conn, module, records):
+    for record in records:
+        INSERT_FUNCTIONS[module](conn, record)
+
+
+def _copy(conn, module, records):
+    copy_into_table(conn, module, records)
+
+
+def _executemany(conn, module, records):
+    insert_many_into_table(conn, module, records)
+
+
+CAMINHOS = {
+    "insert": _linha_a_linha,
+    "copy": _copy,
+    "executemany": _executemany,
+}
+
+
+def medir(module, records, caminho, repeticoes):
+    """Retorna o melhor tempo (s) entre as repetições, sempre com rollback."""
+    melhor = None
+    for _ in range(repeticoes):
+        with engine.connect() as conn:
+            trans = conn.begin()
+            try:
+                delete_all_from_table(module, conn)
+                inicio = time.perf_counter()
+                CAMINHOS[caminho](conn, module, records)
+                decorrido = time.perf_counter() - inicio
+            finally:
+                trans.rollback()
+        melhor = decorrido if melhor is None else min(melhor, decorrido)
+    return melhor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modulos", nargs="+", default=list(data_service.MODULE_FILES), choices=list(data_service.MODULE_FILES))
+    parser.add_argument("--caminhos", nargs="+", default=list(CAMINHOS), choices=list(CAMINHOS))
+    parser.add_argument("--repeticoes", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'módulo':<10}{'caminho':<14}{'linhas':>10}{'tempo (s)':>12}{'linhas/s':>14}{'ganho':>9}")
+    for module in args.modulos:
+        records = PREPARE_FUNCTIONS[module](data_service.load_data(module))
+        base = None
+        for caminho in args.caminhos:
+            tempo = medir(module, records, caminho, args.repeticoes)
+            linhas_s = len(records) / tempo if tempo else float("inf")
+            base = base or linhas_s
+            print(f"{module:<10}{caminho:<14}{len(records):>10}{tempo:>12.3f}{linhas_s:>14,.0f}{linhas_s / base:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark da serialização das páginas do /api/data: caminho padrão do FastAPI
+(jsonable_encoder + json da stdlib) vs. DataJSONResponse (orjson, Decimal nativo).
+
+As páginas são sintéticas, no formato de sales (com quantity_liters Decimal), então
+o benchmark não depende do banco.
+
+Uso (a partir de embrapa-api/):
+    python benchmarks/benchmark_serialization.py
+    python benchmarks/benchmark_serialization.py --tamanhos 100 1000 10000 --repeticoes 20
+"""
+import argparse
+import os
+import sys
+import time
+from decimal import Decimal
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from src.api.responses import DataJSONResponse
+
+
+def montar_pagina(linhas):
+    dados = [
+        {
+            "id": i,
+            "name": f"Produto {i % 40}",
+            "wine_derivative_name": "VINHO DE MESA",
+            "quantity_liters": Decimal(f"{i * 13 % 100000}.{i % 100:02d}"),
+            "year_no": 1970 + i % 54,
+        }
+        for i in range(linhas)
+    ]
+    return {"modulo": "sales", "pagina": 1, "quantidade_por_pagina": linhas, "next_cursor": None, "dados": dados}
+
+
+def _padrao(pagina):
+    return JSONResponse(jsonable_encoder(pagina)).body
+
+
+def _orjson(pagina):
+    return DataJSONResponse(pagina).body
+
+
+CAMINHOS = {
+    "jsonable+json": _padrao,
+    "orjson": _orjson,
+}
+
+
+def medir(funcao, pagina, repeticoes):
+    """Retorna o melhor tempo (s) entre as repetições."""
+    melhor = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao(pagina)
+        decorrido = time.perf_counter() - inicio
+        melhor = decorrido if melhor is None else min(melhor, decorrido)
+    return melhor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanhos", nargs="+", type=int, default=[100, 1000, 10000])
+    parser.add_argument("--repeticoes", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'linhas':>8}{'caminho':>16}{'tempo (ms)':>14}{'páginas/s':>14}{'ganho':>9}")
+    for linhas in args.tamanhos:
+        pagina = montar_pagina(linhas)
+        base = None
+        for nome, funcao in CAMINHOS.items():
+            tempo = medir(funcao, pagina, args.repeticoes)
+            paginas_s = 1 / tempo if tempo else float("inf")
+            base = base or paginas_s
+            print(f"{linhas:>8}{nome:>16}{tempo * 1000:>14.2f}{paginas_s:>14,.0f}{paginas_s / base:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
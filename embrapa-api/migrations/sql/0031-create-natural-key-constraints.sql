@@ -0,0 +1,36 @@
+-- Script para criar as chaves naturais usadas pela importação incremental (upsert)
+
+-- As colunas descritivas se repetem nos dados da Embrapa (ex.: dois blocos TINTAS por ano
+-- no processamento); seq_no numera essas ocorrências na ordem de carga e completa a chave
+
+ALTER TABLE product ADD COLUMN seq_no SMALLINT NOT NULL DEFAULT 1;
+ALTER TABLE process ADD COLUMN seq_no SMALLINT NOT NULL DEFAULT 1;
+ALTER TABLE sales ADD COLUMN seq_no SMALLINT NOT NULL DEFAULT 1;
+ALTER TABLE import ADD COLUMN seq_no SMALLINT NOT NULL DEFAULT 1;
+ALTER TABLE export ADD COLUMN seq_no SMALLINT NOT NULL DEFAULT 1;
+
+UPDATE product t SET seq_no = n.seq_no
+FROM (SELECT id, row_number() OVER (PARTITION BY wine_derivative_name, name, year_no ORDER BY id) AS seq_no FROM product) n
+WHERE t.id = n.id AND n.seq_no > 1;
+
+UPDATE process t SET seq_no = n.seq_no
+FROM (SELECT id, row_number() OVER (PARTITION BY color_name, kind_name, cultivar, year_no ORDER BY id) AS seq_no FROM process) n
+WHERE t.id = n.id AND n.seq_no > 1;
+
+UPDATE sales t SET seq_no = n.seq_no
+FROM (SELECT id, row_number() OVER (PARTITION BY wine_derivative_name, name, year_no ORDER BY id) AS seq_no FROM sales) n
+WHERE t.id = n.id AND n.seq_no > 1;
+
+UPDATE import t SET seq_no = n.seq_no
+FROM (SELECT id, row_number() OVER (PARTITION BY grape_type_name, country, year_no ORDER BY id) AS seq_no FROM import) n
+WHERE t.id = n.id AND n.seq_no > 1;
+
+UPDATE export t SET seq_no = n.seq_no
+FROM (SELECT id, row_number() OVER (PARTITION BY grape_type_name, country, year_no ORDER BY id) AS seq_no FROM export) n
+WHERE t.id = n.id AND n.seq_no > 1;
+
+ALTER TABLE product ADD CONSTRAINT uq_product_natural_key UNIQUE NULLS NOT DISTINCT (wine_derivative_name, name, year_no, seq_no);
+ALTER TABLE process ADD CONSTRAINT uq_process_natural_key UNIQUE NULLS NOT DISTINCT (color_name, kind_name, cultivar, year_no, seq_no);
+ALTER TABLE sales ADD CONSTRAINT uq_sales_natural_key UNIQUE NULLS NOT DISTINCT (wine_derivative_name, name, year_no, seq_no);
+ALTER TABLE import ADD CONSTRAINT uq_import_natural_key UNIQUE NULLS NOT DISTINCT (grape_type_name, country, year_no, seq_no);
+ALTER TABLE export ADD CONSTRAINT uq_export_natural_key UNIQUE NULLS NOT DISTINCT (grape_type_name, country, year_no, seq_no);
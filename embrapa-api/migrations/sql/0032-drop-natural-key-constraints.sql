@@ -0,0 +1,11 @@
+-- Script para remover as chaves naturais da importação incremental
+ALTER TABLE product DROP CONSTRAINT uq_product_natural_key;
+ALTER TABLE process DROP CONSTRAINT uq_process_natural_key;
+ALTER TABLE sales DROP CONSTRAINT uq_sales_natural_key;
+ALTER TABLE import DROP CONSTRAINT uq_import_natural_key;
+ALTER TABLE export DROP CONSTRAINT uq_export_natural_key;
+ALTER TABLE product DROP COLUMN seq_no;
+ALTER TABLE process DROP COLUMN seq_no;
+ALTER TABLE sales DROP COLUMN seq_no;
+ALTER TABLE import DROP COLUMN seq_no;
+ALTER TABLE export DROP COLUMN seq_no;
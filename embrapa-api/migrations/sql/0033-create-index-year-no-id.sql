@@ -0,0 +1,7 @@
+-- Script para criar índices compostos (year_no, id) usados pela paginação por cursor
+-- (WHERE year_no = :year_no AND id > :after_id ORDER BY id LIMIT :limit)
+CREATE INDEX idx_product_year_no_id ON product (year_no, id);
+CREATE INDEX idx_process_year_no_id ON process (year_no, id);
+CREATE INDEX idx_sales_year_no_id ON sales (year_no, id);
+CREATE INDEX idx_import_year_no_id ON import (year_no, id);
+CREATE INDEX idx_export_year_no_id ON export (year_no, id);
@@ -0,0 +1,6 @@
+-- Script para remover os índices compostos (year_no, id)
+DROP INDEX idx_product_year_no_id;
+DROP INDEX idx_process_year_no_id;
+DROP INDEX idx_sales_year_no_id;
+DROP INDEX idx_import_year_no_id;
+DROP INDEX idx_export_year_no_id;
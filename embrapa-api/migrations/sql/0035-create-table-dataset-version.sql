@@ -0,0 +1,9 @@
+-- Versão do conjunto de dados, incrementada a cada /api/data/import-all.
+-- O cache de respostas do /api/data compara esta versão para descartar páginas antigas.
+CREATE TABLE dataset_version (
+    id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+INSERT INTO dataset_version (id, version) VALUES (1, 1);
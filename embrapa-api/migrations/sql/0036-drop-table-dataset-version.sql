@@ -0,0 +1 @@
+DROP TABLE dataset_version;
@@ -0,0 +1,56 @@
+-- Script para criar as materialized views com os totais por ano e categoria de cada módulo
+-- (atualizadas com REFRESH ... CONCURRENTLY após cada /api/data/import-all).
+-- O índice único (NULLS NOT DISTINCT, para incluir year_no nulo) é exigido pelo CONCURRENTLY.
+
+CREATE MATERIALIZED VIEW product_rollup AS
+SELECT year_no,
+       wine_derivative_name,
+       SUM(quantity) AS quantity,
+       COUNT(*) AS count
+FROM product
+GROUP BY year_no, wine_derivative_name;
+
+CREATE UNIQUE INDEX uq_product_rollup ON product_rollup (year_no, wine_derivative_name) NULLS NOT DISTINCT;
+
+CREATE MATERIALIZED VIEW process_rollup AS
+SELECT year_no,
+       color_name,
+       kind_name,
+       SUM(quantity_kg) AS quantity_kg,
+       COUNT(*) AS count
+FROM process
+GROUP BY year_no, color_name, kind_name;
+
+CREATE UNIQUE INDEX uq_process_rollup ON process_rollup (year_no, color_name, kind_name) NULLS NOT DISTINCT;
+
+CREATE MATERIALIZED VIEW sales_rollup AS
+SELECT year_no,
+       wine_derivative_name,
+       SUM(quantity_liters) AS quantity_liters,
+       COUNT(*) AS count
+FROM sales
+GROUP BY year_no, wine_derivative_name;
+
+CREATE UNIQUE INDEX uq_sales_rollup ON sales_rollup (year_no, wine_derivative_name) NULLS NOT DISTINCT;
+
+CREATE MATERIALIZED VIEW import_rollup AS
+SELECT year_no,
+       grape_type_name,
+       SUM(quantity_kg) AS quantity_kg,
+       SUM(value_usd) AS value_usd,
+       COUNT(*) AS count
+FROM import
+GROUP BY year_no, grape_type_name;
+
+CREATE UNIQUE INDEX uq_import_rollup ON import_rollup (year_no, grape_type_name) NULLS NOT DISTINCT;
+
+CREATE MATERIALIZED VIEW export_rollup AS
+SELECT year_no,
+       grape_type_name,
+       SUM(quantity_kg) AS quantity_kg,
+       SUM(value_usd) AS value_usd,
+       COUNT(*) AS count
+FROM export
+GROUP BY year_no, grape_type_name;
+
+CREATE UNIQUE INDEX uq_export_rollup ON export_rollup (year_no, grape_type_name) NULLS NOT DISTINCT;
@@ -0,0 +1,6 @@
+-- Script para remover as materialized views de totais por ano e categoria
+DROP MATERIALIZED VIEW product_rollup;
+DROP MATERIALIZED VIEW process_rollup;
+DROP MATERIALIZED VIEW sales_rollup;
+DROP MATERIALIZED VIEW import_rollup;
+DROP MATERIALIZED VIEW export_rollup;
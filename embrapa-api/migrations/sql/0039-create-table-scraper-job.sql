@@ -0,0 +1,25 @@
+-- Fila e registro dos jobs do scraper, compartilhados entre os workers da API.
+-- Os workers retiram jobs pendentes com SELECT ... FOR UPDATE SKIP LOCKED.
+CREATE TABLE scraper_job (
+    id UUID PRIMARY KEY,
+    status VARCHAR(20) NOT NULL DEFAULT 'pendente'
+        CHECK (status IN ('pendente', 'em_andamento', 'concluído', 'erro', 'cancelado')),
+    dedupe_key VARCHAR(255) NOT NULL,
+    params JSONB NOT NULL DEFAULT '{}',
+    progress REAL NOT NULL DEFAULT 0,
+    result JSONB,
+    error TEXT,
+    cancel_requested BOOLEAN NOT NULL DEFAULT false,
+    worker VARCHAR(255),
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    started_at TIMESTAMPTZ,
+    finished_at TIMESTAMPTZ,
+    heartbeat_at TIMESTAMPTZ
+);
+
+-- No máximo um job ativo por chave: pedidos idênticos simultâneos reaproveitam o mesmo job
+CREATE UNIQUE INDEX uq_scraper_job_active_dedupe_key ON scraper_job (dedupe_key)
+    WHERE status IN ('pendente', 'em_andamento');
+
+CREATE INDEX idx_scraper_job_pending ON scraper_job (created_at) WHERE status = 'pendente';
+CREATE INDEX idx_scraper_job_created_at ON scraper_job (created_at DESC, id);
@@ -0,0 +1 @@
+DROP TABLE scraper_job;
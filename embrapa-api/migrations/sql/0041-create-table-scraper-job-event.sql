@@ -0,0 +1,11 @@
+-- Eventos de progresso dos jobs do scraper (por página: acessada, baixado, normalizado,
+-- convertido), lidos em ordem de id pelo stream SSE /api/scraper/status/{task_id}/stream.
+CREATE TABLE scraper_job_event (
+    id BIGSERIAL PRIMARY KEY,
+    job_id UUID NOT NULL REFERENCES scraper_job (id) ON DELETE CASCADE,
+    stage VARCHAR(30) NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{}',
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX idx_scraper_job_event_job_id_id ON scraper_job_event (job_id, id);
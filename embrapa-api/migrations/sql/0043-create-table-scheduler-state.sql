@@ -0,0 +1,7 @@
+-- Última execução de cada agendamento interno (ex.: atualização periódica dos dados).
+-- Gravada pela réplica líder, eleita por pg_try_advisory_xact_lock a cada verificação.
+CREATE TABLE scheduler_state (
+    name VARCHAR(50) PRIMARY KEY,
+    last_run_at TIMESTAMPTZ NOT NULL,
+    last_job_id UUID
+);
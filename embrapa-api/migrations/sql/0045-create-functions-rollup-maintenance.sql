@@ -0,0 +1,65 @@
+-- Funções de manutenção das materialized views de totais (0037), executadas com o
+-- dono das views ("fiap-embrapa"): o REFRESH e a recriação exigem ser dono da view,
+-- e a aplicação conecta com um papel só de DML. Só aceitam os cinco módulos conhecidos.
+
+CREATE FUNCTION rollup_definition(p_module TEXT, OUT dimensions TEXT, OUT measures TEXT)
+LANGUAGE plpgsql IMMUTABLE
+AS $$
+BEGIN
+    CASE p_module
+        WHEN 'product' THEN
+            dimensions := 'year_no, wine_derivative_name';
+            measures := 'SUM(quantity) AS quantity';
+        WHEN 'process' THEN
+            dimensions := 'year_no, color_name, kind_name';
+            measures := 'SUM(quantity_kg) AS quantity_kg';
+        WHEN 'sales' THEN
+            dimensions := 'year_no, wine_derivative_name';
+            measures := 'SUM(quantity_liters) AS quantity_liters';
+        WHEN 'import', 'export' THEN
+            dimensions := 'year_no, grape_type_name';
+            measures := 'SUM(quantity_kg) AS quantity_kg, SUM(value_usd) AS value_usd';
+        ELSE
+            RAISE EXCEPTION 'Módulo sem materialized view de totais: %', p_module;
+    END CASE;
+END;
+$$;
+
+-- REFRESH ... CONCURRENTLY da view do módulo (leituras não são bloqueadas)
+CREATE FUNCTION refresh_rollup(p_module TEXT)
+RETURNS VOID
+LANGUAGE plpgsql SECURITY DEFINER
+SET search_path FROM CURRENT
+AS $$
+BEGIN
+    PERFORM rollup_definition(p_module);
+    EXECUTE format('REFRESH MATERIALIZED VIEW CONCURRENTLY %I', p_module || '_rollup');
+END;
+$$;
+
+-- Recria (já populada) a view do módulo sobre a tabela atual; usada na troca das
+-- stagings, quando a view antiga ainda aponta para a tabela que será removida
+CREATE FUNCTION rebuild_rollup(p_module TEXT)
+RETURNS VOID
+LANGUAGE plpgsql SECURITY DEFINER
+SET search_path FROM CURRENT
+AS $$
+DECLARE
+    def RECORD;
+    view_name TEXT := p_module || '_rollup';
+BEGIN
+    def := rollup_definition(p_module);
+    EXECUTE format('DROP MATERIALIZED VIEW IF EXISTS %I', view_name);
+    EXECUTE format(
+        'CREATE MATERIALIZED VIEW %I AS SELECT %s, %s, COUNT(*) AS count FROM %I GROUP BY %s',
+        view_name, def.dimensions, def.measures, p_module, def.dimensions
+    );
+    EXECUTE format(
+        'CREATE UNIQUE INDEX %I ON %I (%s) NULLS NOT DISTINCT',
+        'uq_' || view_name, view_name, def.dimensions
+    );
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION refresh_rollup(TEXT), rebuild_rollup(TEXT) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION refresh_rollup(TEXT), rebuild_rollup(TEXT) TO "fiap-embrapa-dml";
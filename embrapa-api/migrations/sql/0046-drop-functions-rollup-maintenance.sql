@@ -0,0 +1,3 @@
+DROP FUNCTION rebuild_rollup(TEXT);
+DROP FUNCTION refresh_rollup(TEXT);
+DROP FUNCTION rollup_definition(TEXT);
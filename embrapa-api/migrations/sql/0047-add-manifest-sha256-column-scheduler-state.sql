@@ -0,0 +1,4 @@
+-- Assinatura (SHA-256) do manifesto do scraper na última importação bem-sucedida da
+-- atualização agendada: a importação roda sempre que o manifesto atual for diferente,
+-- mesmo que a mudança tenha sido baixada por outro job ou que a importação tenha falhado
+ALTER TABLE scheduler_state ADD COLUMN manifest_sha256 VARCHAR(64);
@@ -0,0 +1 @@
+ALTER TABLE scheduler_state DROP COLUMN manifest_sha256;
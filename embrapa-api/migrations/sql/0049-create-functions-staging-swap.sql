@@ -0,0 +1,132 @@
+-- Funções da importação em modo staging, executadas com o dono das tabelas
+-- ("fiap-embrapa"): criar, indexar, trocar e remover tabelas exige CREATE no schema e
+-- ser dono delas, e a aplicação conecta com um papel só de DML. Assim as tabelas
+-- trocadas continuam pertencendo ao dono, como as criadas pelas migrations.
+-- Só aceitam as cinco tabelas de dados.
+
+CREATE FUNCTION staging_check_table(p_table TEXT)
+RETURNS TEXT
+LANGUAGE plpgsql IMMUTABLE
+AS $$
+BEGIN
+    IF p_table NOT IN ('product', 'process', 'sales', 'import', 'export') THEN
+        RAISE EXCEPTION 'Tabela sem importação em staging: %', p_table;
+    END IF;
+    RETURN p_table || '_staging';
+END;
+$$;
+
+-- Cria (ou recria vazia) a staging com a estrutura da tabela real, sem índices, e
+-- com os mesmos privilégios concedidos
+CREATE FUNCTION create_staging_table(p_table TEXT)
+RETURNS TEXT
+LANGUAGE plpgsql SECURITY DEFINER
+SET search_path FROM CURRENT
+AS $$
+DECLARE
+    staging TEXT := staging_check_table(p_table);
+    grant_row RECORD;
+BEGIN
+    EXECUTE format('DROP TABLE IF EXISTS %I', staging);
+    EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', staging, p_table);
+    FOR grant_row IN
+        SELECT g.grantee, g.privilege_type
+        FROM information_schema.role_table_grants g
+        WHERE g.table_name = p_table
+          AND g.table_schema = ANY (current_schemas(false))
+          AND g.grantee <> current_user
+    LOOP
+        EXECUTE format('GRANT %s ON %I TO %I', grant_row.privilege_type, staging, grant_row.grantee);
+    END LOOP;
+    RETURN staging;
+END;
+$$;
+
+-- Cria na staging, já carregada, os índices e constraints da tabela real (com o
+-- sufixo _staging no nome) e atualiza as estatísticas
+CREATE FUNCTION build_staging_indexes(p_table TEXT)
+RETURNS VOID
+LANGUAGE plpgsql SECURITY DEFINER
+SET search_path FROM CURRENT
+AS $$
+DECLARE
+    staging TEXT := staging_check_table(p_table);
+    idx RECORD;
+BEGIN
+    FOR idx IN
+        SELECT i.relname AS name,
+               x.indisunique AS is_unique,
+               substring(pg_get_indexdef(i.oid) FROM ' USING .*$') AS method,
+               pg_get_constraintdef(c.oid) AS constraint_def
+        FROM pg_index x
+        JOIN pg_class i ON i.oid = x.indexrelid
+        LEFT JOIN pg_constraint c ON c.conindid = x.indexrelid AND c.contype IN ('p', 'u')
+        WHERE x.indrelid = p_table::regclass
+        ORDER BY i.relname
+    LOOP
+        IF idx.constraint_def IS NOT NULL THEN
+            EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I %s', staging, idx.name || '_staging', idx.constraint_def);
+        ELSE
+            EXECUTE format(
+                'CREATE %sINDEX %I ON %I%s',
+                CASE WHEN idx.is_unique THEN 'UNIQUE ' ELSE '' END, idx.name || '_staging', staging, idx.method
+            );
+        END IF;
+    END LOOP;
+    EXECUTE format('ANALYZE %I', staging);
+END;
+$$;
+
+-- Troca a tabela real pela staging com RENAME, na transação de quem chamou: a
+-- sequence do id passa para a nova tabela, a view de totais é recriada sobre ela
+-- antes do DROP da antiga e índices/constraints recebem os nomes originais
+CREATE FUNCTION swap_staging_table(p_table TEXT)
+RETURNS VOID
+LANGUAGE plpgsql SECURITY DEFINER
+SET search_path FROM CURRENT
+AS $$
+DECLARE
+    staging TEXT := staging_check_table(p_table);
+    old TEXT := p_table || '_old';
+    seq TEXT := pg_get_serial_sequence(p_table, 'id');
+    idx RECORD;
+BEGIN
+    EXECUTE format('DROP TABLE IF EXISTS %I', old);
+    EXECUTE format('ALTER TABLE %I RENAME TO %I', p_table, old);
+    EXECUTE format('ALTER TABLE %I RENAME TO %I', staging, p_table);
+    IF seq IS NOT NULL THEN
+        EXECUTE format('ALTER SEQUENCE %s OWNED BY %I.id', seq, p_table);
+    END IF;
+    PERFORM rebuild_rollup(p_table);
+    EXECUTE format('DROP TABLE %I', old);
+
+    FOR idx IN
+        SELECT i.relname AS name, c.conname IS NOT NULL AS is_constraint
+        FROM pg_index x
+        JOIN pg_class i ON i.oid = x.indexrelid
+        LEFT JOIN pg_constraint c ON c.conindid = x.indexrelid AND c.contype IN ('p', 'u')
+        WHERE x.indrelid = p_table::regclass AND i.relname LIKE '%\_staging'
+    LOOP
+        IF idx.is_constraint THEN
+            EXECUTE format('ALTER TABLE %I RENAME CONSTRAINT %I TO %I', p_table, idx.name, left(idx.name, -8));
+        ELSE
+            EXECUTE format('ALTER INDEX %I RENAME TO %I', idx.name, left(idx.name, -8));
+        END IF;
+    END LOOP;
+END;
+$$;
+
+CREATE FUNCTION drop_staging_table(p_table TEXT)
+RETURNS VOID
+LANGUAGE plpgsql SECURITY DEFINER
+SET search_path FROM CURRENT
+AS $$
+BEGIN
+    EXECUTE format('DROP TABLE IF EXISTS %I', staging_check_table(p_table));
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION create_staging_table(TEXT), build_staging_indexes(TEXT),
+    swap_staging_table(TEXT), drop_staging_table(TEXT) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION create_staging_table(TEXT), build_staging_indexes(TEXT),
+    swap_staging_table(TEXT), drop_staging_table(TEXT) TO "fiap-embrapa-dml";
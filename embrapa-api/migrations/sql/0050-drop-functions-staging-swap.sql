@@ -0,0 +1,5 @@
+DROP FUNCTION drop_staging_table(TEXT);
+DROP FUNCTION swap_staging_table(TEXT);
+DROP FUNCTION build_staging_indexes(TEXT);
+DROP FUNCTION create_staging_table(TEXT);
+DROP FUNCTION staging_check_table(TEXT);
@@ -0,0 +1,165 @@
+"""
+Compressão das respostas (gzip e, com o pacote brotli instalado, br).
+
+O algoritmo é negociado pelo Accept-Encoding do cliente, na ordem de preferência de
+settings.COMPRESSION_ALGORITHMS. Respostas completas menores que COMPRESSION_MIN_SIZE
+seguem sem compressão; respostas em streaming (exportações) são comprimidas em
+blocos, à medida que são enviadas.
+
+As páginas do /api/data já saem comprimidas do endpoint (com os bytes guardados no
+cache); o middleware não recomprime respostas que já têm Content-Encoding.
+"""
+import gzip
+import zlib
+from src.config.settings import settings
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depende do ambiente
+    brotli = None
+
+# Conteúdos que não se beneficiam de compressão (já comprimidos ou eventos em tempo real)
+NAO_COMPRIMIVEIS = ("application/vnd.apache.parquet", "text/event-stream", "image/", "application/zip", "application/gzip")
+
+
+def algoritmos_disponiveis() -> list:
+    """Algoritmos configurados que podem ser usados neste ambiente, em ordem de preferência."""
+    configurados = [a.strip() for a in settings.COMPRESSION_ALGORITHMS.split(",") if a.strip()]
+    return [a for a in configurados if a == "gzip" or (a == "br" and brotli is not None)]
+
+
+def codificacao_negociada(accept_encoding: str):
+    """Algoritmo a usar para o Accept-Encoding do cliente, ou None (sem compressão)."""
+    aceitos = {}
+    for item in (accept_encoding or "").split(","):
+        nome, _, parametros = item.strip().partition(";")
+        if not nome:
+            continue
+        q = 1.0
+        parametro = parametros.strip()
+        if parametro.startswith("q="):
+            try:
+                q = float(parametro[2:])
+            except ValueError:
+                q = 0.0
+        aceitos[nome.strip().lower()] = q
+    for algoritmo in algoritmos_disponiveis():
+        if aceitos.get(algoritmo, aceitos.get("*", 0.0)) > 0:
+            return algoritmo
+    return None
+
+
+def comprimivel(media_type: str) -> bool:
+    return not (media_type or "").startswith(NAO_COMPRIMIVEIS)
+
+
+def comprimir(corpo: bytes, algoritmo: str) -> bytes:
+    if algoritmo == "br":
+        return brotli.compress(corpo, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(corpo, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+def codificar(corpo: bytes, media_type: str, algoritmo):
+    """
+    Corpo pronto para envio: comprimido com o algoritmo se ele foi negociado e o
+    corpo atingir o tamanho mínimo. Retorna (bytes, algoritmo aplicado ou None).
+    """
+    if algoritmo and len(corpo) >= settings.COMPRESSION_MIN_SIZE and comprimivel(media_type):
+        return comprimir(corpo, algoritmo), algoritmo
+    return corpo, None
+
+
+class _CompressorIncremental:
+    """Compressão em blocos para respostas em streaming; cada bloco sai completo (flush)."""
+
+    def __init__(self, algoritmo: str):
+        self.algoritmo = algoritmo
+        if algoritmo == "br":
+            self._compressor = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def comprimir(self, dados: bytes) -> bytes:
+        if self.algoritmo == "br":
+            return self._compressor.process(dados) + self._compressor.flush()
+        return self._compressor.compress(dados) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finalizar(self) -> bytes:
+        if self.algoritmo == "br":
+            return self._compressor.finish()
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+def _adicionar_vary(headers: list):
+    for i, (nome, valor) in enumerate(headers):
+        if nome.lower() == b"vary":
+            if b"accept-encoding" not in valor.lower():
+                headers[i] = (nome, valor + b", Accept-Encoding")
+            return
+    headers.append((b"vary", b"Accept-Encoding"))
+
+
+class CompressionMiddleware:
+    """Middleware ASGI que comprime as respostas conforme o Accept-Encoding."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        cabecalhos = dict(scope.get("headers") or [])
+        algoritmo = codificacao_negociada(cabecalhos.get(b"accept-encoding", b"").decode("latin-1"))
+        if algoritmo is None:
+            await self.app(scope, receive, send)
+            return
+
+        inicio = None
+        compressor = None
+        repassar = False
+
+        async def enviar(message):
+            nonlocal inicio, compressor, repassar
+            if message["type"] == "http.response.start":
+                inicio = message
+                headers = {k.lower(): v for k, v in message.get("headers", [])}
+                media_type = headers.get(b"content-type", b"").decode("latin-1")
+                repassar = b"content-encoding" in headers or not comprimivel(media_type)
+                if repassar:
+                    await send(message)
+                return
+            if message["type"] != "http.response.body" or repassar:
+                await send(message)
+                return
+
+            corpo = message.get("body", b"")
+            mais = message.get("more_body", False)
+
+            if compressor is None and not mais:
+                # Resposta completa: comprime de uma vez se atingir o tamanho mínimo
+                if len(corpo) < settings.COMPRESSION_MIN_SIZE:
+                    await send(inicio)
+                    await send(message)
+                    return
+                corpo = comprimir(corpo, algoritmo)
+                headers = [(k, v) for k, v in inicio.get("headers", []) if k.lower() != b"content-length"]
+                headers += [(b"content-encoding", algoritmo.encode()), (b"content-length", str(len(corpo)).encode())]
+                _adicionar_vary(headers)
+                await send({**inicio, "headers": headers})
+                await send({"type": "http.response.body", "body": corpo})
+                return
+
+            if compressor is None:
+                # Streaming: o tamanho total não é conhecido, comprime bloco a bloco
+                compressor = _CompressorIncremental(algoritmo)
+                headers = [(k, v) for k, v in inicio.get("headers", []) if k.lower() != b"content-length"]
+                headers.append((b"content-encoding", algoritmo.encode()))
+                _adicionar_vary(headers)
+                await send({**inicio, "headers": headers})
+            dados = compressor.comprimir(corpo) if corpo else b""
+            if not mais:
+                dados += compressor.finalizar()
+            await send({"type": "http.response.body", "body": dados, "more_body": mais})
+
+        await self.app(scope, receive, enviar)
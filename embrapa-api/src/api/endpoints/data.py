@@ -1,26 +1,68 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.engine import Connection
-from src.config.database import get_db
-from src.core.services.data_service import insert_all_data, get_data_by_module
+from sqlalchemy.ext.asyncio import AsyncConnection
+from starlette.concurrency import run_in_threadpool
+from src.api.responses import DataJSONResponse
+from src.config.database import get_db, get_data_db
+from src.config.settings import settings
+from src.core.services.data_service import (
+    IMPORT_MODES,
+    AGGREGATE_FUNCTIONS,
+    insert_all_data,
+    get_module_page,
+    get_module_page_async,
+    get_module_page_etag,
+    get_module_page_etag_async,
+    module_page_key,
+    aggregate_key,
+    aggregate_module,
+    aggregate_module_async,
+    EXPORT_FORMATS,
+    ARROW_FORMATS,
+    export_module,
+    export_module_async,
+    parse_group_by,
+    MODULE_FILES,
+    decode_cursor,
+    next_cursor
+)
+from src.core.services.arrow_service import ARROW_MEDIA_TYPE, PARQUET_MEDIA_TYPE, arrow_available, encode_rows
+from src.core.services.cache_service import data_cache
+from src.api.compression import codificacao_negociada, codificar
+from src.utils.helpers import dumps_json
 from src.core.auth.auth_bearer import get_current_user
 
-router = APIRouter()
+router = APIRouter(default_response_class=DataJSONResponse)
 
 @router.post("/import-all")
-def import_all_data(db: Connection = Depends(get_db), _: str = Depends(get_current_user)):
+def import_all_data(
+    modo: str = Query(
+        None,
+        pattern=f"^({'|'.join(IMPORT_MODES)})$",
+        description="Modo de carga: 'insert' (linha a linha), 'copy' (em lote via COPY), 'staging' (stagings + troca atômica) ou 'incremental' (upsert só do que mudou). Padrão: IMPORT_MODE"
+    ),
+    paralelismo: int = Query(
+        None,
+        ge=1,
+        le=5,
+        description="Quantidade de módulos importados em paralelo. Padrão: IMPORT_PARALLELISM"
+    ),
+    db: Connection = Depends(get_db),
+    _: str = Depends(get_current_user)
+):
     """
     Realiza a importação dos dados presentes nos arquivos (após scrapping) para o banco de dados.
     """
     try:
-        insert_all_data(db)
+        insert_all_data(db, mode=modo, parallelism=paralelismo)
         return {"message": "All data imported successfully."}
     except FileNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
-@router.get("/product")
-def get_product_data(
+def parametros_paginacao(
     ano: int = Query(None, description="Filtrar os dados pelo ano de referência"),
     pagina: int = Query(
         default=1,
@@ -34,152 +76,327 @@ def get_product_data(
         title="Quantidade por página",
         description="Número de itens por página"
     ),
-    db: Connection = Depends(get_db),
-    _: str = Depends(get_current_user)
-):
+    after_id: int = Query(
+        None,
+        ge=0,
+        description="Paginação por cursor: retorna os registros com id maior que este (ignora 'pagina')"
+    ),
+    cursor: str = Query(
+        None,
+        description="Cursor opaco devolvido em 'next_cursor' pela página anterior (ignora 'pagina')"
+    )
+) -> dict:
+    return {
+        "ano": ano,
+        "pagina": pagina,
+        "qtd_por_pagina": qtd_por_pagina,
+        "after_id": after_id,
+        "cursor": cursor
+    }
+
+def etag_corresponde(if_none_match: str, etag: str) -> bool:
+    """Comparação fraca do If-None-Match (lista separada por vírgulas, W/ ou "*")."""
+    if not if_none_match:
+        return False
+    candidatos = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidatos or etag in [c[2:] if c.startswith("W/") else c for c in candidatos]
+
+async def _ler(db, funcao, funcao_async, *args, **kwargs):
+    """
+    Executa a leitura pelo caminho do banco em uso: direto no event loop com a
+    AsyncConnection (asyncpg) ou, no caminho síncrono, numa thread do threadpool.
     """
-    Obtém os dados do módulo de Produção com paginação e filtragem por ano.
+    if isinstance(db, AsyncConnection):
+        return await funcao_async(*args, **kwargs)
+    return await run_in_threadpool(funcao, *args, **kwargs)
+
+def etag_codificado(etag: str, algoritmo: str) -> str:
+    """ETag da representação comprimida: '"v1-abc"' com gzip vira '"v1-abc-gzip"'."""
+    if not algoritmo:
+        return etag
+    return f'{etag[:-1]}-{algoritmo}"'
+
+async def _verificar_etag(request: Request, response: Response, db, key: tuple):
     """
+    Define o ETag da resposta; retorna um 304 se o cliente já tiver essa versão, na
+    representação sem compressão ou na do algoritmo negociado (ETags por codificação,
+    ver _resposta_codificada).
+    """
+    etag = await _ler(db, get_module_page_etag, get_module_page_etag_async, db, key)
+    if etag is None:
+        return None
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    algoritmo = codificacao_negociada(request.headers.get("accept-encoding"))
+    for candidato in dict.fromkeys([etag_codificado(etag, algoritmo), etag]):
+        if etag_corresponde(if_none_match, candidato):
+            headers["ETag"] = candidato
+            headers["Vary"] = ", ".join(filter(None, [response.headers.get("vary"), "Accept-Encoding"]))
+            return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+def _cabecalhos(response: Response) -> dict:
+    """
+    Cabeçalhos definidos no Response injetado (ETag etc.); o FastAPI não os copia
+    quando o endpoint devolve a própria Response.
+    """
+    return {name: response.headers[name] for name in ("etag", "cache-control", "vary") if name in response.headers}
+
+def _resposta_codificada(request: Request, module: str, media_type: str, headers: dict, render) -> Response:
+    """
+    Resposta com o corpo de render() comprimido conforme o Accept-Encoding. Com ETag,
+    os bytes finais vão para o cache (chave ETag + algoritmo), e um hit devolve a
+    resposta sem serializar nem comprimir de novo. O corpo comprimido leva um ETag
+    próprio (sufixo do algoritmo), já que os bytes diferem dos da versão sem compressão.
+    """
+    algoritmo = codificacao_negociada(request.headers.get("accept-encoding"))
+
+    def montar():
+        return codificar(render(), media_type, algoritmo)
+
+    etag = headers.get("etag")
+    corpo, aplicado = data_cache.get_or_encode((module, "encoded", etag, algoritmo), montar) if etag else montar()
+    headers["Vary"] = ", ".join(filter(None, [headers.get("vary"), "Accept-Encoding"]))
+    headers.pop("vary", None)
+    if aplicado:
+        headers["Content-Encoding"] = aplicado
+        if etag:
+            headers["etag"] = etag_codificado(etag, aplicado)
+    return Response(content=corpo, media_type=media_type, headers=headers)
+
+def formato_negociado(accept: str) -> str:
+    """
+    Representação pedida no Accept: "arrow", "parquet" ou "json" (padrão), pelo
+    maior q. Os formatos colunares só valem quando pedidos explicitamente (os
+    curingas application/* e */* contam para o JSON).
+    """
+    aceitos = {}
+    for item in (accept or "").split(","):
+        tipo, *parametros = [parte.strip() for parte in item.split(";")]
+        if not tipo:
+            continue
+        q = 1.0
+        for parametro in parametros:
+            if parametro.startswith("q="):
+                try:
+                    q = float(parametro[2:])
+                except ValueError:
+                    q = 0.0
+        aceitos[tipo.lower()] = q
+    candidatos = [
+        ("arrow", aceitos.get(ARROW_MEDIA_TYPE, 0.0)),
+        ("parquet", aceitos.get(PARQUET_MEDIA_TYPE, 0.0)),
+        ("json", max(aceitos.get(tipo, 0.0) for tipo in ("application/json", "application/*", "*/*"))),
+    ]
+    # Maior q; no empate vale a ordem acima (max devolve o primeiro)
+    formato, q = max(candidatos, key=lambda candidato: candidato[1])
+    return formato if q > 0 else "json"
+
+async def _pagina_do_modulo(module: str, request: Request, response: Response, db, params: dict):
+    """
+    Monta a resposta paginada do módulo: por número de página (OFFSET) ou, quando
+    'after_id'/'cursor' é informado, por cursor (WHERE id > :after_id).
+
+    A resposta leva um ETag forte (versão dos dados + parâmetros); se o cliente
+    enviar o mesmo ETag em If-None-Match, devolve 304 sem consultar os dados.
+    Com Accept Arrow/Parquet, a página é devolvida nesse formato colunar.
+    """
+    formato = formato_negociado(request.headers.get("accept"))
+    if formato != "json" and not arrow_available():
+        raise HTTPException(status_code=406, detail="Formatos Arrow/Parquet indisponíveis: pyarrow não está instalado.")
+    response.headers["Vary"] = "Accept"
+
+    after_id = params["after_id"]
+    if params["cursor"] is not None:
+        if after_id is not None:
+            raise HTTPException(status_code=400, detail="Informe apenas um entre 'after_id' e 'cursor'.")
+        try:
+            after_id = decode_cursor(params["cursor"])
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    qtd_por_pagina = params["qtd_por_pagina"]
+    skip = (params["pagina"] - 1) * qtd_por_pagina if after_id is None else 0
+    key = module_page_key(module, year_no=params["ano"], skip=skip, limit=qtd_por_pagina, after_id=after_id)
+
+    # Cada representação tem o seu ETag
+    etag_key = key if formato == "json" else key + (formato,)
+    not_modified = await _verificar_etag(request, response, db, etag_key)
+    if not_modified is not None:
+        return not_modified
+
     try:
-        skip = (pagina - 1) * qtd_por_pagina
-        data = get_data_by_module("product", db, year_no=ano, skip=skip, limit=qtd_por_pagina)
-        return {
-            "modulo": "product",
-            "pagina": pagina,
-            "quantidade_por_pagina": qtd_por_pagina,
-            "dados": data
-        }
+        data = await _ler(
+            db, get_module_page, get_module_page_async,
+            module, db, year_no=params["ano"], skip=skip, limit=qtd_por_pagina, after_id=after_id
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
+    headers = _cabecalhos(response)
+    if formato != "json":
+        cursor = next_cursor(data, qtd_por_pagina)
+        if cursor:
+            headers["X-Next-Cursor"] = cursor
+        if formato == "parquet":
+            headers["Content-Disposition"] = f'attachment; filename="{module}.parquet"'
+        return _resposta_codificada(
+            request, module, EXPORT_FORMATS[formato], headers, lambda: encode_rows(module, data, formato)
+        )
+
+    body = {"modulo": module}
+    if after_id is None:
+        body["pagina"] = params["pagina"]
+    else:
+        body["after_id"] = after_id
+    body.update({
+        "quantidade_por_pagina": qtd_por_pagina,
+        "next_cursor": next_cursor(data, qtd_por_pagina),
+        "dados": data
+    })
+    return _resposta_codificada(request, module, DataJSONResponse.media_type, headers, lambda: dumps_json(body))
+
+@router.get("/product")
+async def get_product_data(
+    request: Request,
+    response: Response,
+    paginacao: dict = Depends(parametros_paginacao),
+    db: Connection | AsyncConnection = Depends(get_data_db),
+    _: str = Depends(get_current_user)
+):
+    """
+    Obtém os dados do módulo de Produção com paginação (por página ou cursor) e filtragem por ano.
+    """
+    return await _pagina_do_modulo("product", request, response, db, paginacao)
+
 @router.get("/process")
-def get_process_data(
-    ano: int = Query(None, description="Filtrar os dados pelo ano de referência"),
-    pagina: int = Query(
-        default=1,
-        ge=1,
-        title="Página",
-        description="Número da página (começando em 1)"
-    ),
-    qtd_por_pagina: int = Query(
-        default=100,
-        ge=1,
-        title="Quantidade por página",
-        description="Número de itens por página"
-    ),
-    db: Connection = Depends(get_db),
+async def get_process_data(
+    request: Request,
+    response: Response,
+    paginacao: dict = Depends(parametros_paginacao),
+    db: Connection | AsyncConnection = Depends(get_data_db),
     _: str = Depends(get_current_user)
 ):
     """
-    Obtém os dados do módulo de Processamento com paginação e filtragem por ano.
+    Obtém os dados do módulo de Processamento com paginação (por página ou cursor) e filtragem por ano.
     """
-    try:
-        skip = (pagina - 1) * qtd_por_pagina
-        data = get_data_by_module("process", db, year_no=ano, skip=skip, limit=qtd_por_pagina)
-        return {
-            "modulo": "process",
-            "pagina": pagina,
-            "quantidade_por_pagina": qtd_por_pagina,
-            "dados": data
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+    return await _pagina_do_modulo("process", request, response, db, paginacao)
 
 @router.get("/sales")
-def get_sales_data(
-    ano: int = Query(None, description="Filtrar os dados pelo ano de referência"),
-    pagina: int = Query(
-        default=1,
-        ge=1,
-        title="Página",
-        description="Número da página (começando em 1)"
-    ),
-    qtd_por_pagina: int = Query(
-        default=100,
-        ge=1,
-        title="Quantidade por página",
-        description="Número de itens por página"
-    ),
-    db: Connection = Depends(get_db),
+async def get_sales_data(
+    request: Request,
+    response: Response,
+    paginacao: dict = Depends(parametros_paginacao),
+    db: Connection | AsyncConnection = Depends(get_data_db),
     _: str = Depends(get_current_user)
 ):
     """
-    Obtém os dados do módulo de Comercialização com paginação e filtragem por ano.
+    Obtém os dados do módulo de Comercialização com paginação (por página ou cursor) e filtragem por ano.
     """
-    try:
-        skip = (pagina - 1) * qtd_por_pagina
-        data = get_data_by_module("sales", db, year_no=ano, skip=skip, limit=qtd_por_pagina)
-        return {
-            "modulo": "sales",
-            "pagina": pagina,
-            "quantidade_por_pagina": qtd_por_pagina,
-            "dados": data
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+    return await _pagina_do_modulo("sales", request, response, db, paginacao)
 
 @router.get("/import")
-def get_import_data(
-    ano: int = Query(None, description="Filtrar os dados pelo ano de referência"),
-    pagina: int = Query(
-        default=1,
-        ge=1,
-        title="Página",
-        description="Número da página (começando em 1)"
+async def get_import_data(
+    request: Request,
+    response: Response,
+    paginacao: dict = Depends(parametros_paginacao),
+    db: Connection | AsyncConnection = Depends(get_data_db),
+    _: str = Depends(get_current_user)
+):
+    """
+    Obtém os dados do módulo de Importação com paginação (por página ou cursor) e filtragem por ano.
+    """
+    return await _pagina_do_modulo("import", request, response, db, paginacao)
+
+@router.get("/export")
+async def get_export_data(
+    request: Request,
+    response: Response,
+    paginacao: dict = Depends(parametros_paginacao),
+    db: Connection | AsyncConnection = Depends(get_data_db),
+    _: str = Depends(get_current_user)
+):
+    """
+    Obtém os dados do módulo de Exportação com paginação (por página ou cursor) e filtragem por ano.
+    """
+    return await _pagina_do_modulo("export", request, response, db, paginacao)
+
+@router.get("/{module}/aggregate")
+async def get_aggregated_data(
+    request: Request,
+    response: Response,
+    module: str,
+    group_by: str = Query(
+        "year_no",
+        description="Colunas de agrupamento separadas por vírgula (ex.: year_no,wine_derivative_name). Vazio = total geral"
     ),
-    qtd_por_pagina: int = Query(
-        default=100,
-        ge=1,
-        title="Quantidade por página",
-        description="Número de itens por página"
+    agg: str = Query(
+        "sum",
+        pattern=f"^({'|'.join(AGGREGATE_FUNCTIONS)})$",
+        description="Função de agregação: sum, avg, min, max ou count"
     ),
-    db: Connection = Depends(get_db),
+    ano_inicio: int = Query(None, description="Ano inicial (inclusive)"),
+    ano_fim: int = Query(None, description="Ano final (inclusive)"),
+    db: Connection | AsyncConnection = Depends(get_data_db),
     _: str = Depends(get_current_user)
 ):
     """
-    Obtém os dados do módulo de Importação com paginação e filtragem por ano.
+    Obtém totais e séries por ano/categoria do módulo, agregados no banco (GROUP BY).
     """
+    if module not in MODULE_FILES:
+        raise HTTPException(status_code=404, detail=f"Módulo '{module}' não encontrado.")
+    columns = parse_group_by(group_by)
+    key = aggregate_key(module, columns, agg, ano_inicio, ano_fim)
+
+    not_modified = await _verificar_etag(request, response, db, key)
+    if not_modified is not None:
+        return not_modified
+
     try:
-        skip = (pagina - 1) * qtd_por_pagina
-        data = get_data_by_module("import", db, year_no=ano, skip=skip, limit=qtd_por_pagina)
-        return {
-            "modulo": "import",
-            "pagina": pagina,
-            "quantidade_por_pagina": qtd_por_pagina,
-            "dados": data
-        }
+        data = await _ler(
+            db, aggregate_module, aggregate_module_async,
+            module, db, columns, agg=agg, year_from=ano_inicio, year_to=ano_fim
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
-@router.get("/export")
-def get_export_data(
-    ano: int = Query(None, description="Filtrar os dados pelo ano de referência"),
-    pagina: int = Query(
-        default=1,
-        ge=1,
-        title="Página",
-        description="Número da página (começando em 1)"
-    ),
-    qtd_por_pagina: int = Query(
-        default=100,
-        ge=1,
-        title="Quantidade por página",
-        description="Número de itens por página"
+    body = {
+        "modulo": module,
+        "group_by": columns,
+        "agg": agg,
+        "dados": data
+    }
+    return _resposta_codificada(request, module, DataJSONResponse.media_type, _cabecalhos(response), lambda: dumps_json(body))
+
+@router.get("/{module}/export")
+def export_data(
+    module: str,
+    formato: str = Query(
+        "ndjson",
+        alias="format",
+        pattern=f"^({'|'.join(EXPORT_FORMATS)})$",
+        description="Formato da exportação: ndjson (um registro JSON por linha), csv, arrow (IPC stream) ou parquet"
     ),
-    db: Connection = Depends(get_db),
+    ano: int = Query(None, description="Filtrar os dados pelo ano de referência"),
     _: str = Depends(get_current_user)
 ):
     """
-    Obtém os dados do módulo de Exportação com paginação e filtragem por ano.
+    Exporta a tabela inteira do módulo em streaming, lida por cursor no servidor
+    (memória constante, independente do tamanho da tabela).
     """
-    try:
-        skip = (pagina - 1) * qtd_por_pagina
-        data = get_data_by_module("export", db, year_no=ano, skip=skip, limit=qtd_por_pagina)
-        return {
-            "modulo": "export",
-            "pagina": pagina,
-            "quantidade_por_pagina": qtd_por_pagina,
-            "dados": data
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
\ No newline at end of file
+    if module not in MODULE_FILES:
+        raise HTTPException(status_code=404, detail=f"Módulo '{module}' não encontrado.")
+    if formato in ARROW_FORMATS and not arrow_available():
+        raise HTTPException(status_code=406, detail="Formatos Arrow/Parquet indisponíveis: pyarrow não está instalado.")
+    if settings.DB_ASYNC_READS:
+        chunks = export_module_async(module, formato, year_no=ano)
+    else:
+        chunks = export_module(module, formato, year_no=ano)
+    return StreamingResponse(
+        chunks,
+        media_type=EXPORT_FORMATS[formato],
+        headers={"Content-Disposition": f'attachment; filename="{module}.{formato}"'}
+    )
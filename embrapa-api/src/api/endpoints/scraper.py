@@ -1,13 +1,26 @@
-from fastapi import APIRouter, BackgroundTasks, HTTPException
-from typing import Dict, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import Optional
+import asyncio
 import os
 import logging
-import uuid
-from datetime import datetime
-from src.scraper.embrapa_scraper import run_scraper
-from src.tasks.jobs import run_scraper_task_bg
-import concurrent.futures
 import time
+import uuid
+from sqlalchemy.engine import Connection
+from starlette.concurrency import run_in_threadpool
+from src.config.database import get_db
+from src.config.settings import settings
+from src.db.repositories.job_repository import (
+    ACTIVE_STATUSES,
+    FINISHED_STATUSES,
+    cancel_job,
+    get_job,
+    get_job_status,
+    list_job_events,
+    list_jobs
+)
+from src.tasks.jobs import aguardar_job, em_transacao, enfileirar_scraping, no_executor
+from src.utils.helpers import dumps_json
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -15,69 +28,51 @@ logger = logging.getLogger(__name__)
 # Diretório padrão para salvar os dados
 DEFAULT_OUTPUT_DIR = "data/vitibrasil"
 
-# Sistema de rastreamento de tarefas em memória
-task_status = {}
+# Workers do job enfileirado por /executar (sem pausa entre as páginas)
+SINCRONO_WORKERS = 3
 
 @router.get("/executar")
 async def executar_sincrono(output_dir: Optional[str] = DEFAULT_OUTPUT_DIR):
     """
-    Executa o scraping de forma síncrona
+    Executa o scraping e aguarda o resultado.
+
+    O scraping passa pela fila de jobs, como em /executar_async: se já houver um
+    pendente ou em andamento para o mesmo output_dir, aguarda esse job em vez de
+    gravar os mesmos arquivos em paralelo.
     """
     try:
-        os.makedirs(output_dir, exist_ok=True)
-        resultados = run_scraper(output_dir=output_dir)
-        return {
-            "status": "concluído",
-            "resultados": resultados,
-            "output_dir": output_dir
-        }
+        await no_executor(os.makedirs, output_dir, exist_ok=True)
+        task_id, _ = await no_executor(enfileirar_scraping, output_dir, SINCRONO_WORKERS, 0.0)
+        job = await aguardar_job(task_id)
     except Exception as e:
         logger.error(f"Erro na execução síncrona: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    if job["status"] != "concluído":
+        raise HTTPException(status_code=500, detail=job["error"] or f"Tarefa finalizada com status '{job['status']}'")
+    return {
+        "status": "concluído",
+        "task_id": task_id,
+        "resultados": (job["result"] or {}).get("resultados"),
+        "output_dir": output_dir
+    }
 
 @router.get("/executar_async")
-async def executar_async(
-    background_tasks: BackgroundTasks,
+def executar_async(
     output_dir: Optional[str] = DEFAULT_OUTPUT_DIR,
-    workers: Optional[int] = 3,
-    sleep_time: Optional[float] = 1.0
+    workers: Optional[int] = Query(3, ge=1, description="Número de workers simultâneos; as páginas são divididas entre eles"),
+    sleep_time: Optional[float] = Query(1.0, ge=0, description="Tempo de pausa entre as páginas de cada worker (segundos)")
 ):
     """
-    Executa o scraping em background usando BackgroundTasks (assíncrono)
-    
-    - workers: Número de threads paralelas para processamento
-    - sleep_time: Tempo de pausa entre operações (segundos)
+    Enfileira o scraping para execução em background por um dos workers da API.
+
+    Enquanto houver um scraping pendente ou em andamento para o mesmo output_dir,
+    um novo pedido devolve o task_id desse job em vez de criar outro.
     """
     try:
         os.makedirs(output_dir, exist_ok=True)
-        
-        # Cria um ID único para a tarefa
-        task_id = str(uuid.uuid4())
-        
-        # Inicializa o status da tarefa
-        task_status[task_id] = {
-            "task_id": task_id,
-            "status": "pendente",
-            "start_time": datetime.now(),
-            "output_dir": output_dir,
-            "progress": 0,
-            "config": {
-                "workers": workers,
-                "sleep_time": sleep_time
-            }
-        }
-        
-        # Adiciona a tarefa ao background
-        background_tasks.add_task(
-            process_scraper_async, 
-            task_id=task_id, 
-            output_dir=output_dir,
-            workers=workers,
-            sleep_time=sleep_time
-        )
-        
+        task_id, criada = enfileirar_scraping(output_dir, workers, sleep_time)
         return {
-            "status": "tarefa iniciada",
+            "status": "tarefa iniciada" if criada else "tarefa já em andamento",
             "task_id": task_id,
             "output_dir": output_dir,
             "config": {
@@ -89,118 +84,131 @@ async def executar_async(
         logger.error(f"Erro na execução assíncrona: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _tarefa(job: dict, detalhes: bool = True) -> dict:
+    """Representação de um job da tabela scraper_job na API."""
+    params = job["params"] or {}
+    tarefa = {
+        "task_id": job["id"],
+        "status": job["status"],
+        "progress": job["progress"],
+        "output_dir": params.get("output_dir"),
+        "config": {
+            "workers": params.get("workers"),
+            "sleep_time": params.get("sleep_time")
+        },
+        "created_at": job["created_at"],
+        "start_time": job["started_at"],
+        "end_time": job["finished_at"],
+        "cancel_requested": job["cancel_requested"],
+    }
+    if job["error"]:
+        tarefa["error"] = job["error"]
+    if detalhes and job["result"] is not None:
+        tarefa["results"] = job["result"]
+    return tarefa
 
-async def process_scraper_async(
-    task_id: str, 
-    output_dir: str,
-    workers: int = 3,
-    sleep_time: float = 5.0
-):
-    """
-    Processa o scraper de forma assíncrona garantindo sleep entre cada parte processada.
-    
-    Args:
-        task_id (str): Identificador único da tarefa
-        output_dir (str): Diretório onde os dados serão salvos
-        workers (int): Número de workers/partes a serem processadas
-        sleep_time (float): Tempo de espera em segundos entre o processamento de cada parte
-    
-    Returns:
-        dict: Resultado consolidado da operação ou None se ocorrer erro
-    """
+def _id_da_tarefa(task_id: str) -> str:
+    """Valida o task_id (UUID); um id inválido é uma tarefa inexistente (404)."""
     try:
-        # Atualiza status para "em andamento"
-        task_status[task_id] = task_status.get(task_id, {})
-        task_status[task_id]["status"] = "em_andamento"
-        task_status[task_id]["progress"] = 0
-        task_status[task_id]["start_time"] = datetime.now()
-        
-        # Simulando divisão do trabalho em partes
-        parts = [f"parte_{i}" for i in range(workers)]
-        total_parts = len(parts)
-        results = []
-        
-        # Cria diretórios específicos para cada parte
-        part_output_dirs = {part: os.path.join(output_dir, part) for part in parts}
-        for part, part_dir in part_output_dirs.items():
-            os.makedirs(part_dir, exist_ok=True)
-        
-        # Função para processar uma parte específica
-        def process_part(part, part_output_dir):
-            """Processa uma parte do trabalho"""
-            logger.info(f"Processando {part}...")
-            part_result = run_scraper_task_bg(output_dir=part_output_dir)
-            
-            return {
-                "part": part,
-                "result": part_result
-            }
-        
-        # Processa cada parte de forma sequencial, com sleep entre elas
-        completed = 0
-        
-        for part in parts:
-            # Aplica sleep entre partes (exceto antes da primeira)
-            if completed > 0:
-                logger.info(f"Aguardando {sleep_time} segundos antes de processar a próxima parte...")
-                time.sleep(sleep_time)
-            
-            # Processa a parte atual
-            part_dir = part_output_dirs[part]
-            try:
-                result = process_part(part, part_dir)
-                results.append(result)
-                logger.info(f"Parte {part} concluída com sucesso")
-            except Exception as e:
-                logger.error(f"Erro ao processar parte {part}: {str(e)}")
-                results.append({"part": part, "error": str(e)})
-            
-            # Atualiza o progresso
-            completed += 1
-            progress = (completed / total_parts) * 100
-            task_status[task_id]["progress"] = progress
-            logger.info(f"Progresso: {progress:.1f}%")
-        
-        # Após o processamento em sequência, combina os resultados
-        logger.info("Combinando resultados de todas as partes...")
-        
-        # Isso pode ser útil para consolidar os resultados parciais
-        final_result = run_scraper_task_bg(output_dir=output_dir)
-        
-        # Atualiza status para "concluído"
-        consolidated_results = {
-            "parts_results": results,
-            "final_result": final_result
-        }
-        
-        task_status[task_id]["status"] = "concluído"
-        task_status[task_id]["end_time"] = datetime.now()
-        task_status[task_id]["results"] = consolidated_results
-        task_status[task_id]["progress"] = 100
-        
-        return consolidated_results
-    except Exception as e:
-        logger.error(f"Erro no processamento assíncrono: {str(e)}")
-        task_status[task_id]["status"] = "erro"
-        task_status[task_id]["end_time"] = datetime.now()
-        task_status[task_id]["error"] = str(e)
-        task_status[task_id]["progress"] = 0
-        return None
-        
+        return str(uuid.UUID(task_id))
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Tarefa não encontrada")
 
 @router.get("/status/{task_id}")
-async def get_task_status(task_id: str):
+def get_task_status(task_id: str, db: Connection = Depends(get_db)):
     """
     Retorna o status atual de uma tarefa assíncrona
     """
-    if task_id not in task_status:
+    job = get_job(db, _id_da_tarefa(task_id))
+    if job is None:
         raise HTTPException(status_code=404, detail="Tarefa não encontrada")
-    
-    return task_status[task_id]
+    return _tarefa(job)
+
+def evento_sse(evento: dict) -> bytes:
+    """Formata um evento da tabela scraper_job_event no formato text/event-stream."""
+    dados = {**evento["payload"], "created_at": evento["created_at"]}
+    return b"id: %d\nevent: %s\ndata: %s\n\n" % (evento["id"], evento["stage"].encode(), dumps_json(dados))
+
+async def eventos_da_tarefa(task_id: str, ultimo_id: int = 0):
+    """
+    Acompanha os eventos gravados pelo worker que executa o job, lendo a tabela de
+    eventos a cada JOB_EVENTS_POLL_SECONDS (o PgBouncer em modo transaction não
+    suporta LISTEN/NOTIFY). Termina quando o job é finalizado e não há mais eventos.
+    """
+    ultimo_envio = time.monotonic()
+    while True:
+        # O status é lido antes dos eventos: se já estava finalizado, nenhum evento ficou para trás
+        status = await run_in_threadpool(em_transacao, get_job_status, task_id)
+        eventos = await run_in_threadpool(em_transacao, list_job_events, task_id, ultimo_id)
+        for evento in eventos:
+            ultimo_id = evento["id"]
+            yield evento_sse(evento)
+        if eventos:
+            ultimo_envio = time.monotonic()
+        elif status is None or status in FINISHED_STATUSES:
+            yield b"event: fim\ndata: %s\n\n" % dumps_json({"status": status})
+            return
+        elif time.monotonic() - ultimo_envio >= settings.JOB_EVENTS_KEEPALIVE_SECONDS:
+            # Comentário SSE: mantém a conexão aberta em proxies com timeout de inatividade
+            ultimo_envio = time.monotonic()
+            yield b": keep-alive\n\n"
+        if not eventos:
+            await asyncio.sleep(settings.JOB_EVENTS_POLL_SECONDS)
+
+@router.get("/status/{task_id}/stream")
+def stream_task_status(
+    task_id: str,
+    last_event_id: Optional[int] = Header(None, description="Último evento recebido (reconexão do EventSource)"),
+    db: Connection = Depends(get_db)
+):
+    """
+    Stream (Server-Sent Events) do progresso de uma tarefa: um evento por etapa de
+    cada página (acessada, baixado, normalizado, convertido, com bytes, linhas e
+    duração), "pagina_concluida" com o progresso, e "iniciado"/"finalizado" do job.
+    """
+    task_id = _id_da_tarefa(task_id)
+    if get_job_status(db, task_id) is None:
+        raise HTTPException(status_code=404, detail="Tarefa não encontrada")
+    return StreamingResponse(
+        eventos_da_tarefa(task_id, last_event_id or 0),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/cancelar/{task_id}")
+def cancelar_tarefa(task_id: str, db: Connection = Depends(get_db)):
+    """
+    Cancela uma tarefa: se ainda estiver pendente, sai da fila; se estiver em
+    andamento, é interrompida pelo worker na próxima atualização de progresso.
+    """
+    task_id = _id_da_tarefa(task_id)
+    status = cancel_job(db, task_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Tarefa não encontrada")
+    db.commit()
+    if status in FINISHED_STATUSES and status != "cancelado":
+        raise HTTPException(status_code=409, detail=f"Tarefa já finalizada com status '{status}'")
+    return {"task_id": task_id, "status": status, "cancel_requested": True}
 
 @router.get("/tarefas")
-async def listar_tarefas():
+def listar_tarefas(
+    pagina: int = Query(default=1, ge=1, title="Página", description="Número da página (começando em 1)"),
+    qtd_por_pagina: int = Query(default=20, ge=1, le=100, title="Quantidade por página", description="Número de tarefas por página"),
+    status: str = Query(
+        None,
+        pattern=f"^({'|'.join(ACTIVE_STATUSES + FINISHED_STATUSES)})$",
+        description="Filtrar pelo status da tarefa"
+    ),
+    db: Connection = Depends(get_db)
+):
     """
-    Lista todas as tarefas e seus status
+    Lista as tarefas (da mais recente para a mais antiga), paginadas e sem os resultados
+    completos; use /status/{task_id} para os detalhes de uma tarefa.
     """
-    return task_status
+    jobs, total = list_jobs(db, skip=(pagina - 1) * qtd_por_pagina, limit=qtd_por_pagina, status=status)
+    return {
+        "pagina": pagina,
+        "quantidade_por_pagina": qtd_por_pagina,
+        "total": total,
+        "tarefas": [_tarefa(job, detalhes=False) for job in jobs]
+    }
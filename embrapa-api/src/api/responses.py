@@ -0,0 +1,14 @@
+from fastapi.responses import ORJSONResponse
+from src.utils.helpers import dumps_json
+
+
+class DataJSONResponse(ORJSONResponse):
+    """
+    Resposta JSON serializada pelo orjson, com Decimal tratado no próprio dumps.
+
+    Devolvida diretamente pelos endpoints, evita o jsonable_encoder do FastAPI,
+    que percorre e copia cada linha antes da serialização.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps_json(content)
@@ -1,12 +1,68 @@
-from sqlalchemy import create_engine
+import time
+from uuid import uuid4
+from prometheus_client import Gauge, Histogram
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
 from src.config.settings import settings
 
 # Usando o pgbouncer para conexão com o banco
 SQLALCHEMY_DATABASE_URL = f"postgresql://{settings.DB_USER}:{settings.DB_PASSWORD}@{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"
+ASYNC_SQLALCHEMY_DATABASE_URL = f"postgresql+asyncpg://{settings.DB_USER}:{settings.DB_PASSWORD}@{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Tempo esperando uma conexão do pool (inclui abrir a conexão quando necessário)",
+    ["engine"]
+)
+POOL_IN_USE = Gauge("db_pool_connections_in_use", "Conexões emprestadas pelo pool no momento", ["engine"])
+
+def _instrumented_pool(pool_class, label: str):
+    """Subclasse do pool que mede a espera por uma conexão (fila do pool ou connect)."""
+    class InstrumentedPool(pool_class):
+        def _do_get(self):
+            start = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                POOL_CHECKOUT_WAIT.labels(engine=label).observe(time.perf_counter() - start)
+
+    InstrumentedPool.__name__ = f"Instrumented{pool_class.__name__}"
+    return InstrumentedPool
+
+def pool_options(label: str, queue_pool_class=QueuePool) -> dict:
+    """
+    Argumentos de pool do create_engine conforme settings.DB_POOL_STRATEGY.
+
+    "null": sem pool no cliente (uma conexão por checkout), deixando o pooling para
+    o PgBouncer em modo transaction. "queue": pool do SQLAlchemy com os limites
+    de DB_POOL_SIZE/DB_MAX_OVERFLOW/DB_POOL_TIMEOUT/DB_POOL_RECYCLE.
+    """
+    options = {"pool_pre_ping": settings.DB_POOL_PRE_PING}
+    if settings.DB_POOL_STRATEGY == "null":
+        options["poolclass"] = _instrumented_pool(NullPool, label)
+    elif settings.DB_POOL_STRATEGY == "queue":
+        options.update({
+            "poolclass": _instrumented_pool(queue_pool_class, label),
+            "pool_size": settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "pool_timeout": settings.DB_POOL_TIMEOUT,
+            "pool_recycle": settings.DB_POOL_RECYCLE,
+        })
+    else:
+        raise ValueError(f"DB_POOL_STRATEGY inválida '{settings.DB_POOL_STRATEGY}'. Use 'queue' ou 'null'.")
+    return options
+
+def instrument_pool(sync_engine, label: str):
+    """Mantém o gauge de conexões em uso pelos eventos de checkout/checkin do pool."""
+    gauge = POOL_IN_USE.labels(engine=label)
+    event.listen(sync_engine, "checkout", lambda *_: gauge.inc())
+    event.listen(sync_engine, "checkin", lambda *_: gauge.dec())
+    return sync_engine
+
+engine = instrument_pool(create_engine(SQLALCHEMY_DATABASE_URL, **pool_options("sync")), "sync")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -19,4 +75,40 @@ def get_db():
     finally:
         db.close()
 
+# Engine assíncrona (asyncpg) para as leituras do /api/data, criada no primeiro uso
+_async_engine = None
 
+def get_async_engine():
+    global _async_engine
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine
+        connect_args = {
+            "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        }
+        if not settings.DB_STATEMENT_CACHE_SIZE:
+            # O PgBouncer em modo transaction não mantém prepared statements entre
+            # transações: sem cache de statements e com nomes únicos
+            connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid4()}__"
+        _async_engine = create_async_engine(
+            ASYNC_SQLALCHEMY_DATABASE_URL,
+            connect_args=connect_args,
+            **pool_options("async", AsyncAdaptedQueuePool),
+        )
+        instrument_pool(_async_engine.sync_engine, "async")
+    return _async_engine
+
+async def get_data_db():
+    """
+    Conexão das leituras do /api/data: AsyncConnection (asyncpg) quando
+    settings.DB_ASYNC_READS, senão a Session síncrona de get_db.
+    """
+    if settings.DB_ASYNC_READS:
+        async with get_async_engine().connect() as conn:
+            yield conn
+        return
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        await run_in_threadpool(db.close)
@@ -15,6 +15,39 @@ class Settings(BaseSettings):
     DB_USER: str = os.getenv("DB_USER", "fiap-embrapa-app")
     DB_PASSWORD: str = os.getenv("DB_PASSWORD", "fiap-embrapa-app")
     DB_NAME: str = os.getenv("DB_NAME", "fiap-embrapa")
+    # Leituras do /api/data pela engine assíncrona (asyncpg); "false" volta ao caminho síncrono
+    DB_ASYNC_READS: bool = os.getenv("DB_ASYNC_READS", "true").lower() == "true"
+    # Pool de conexões: "queue" (pool do SQLAlchemy) ou "null" (sem pool no cliente,
+    # recomendado atrás do PgBouncer em modo transaction)
+    DB_POOL_STRATEGY: str = os.getenv("DB_POOL_STRATEGY", "queue")
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    # Segundos até reciclar uma conexão do pool (-1 = nunca)
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "-1"))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "false").lower() == "true"
+    # Cache de prepared statements do asyncpg (0 = desligado, exigido pelo PgBouncer em modo transaction)
+    DB_STATEMENT_CACHE_SIZE: int = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "0"))
+
+    # Modo padrão do /api/data/import-all ("insert", "copy", "staging" ou "incremental")
+    IMPORT_MODE: str = os.getenv("IMPORT_MODE", "copy")
+    # Módulos importados em paralelo pelo /api/data/import-all (1 = sequencial)
+    IMPORT_PARALLELISM: int = int(os.getenv("IMPORT_PARALLELISM", "1"))
+    # Espera máxima pelo lock das tabelas na troca das stagings
+    IMPORT_LOCK_TIMEOUT: str = os.getenv("IMPORT_LOCK_TIMEOUT", "5s")
+
+    # Cache em memória das páginas do /api/data (0 entradas = desligado)
+    DATA_CACHE_MAX_ENTRIES: int = int(os.getenv("DATA_CACHE_MAX_ENTRIES", "1024"))
+    DATA_CACHE_TTL_SECONDS: float = float(os.getenv("DATA_CACHE_TTL_SECONDS", "300"))
+    # Intervalo mínimo entre consultas à versão dos dados no banco (por processo)
+    DATA_CACHE_VERSION_CHECK_SECONDS: float = float(os.getenv("DATA_CACHE_VERSION_CHECK_SECONDS", "5"))
+
+    # Compressão das respostas: algoritmos em ordem de preferência ("br" exige o pacote
+    # brotli; vazio = desligada) e tamanho mínimo, em bytes, para comprimir
+    COMPRESSION_ALGORITHMS: str = os.getenv("COMPRESSION_ALGORITHMS", "br,gzip")
+    COMPRESSION_MIN_SIZE: int = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+    COMPRESSION_GZIP_LEVEL: int = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+    COMPRESSION_BROTLI_QUALITY: int = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
     
     # Configurações de segurança
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-here")
@@ -24,6 +57,41 @@ class Settings(BaseSettings):
     EMBRAPA_API_URL: str = os.getenv("EMBRAPA_API_URL", "")
     EMBRAPA_API_KEY: str = os.getenv("EMBRAPA_API_KEY", "")
 
+    # Configurações do scraper do VitiBrasil
+    SCRAPER_BASE_URL: str = os.getenv("SCRAPER_BASE_URL", "http://vitibrasil.cnpuv.embrapa.br/index.php")
+    SCRAPER_MAX_WORKERS: int = int(os.getenv("SCRAPER_MAX_WORKERS", "8"))
+    SCRAPER_MAX_CONCURRENCY_PER_HOST: int = int(os.getenv("SCRAPER_MAX_CONCURRENCY_PER_HOST", "4"))
+    SCRAPER_REQUEST_TIMEOUT: float = float(os.getenv("SCRAPER_REQUEST_TIMEOUT", "60"))
+    # Threads do pool dedicado aos jobs do scraper (fora do event loop e do threadpool da API)
+    SCRAPER_EXECUTOR_WORKERS: int = int(os.getenv("SCRAPER_EXECUTOR_WORKERS", "8"))
+
+    # Fila de jobs do scraper (tabela scraper_job): só os processos com JOB_WORKER_ENABLED
+    # rodam um worker (habilitado no docker-compose); réplicas, testes e scripts, não
+    JOB_WORKER_ENABLED: bool = os.getenv("JOB_WORKER_ENABLED", "false").lower() == "true"
+    JOB_POLL_SECONDS: float = float(os.getenv("JOB_POLL_SECONDS", "2"))
+    # Intervalo de atualização do progresso/verificação de cancelamento do job em andamento
+    JOB_HEARTBEAT_SECONDS: float = float(os.getenv("JOB_HEARTBEAT_SECONDS", "5"))
+    # Job em andamento sem heartbeat há mais que isso volta para a fila
+    JOB_STALE_SECONDS: float = float(os.getenv("JOB_STALE_SECONDS", "300"))
+    # Retenção dos jobs finalizados: idade máxima e quantidade máxima mantida
+    JOB_RETENTION_SECONDS: float = float(os.getenv("JOB_RETENTION_SECONDS", "604800"))
+    JOB_MAX_FINISHED: int = int(os.getenv("JOB_MAX_FINISHED", "500"))
+    # Stream SSE dos eventos dos jobs: intervalo de leitura da tabela de eventos e do keep-alive
+    JOB_EVENTS_POLL_SECONDS: float = float(os.getenv("JOB_EVENTS_POLL_SECONDS", "0.5"))
+    JOB_EVENTS_KEEPALIVE_SECONDS: float = float(os.getenv("JOB_EVENTS_KEEPALIVE_SECONDS", "15"))
+
+    # Atualização periódica (scraping e, se algo mudou, importação e aquecimento do cache)
+    REFRESH_SCHEDULE_ENABLED: bool = os.getenv("REFRESH_SCHEDULE_ENABLED", "false").lower() == "true"
+    REFRESH_INTERVAL_SECONDS: float = float(os.getenv("REFRESH_INTERVAL_SECONDS", "86400"))
+    # Expressão cron (ex.: "0 3 * * *"); quando informada, substitui o intervalo (requer croniter)
+    REFRESH_CRON: str = os.getenv("REFRESH_CRON", "")
+    # Janela fora de pico, no horário local do servidor (ex.: "01:00-05:00"; vazio = qualquer hora)
+    REFRESH_WINDOW: str = os.getenv("REFRESH_WINDOW", "")
+    REFRESH_CHECK_SECONDS: float = float(os.getenv("REFRESH_CHECK_SECONDS", "60"))
+    REFRESH_OUTPUT_DIR: str = os.getenv("REFRESH_OUTPUT_DIR", "data/vitibrasil")
+    REFRESH_WORKERS: int = int(os.getenv("REFRESH_WORKERS", "3"))
+    REFRESH_SLEEP_SECONDS: float = float(os.getenv("REFRESH_SLEEP_SECONDS", "1"))
+
 settings = Settings()
 
 
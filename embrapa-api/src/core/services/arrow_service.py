@@ -0,0 +1,151 @@
+"""
+Respostas colunares (Apache Arrow IPC stream e Parquet) para clientes analíticos.
+
+Os lotes são montados direto das linhas lidas do banco, com tipos fixos por coluna:
+year_no int16, quantidades inteiras int64, NUMERIC(15,2) como float64 e os enums
+(tipos/cores/derivados) codificados como dicionário.
+
+O pyarrow é opcional: sem ele, arrow_available() é False e a API responde 406.
+"""
+from src.db.repositories.data_repository import TABLE_COLUMNS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - depende do ambiente
+    pa = None
+    pq = None
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+
+# Linhas acumuladas por row group do Parquet (os lotes do cursor são menores)
+PARQUET_ROW_GROUP_SIZE = 65536
+
+# Tipo de cada coluna: "int32", "int64", "int16", "float64", "string" ou "enum"
+COLUMN_TYPES = {
+    "id": "int32",
+    "year_no": "int16",
+    "name": "string",
+    "cultivar": "string",
+    "country": "string",
+    "wine_derivative_name": "enum",
+    "color_name": "enum",
+    "kind_name": "enum",
+    "grape_type_name": "enum",
+    "quantity": "int64",
+    "quantity_kg": "float64",
+    "quantity_liters": "float64",
+    "value_usd": "float64",
+}
+
+# Colunas cujo tipo muda por tabela (process.quantity_kg é BIGINT, nas demais NUMERIC)
+MODULE_COLUMN_TYPES = {
+    "process": {"quantity_kg": "int64"},
+}
+
+
+def arrow_available() -> bool:
+    return pa is not None
+
+
+def _column_type(module: str, column: str) -> str:
+    return MODULE_COLUMN_TYPES.get(module, {}).get(column, COLUMN_TYPES[column])
+
+
+def _arrow_type(name: str):
+    if name == "enum":
+        return pa.dictionary(pa.int8(), pa.string())
+    return getattr(pa, name)()
+
+
+def arrow_schema(module: str):
+    columns = ["id"] + TABLE_COLUMNS[module]
+    return pa.schema([(column, _arrow_type(_column_type(module, column))) for column in columns])
+
+
+def _array(values, arrow_type):
+    if pa.types.is_floating(arrow_type):
+        # NUMERIC chega como Decimal: convertido em bloco via decimal128
+        try:
+            return pa.array(values, type=pa.decimal128(38, 10)).cast(arrow_type)
+        except (pa.ArrowTypeError, pa.ArrowInvalid):
+            return pa.array([None if v is None else float(v) for v in values], type=arrow_type)
+    return pa.array(values, type=arrow_type)
+
+
+def record_batch(module: str, rows: list):
+    """Lote Arrow a partir de tuplas (id + TABLE_COLUMNS) ou dicts com essas chaves."""
+    schema = arrow_schema(module)
+    if rows and isinstance(rows[0], dict):
+        rows = [tuple(row.get(name) for name in schema.names) for row in rows]
+    columns = list(zip(*rows)) if rows else [[] for _ in schema.names]
+    return pa.record_batch([_array(list(values), field.type) for values, field in zip(columns, schema)], schema=schema)
+
+
+class _Sink:
+    """Arquivo em memória que devolve e descarta o que já foi escrito (para streaming)."""
+    closed = False
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ArrowEncoder:
+    """
+    Serializa lotes de linhas em Arrow IPC stream ("arrow") ou Parquet ("parquet"),
+    devolvendo os bytes prontos a cada chamada, para uso com StreamingResponse.
+    """
+
+    def __init__(self, module: str, fmt: str):
+        self.module = module
+        self.fmt = fmt
+        self.schema = arrow_schema(module)
+        self._sink = _Sink()
+        self._pending = []
+        if fmt == "parquet":
+            self._writer = pq.ParquetWriter(self._sink, self.schema)
+        else:
+            self._writer = pa.ipc.new_stream(self._sink, self.schema)
+
+    def start(self) -> bytes:
+        return self._sink.take()
+
+    def encode(self, rows: list) -> bytes:
+        batch = record_batch(self.module, rows)
+        if self.fmt == "parquet":
+            self._pending.append(batch)
+            if sum(len(b) for b in self._pending) >= PARQUET_ROW_GROUP_SIZE:
+                self._flush_row_group()
+        else:
+            self._writer.write_batch(batch)
+        return self._sink.take()
+
+    def _flush_row_group(self):
+        if self._pending:
+            self._writer.write_table(pa.Table.from_batches(self._pending, schema=self.schema))
+            self._pending = []
+
+    def finish(self) -> bytes:
+        if self.fmt == "parquet":
+            self._flush_row_group()
+        self._writer.close()
+        return self._sink.take()
+
+
+def encode_rows(module: str, rows: list, fmt: str) -> bytes:
+    """Uma página inteira (lista de dicts) em Arrow IPC stream ou Parquet."""
+    encoder = ArrowEncoder(module, fmt)
+    return encoder.start() + encoder.encode(rows) + encoder.finish()
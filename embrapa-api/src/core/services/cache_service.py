@@ -0,0 +1,174 @@
+"""
+Cache em memória (LRU + TTL) das páginas servidas pelo /api/data.
+
+Cada entrada guarda a versão dos dados (tabela dataset_version) em que foi lida.
+A versão é incrementada pelo /api/data/import-all; cada processo consulta a versão
+no banco no máximo uma vez a cada DATA_CACHE_VERSION_CHECK_SECONDS, então, entre
+essas consultas, as páginas em cache são servidas sem tocar no banco.
+
+Os contadores são registrados no registry padrão do prometheus_client, o mesmo
+exposto em /metrics pelo Instrumentator.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from prometheus_client import Counter
+from src.config.settings import settings
+from src.db.repositories.data_repository import get_dataset_version, get_dataset_version_async
+
+logger = logging.getLogger(__name__)
+
+CACHE_HITS = Counter("data_cache_hits_total", "Páginas do /api/data servidas pelo cache", ["module"])
+CACHE_MISSES = Counter("data_cache_misses_total", "Páginas do /api/data lidas do banco", ["module"])
+CACHE_EVICTIONS = Counter(
+    "data_cache_evictions_total",
+    "Entradas removidas do cache do /api/data",
+    ["reason"]  # "lru", "ttl" ou "version"
+)
+
+
+class DataCache:
+    def __init__(self, max_entries: int, ttl_seconds: float, version_check_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.version_check_seconds = version_check_seconds
+        self._entries = OrderedDict()  # chave -> (versão, expira_em, valor)
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_checked_at = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _evict_all(self, reason: str):
+        if self._entries:
+            CACHE_EVICTIONS.labels(reason=reason).inc(len(self._entries))
+            self._entries.clear()
+
+    def _fresh_version(self):
+        """Versão já conhecida, se consultada há menos de version_check_seconds."""
+        with self._lock:
+            if self._version is not None and time.monotonic() - self._version_checked_at < self.version_check_seconds:
+                return self._version
+        return None
+
+    def _adopt_version(self, version, checked_at: float):
+        with self._lock:
+            if version != self._version:
+                self._evict_all("version")
+                self._version = version
+            self._version_checked_at = checked_at
+        return version
+
+    def version(self, conn):
+        """
+        Versão atual dos dados, consultada no banco no máximo a cada version_check_seconds.
+        Retorna None se a versão não puder ser lida (o cache fica desligado nessa requisição).
+        """
+        version = self._fresh_version()
+        if version is not None:
+            return version
+        checked_at = time.monotonic()
+        try:
+            version = get_dataset_version(conn)
+        except Exception as e:
+            logger.warning(f"Não foi possível ler a versão dos dados, cache ignorado: {e}")
+            conn.rollback()
+            return None
+        return self._adopt_version(version, checked_at)
+
+    async def version_async(self, conn):
+        """version() para AsyncConnection."""
+        version = self._fresh_version()
+        if version is not None:
+            return version
+        checked_at = time.monotonic()
+        try:
+            version = await get_dataset_version_async(conn)
+        except Exception as e:
+            logger.warning(f"Não foi possível ler a versão dos dados, cache ignorado: {e}")
+            await conn.rollback()
+            return None
+        return self._adopt_version(version, checked_at)
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry_version, expires_at, value = entry
+            if entry_version != version or expires_at <= time.monotonic():
+                del self._entries[key]
+                CACHE_EVICTIONS.labels(reason="version" if entry_version != version else "ttl").inc()
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, version, value):
+        with self._lock:
+            self._entries[key] = (version, time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                CACHE_EVICTIONS.labels(reason="lru").inc()
+
+    def _lookup(self, key: tuple, version):
+        if version is not None:
+            value = self.get(key, version)
+            if value is not None:
+                CACHE_HITS.labels(module=key[0]).inc()
+                return value
+        CACHE_MISSES.labels(module=key[0]).inc()
+        return None
+
+    def get_or_load(self, conn, key: tuple, loader):
+        """Read-through: devolve a página em cache ou executa loader() e guarda o resultado."""
+        version = self.version(conn) if self.enabled else None
+        value = self._lookup(key, version)
+        if value is None:
+            value = loader()
+            if version is not None:
+                self.put(key, version, value)
+        return value
+
+    async def get_or_load_async(self, conn, key: tuple, loader):
+        """get_or_load() para AsyncConnection, com loader assíncrono."""
+        version = await self.version_async(conn) if self.enabled else None
+        value = self._lookup(key, version)
+        if value is None:
+            value = await loader()
+            if version is not None:
+                self.put(key, version, value)
+        return value
+
+    def get_or_encode(self, key: tuple, encode):
+        """
+        Bytes já serializados (e comprimidos) de uma resposta, guardados na versão de
+        dados atual ao lado das páginas, para que hits não sejam recomprimidos.
+        A chave deve identificar o conteúdo (ex.: ETag + Content-Encoding).
+        """
+        with self._lock:
+            version = self._version
+        if not self.enabled or version is None:
+            return encode()
+        value = self.get(key, version)
+        if value is None:
+            value = encode()
+            self.put(key, version, value)
+        return value
+
+    def invalidate(self, version=None):
+        """Descarta todas as páginas; com version, já adota a nova versão sem consultar o banco."""
+        with self._lock:
+            self._evict_all("version")
+            self._version = version
+            self._version_checked_at = time.monotonic() if version is not None else 0.0
+
+
+data_cache = DataCache(
+    max_entries=settings.DATA_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.DATA_CACHE_TTL_SECONDS,
+    version_check_seconds=settings.DATA_CACHE_VERSION_CHECK_SECONDS,
+)
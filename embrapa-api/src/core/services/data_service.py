@@ -1,8 +1,30 @@
+import base64
+import binascii
+import csv
+import io
+import hashlib
 import json
+import logging
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
 from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncConnection
 from sqlalchemy import text
-from src.db.models import ColorEnum, GrapeTypeEnum, KindEnum, WineDerivativeEnum
+from src.config.database import engine, get_async_engine
+from src.config.settings import settings
+from src.utils.helpers import dumps_json
+from src.core.services.arrow_service import ARROW_MEDIA_TYPE, PARQUET_MEDIA_TYPE, ArrowEncoder
+from src.core.services.cache_service import data_cache
+from src.core.services.normalization import (
+    normalize_product,
+    normalize_process,
+    normalize_sales,
+    normalize_import,
+    normalize_export,
+    to_records
+)
 from src.db.repositories.data_repository import (
     delete_product_data,
     delete_process_data,
@@ -10,6 +32,26 @@ from src.db.repositories.data_repository import (
     delete_import_data,
     delete_export_data,
     get_all_from_table,
+    get_page_after_id,
+    get_all_from_table_async,
+    get_page_after_id_async,
+    aggregate_table_async,
+    stream_table,
+    stream_table_async,
+    aggregate_table,
+    AGGREGATE_FUNCTIONS,
+    refresh_rollup,
+    bump_dataset_version,
+    TABLE_COLUMNS,
+    TABLE_KEYS,
+    LOAD_COLUMNS,
+    bulk_insert_into_table,
+    upsert_into_table,
+    build_staging_indexes,
+    create_staging_table,
+    drop_staging_table,
+    staging_table_name,
+    swap_staging_table,
     insert_into_product,
     insert_into_process,
     insert_into_sales,
@@ -17,8 +59,15 @@ from src.db.repositories.data_repository import (
     insert_into_export
 )
 
+logger = logging.getLogger(__name__)
+
 DATA_PATH = "data/vitibrasil"
 
+# Modos de carga: "insert" grava linha a linha; "copy" carrega em lote com COPY;
+# "staging" carrega em tabelas de staging e troca pelas reais com RENAME;
+# "incremental" aplica só a diferença (upsert + delete) pela chave natural (TABLE_KEYS)
+IMPORT_MODES = ("insert", "copy", "staging", "incremental")
+
 MODULE_FILES = {
     "product": "opt_02",
     "process": "opt_03",
@@ -35,258 +84,452 @@ def load_data(module: str):
     with open(json_file_path, "r", encoding="utf-8") as file:
         return json.load(file)
 
-def insert_product_data(conn: Connection):
-    delete_product_data(conn)
-
-    data = load_data("product")
-    current_wine_derivative = None
-    insertions = []
-
-    for entry in data:
+def load_records(conn: Connection, table: str, records: list, insert_fn, label: str, mode: str = "insert"):
+    """
+    Grava os registros preparados na tabela: em lote no modo "copy", senão linha a linha.
+    """
+    if mode == "copy":
         try:
-            produto = entry.get("produto", "").strip()
-            # quantidade_raw = entry.get("valor", "0").replace(".", "").replace("-", "0")
-            quantidade_raw = entry.get("valor", 0)
-            ano_raw = entry.get("ano", 0)
-
-            if produto == "Total":
-                continue
-
-            try:
-                quantidade = int(float(quantidade_raw))
-            except ValueError:
-                quantidade = 0
-
-            if produto.isupper():
-                current_wine_derivative = produto
-
-            if current_wine_derivative is None:
-                continue # ignorar registros antes do primeiro UPPERCASE
-
-            insertions.append({
-                "name": produto,
-                "wine_derivative_name": current_wine_derivative,
-                "quantity": quantidade,
-                "year_no": ano_raw if ano_raw else None
-            })
+            return bulk_insert_into_table(conn, table, records)
         except Exception as e:
-            raise ValueError(f"Erro ao processar produto '{entry}': {e}")
+            raise RuntimeError(f"Erro ao carregar {label} em lote: {e}")
 
-    for record in insertions:
+    for record in records:
         try:
-            insert_into_product(conn, record)
+            insert_fn(conn, record)
         except Exception as e:
-            raise RuntimeError(f"Erro ao inserir produto {record}: {e}")
-
+            raise RuntimeError(f"Erro ao inserir {label} {record}: {e}")
+    return len(records)
+
+def load_into_staging(conn: Connection, table: str, records: list, label: str):
+    """
+    Cria a staging da tabela, carrega os registros em lote e só então cria os índices.
+    """
+    try:
+        create_staging_table(conn, table)
+        bulk_insert_into_table(conn, staging_table_name(table), records, LOAD_COLUMNS[table])
+        build_staging_indexes(conn, table)
+    except Exception as e:
+        raise RuntimeError(f"Erro ao carregar {label} na staging: {e}")
+
+def swap_staging_tables(conn: Connection, tables: list):
+    """
+    Troca as tabelas reais pelas stagings numa única transação (confirmada aqui).
+    """
+    conn.execute(text(f"SET LOCAL lock_timeout = '{settings.IMPORT_LOCK_TIMEOUT}'"))
+    for table in tables:
+        swap_staging_table(conn, table)
     conn.commit()
 
-def insert_process_data(conn: Connection):
-    delete_process_data(conn)
-
-    data = load_data("process")
-    current_color_name = None
-    insertions = []
-    valid_kinds = [e.value for e in KindEnum]
-    valid_colors = [e.value for e in ColorEnum]
-
-    for entry in data:
-        try:
-            cultivar = entry.get("cultivar", "").strip()
-            quantidade_raw = str(entry.get("Quantidade (Kg)") or "0").replace(".", "").replace(",", ".").replace("-", "0")
-            kind_raw = entry.get("type", "").strip()
-            ano_raw = entry.get("ano", 0)
-
-            if cultivar == "Total":
-                continue
-
-            try:
-                quantidade = int(float(quantidade_raw))
-            except ValueError:
-                quantidade = 0
-
-            if cultivar.isupper() and cultivar in valid_colors:
-                current_color_name = cultivar
-
-            if current_color_name is None or not kind_raw:
-                continue
-
-            if kind_raw not in valid_kinds:
-                raise ValueError(f"Tipo inválido encontrado: '{kind_raw}'")
-
-            insertions.append({
-                "color_name": current_color_name,
-                "kind_name": kind_raw,
-                "cultivar": cultivar,
-                "quantity_kg": quantidade,
-                "year_no": ano_raw if ano_raw else None
-            })
-        except Exception as e:
-            raise ValueError(f"Erro ao processar processo '{entry}': {e}")
-
-    for record in insertions:
-        try:
-            insert_into_process(conn, record)
-        except Exception as e:
-            raise RuntimeError(f"Erro ao inserir processamento {record}: {e}")
-
+def number_occurrences(table: str, records: list) -> list:
+    """
+    Preenche seq_no com a ordem de cada registro entre os que repetem o resto da
+    chave natural (1, 2, ...), na ordem do arquivo, completando a chave única.
+    """
+    base_keys = [key for key in TABLE_KEYS[table] if key != "seq_no"]
+    occurrences = Counter()
+    for record in records:
+        key = tuple(record[column] for column in base_keys)
+        occurrences[key] += 1
+        record["seq_no"] = occurrences[key]
+    return records
+
+def apply_incremental(conn: Connection, table: str, records: list, label: str) -> dict:
+    """
+    Aplica na tabela apenas as linhas novas, alteradas e removidas desde a última carga.
+    """
+    try:
+        result = upsert_into_table(conn, table, records)
+    except Exception as e:
+        raise RuntimeError(f"Erro ao aplicar carga incremental de {label}: {e}")
+    logger.info(f"Carga incremental de {table}: {result['upserted']} inseridos/atualizados, {result['deleted']} removidos")
+    return result
+
+def store_records(conn: Connection, table: str, records: list, mode: str, delete_fn, insert_fn, label: str):
+    """
+    Substitui o conteúdo da tabela pelos registros, conforme o modo de carga, sem commit.
+    """
+    if mode not in IMPORT_MODES:
+        raise ValueError(f"Modo de importação inválido '{mode}'. Modos válidos: {', '.join(IMPORT_MODES)}.")
+    if mode == "incremental":
+        apply_incremental(conn, table, records, label)
+        return
+    if mode == "staging":
+        load_into_staging(conn, table, records, label)
+        conn.execute(text(f"SET LOCAL lock_timeout = '{settings.IMPORT_LOCK_TIMEOUT}'"))
+        swap_staging_table(conn, table)
+        return
+    delete_fn(conn)
+    load_records(conn, table, records, insert_fn, label, mode)
+
+def prepare_product_records(data: list) -> list:
+    return number_occurrences("product", to_records(normalize_product(data)))
+
+def insert_product_data(conn: Connection, mode: str = "insert"):
+    insertions = prepare_product_records(load_data("product"))
+    store_records(conn, "product", insertions, mode, delete_product_data, insert_into_product, "produto")
     conn.commit()
 
-def insert_sales_data(conn: Connection):
-    delete_sales_data(conn)
-
-    data = load_data("sales")
-    current_wine_derivative = None
-    insertions = []
-    valid_wine_derivatives = [e.value for e in WineDerivativeEnum]
+def prepare_process_records(data: list) -> list:
+    return number_occurrences("process", to_records(normalize_process(data)))
 
-    for entry in data:
-        try:
-            produto = entry.get("Produto", "").strip()
-            # quantidade_raw = entry.get("valor", "0").replace(".", "").replace("-", "0")
-            quantidade_raw = entry.get("valor", 0)
-            ano_raw = entry.get("ano", 0)
-
-            if produto == "Total":
-                continue
-
-            try:
-                quantidade = int(float(quantidade_raw))
-            except ValueError:
-                quantidade = 0
-
-            if produto.isupper() and produto in valid_wine_derivatives:
-                current_wine_derivative = produto
-
-            if current_wine_derivative is None:
-                continue
-
-            insertions.append({
-                "name": produto,
-                "wine_derivative_name": current_wine_derivative,
-                "quantity_liters": quantidade,
-                "year_no": ano_raw if ano_raw else None
-            })
-        except Exception as e:
-            raise ValueError(f"Erro ao processar comercialização '{entry}': {e}")
+def insert_process_data(conn: Connection, mode: str = "insert"):
+    insertions = prepare_process_records(load_data("process"))
+    store_records(conn, "process", insertions, mode, delete_process_data, insert_into_process, "processamento")
+    conn.commit()
 
-    for record in insertions:
-        try:
-            insert_into_sales(conn, record)
-        except Exception as e:
-            raise RuntimeError(f"Erro ao inserir comercialização {record}: {e}")
+def prepare_sales_records(data: list) -> list:
+    return number_occurrences("sales", to_records(normalize_sales(data)))
 
+def insert_sales_data(conn: Connection, mode: str = "insert"):
+    insertions = prepare_sales_records(load_data("sales"))
+    store_records(conn, "sales", insertions, mode, delete_sales_data, insert_into_sales, "comercialização")
     conn.commit()
 
-def insert_import_data(conn: Connection):
-    delete_import_data(conn)
-
-    data = load_data("import")
-    insertions = []
-    valid_grape_types = [e.value for e in GrapeTypeEnum]
+def prepare_import_records(data: list) -> list:
+    return number_occurrences("import", to_records(normalize_import(data)))
 
-    for entry in data:
-        try:
-            country = entry.get("País", "").strip()
-            # quantidade_raw = entry.get("Quantidade (Kg)", "0").replace(".", "").replace("-", "0")
-            quantidade_raw = entry.get("Quantidade (Kg)", 0)
-            # valor_raw = entry.get("Valor (US$)", "0").replace(".", "").replace("-", "0").replace(",", ".")
-            valor_raw = 0 # Valor não está presente no JSON de importação
-            grape_type = entry.get("type", "").strip()
-            ano_raw = entry.get("ano", 0)
-
-            if country == "Total":
-                continue
-
-            try:
-                quantidade = int(float(quantidade_raw))
-            except ValueError:
-                quantidade = 0
-
-            try:
-                valor = float(valor_raw)
-            except ValueError:
-                valor = 0.0
-
-            if not grape_type or grape_type not in valid_grape_types:
-                continue
-
-            insertions.append({
-                "grape_type_name": grape_type,
-                "country": country,
-                "quantity_kg": quantidade,
-                "value_usd": valor,
-                "year_no": ano_raw if ano_raw else None
-            })
-        except Exception as e:
-            raise ValueError(f"Erro ao processar importação '{entry}': {e}")
+def insert_import_data(conn: Connection, mode: str = "insert"):
+    insertions = prepare_import_records(load_data("import"))
+    store_records(conn, "import", insertions, mode, delete_import_data, insert_into_import, "importação")
+    conn.commit()
 
-    for record in insertions:
-        try:
-            insert_into_import(conn, record)
-        except Exception as e:
-            raise RuntimeError(f"Erro ao inserir importação {record}: {e}")
+def prepare_export_records(data: list) -> list:
+    return number_occurrences("export", to_records(normalize_export(data)))
 
+def insert_export_data(conn: Connection, mode: str = "insert"):
+    insertions = prepare_export_records(load_data("export"))
+    store_records(conn, "export", insertions, mode, delete_export_data, insert_into_export, "exportação")
     conn.commit()
 
-def insert_export_data(conn: Connection):
-    delete_export_data(conn)
+MODULE_PREPARERS = {
+    "product": prepare_product_records,
+    "process": prepare_process_records,
+    "sales": prepare_sales_records,
+    "import": prepare_import_records,
+    "export": prepare_export_records,
+}
 
-    data = load_data("export")
-    insertions = []
-    valid_grape_types = [e.value for e in GrapeTypeEnum]
+MODULE_LABELS = {
+    "product": "produto",
+    "process": "processamento",
+    "sales": "comercialização",
+    "import": "importação",
+    "export": "exportação",
+}
 
-    for entry in data:
-        try:
-            country = entry.get("País", "").strip()
-            # quantidade_raw = entry.get("Quantidade (Kg)", "0").replace(".", "").replace("-", "0")
-            quantidade_raw = entry.get("Quantidade (Kg)", 0)
-            # valor_raw = entry.get("Valor (US$)", "0").replace(".", "").replace("-", "0").replace(",", ".")
-            valor_raw = 0 # Valor não está presente no JSON de importação
-            grape_type = entry.get("type", "").strip()
-            ano_raw = entry.get("ano", 0)
-
-            if country == "Total":
-                continue
-
-            try:
-                quantidade = int(float(quantidade_raw))
-            except ValueError:
-                quantidade = 0
-
-            try:
-                valor = float(valor_raw)
-            except ValueError:
-                valor = 0.0
-
-            if not grape_type or grape_type not in valid_grape_types:
-                continue
-
-            insertions.append({
-                "grape_type_name": grape_type,
-                "country": country,
-                "quantity_kg": quantidade,
-                "value_usd": valor,
-                "year_no": ano_raw if ano_raw else None
-            })
-        except Exception as e:
-            raise ValueError(f"Erro ao processar exportação '{entry}': {e}")
+MODULE_WRITERS = {
+    "product": (delete_product_data, insert_into_product),
+    "process": (delete_process_data, insert_into_process),
+    "sales": (delete_sales_data, insert_into_sales),
+    "import": (delete_import_data, insert_into_import),
+    "export": (delete_export_data, insert_into_export),
+}
 
-    for record in insertions:
+def prepare_module(module: str) -> list:
+    """
+    Lê e prepara os registros de um módulo (executado nos processos do pool).
+    """
+    return MODULE_PREPARERS[module](load_data(module))
+
+def _store_module_on_own_connection(module: str, records: list, mode: str):
+    delete_fn, insert_fn = MODULE_WRITERS[module]
+    with engine.connect() as module_conn:
+        if mode == "staging":
+            load_into_staging(module_conn, module, records, MODULE_LABELS[module])
+        else:
+            store_records(module_conn, module, records, mode, delete_fn, insert_fn, MODULE_LABELS[module])
+        module_conn.commit()
+
+def insert_all_data_parallel(conn: Connection, mode: str, parallelism: int):
+    """
+    Prepara cada módulo num processo do pool e grava cada um na sua própria conexão.
+
+    O parse de um módulo não espera os demais: assim que um processo termina, a carga
+    dele começa numa thread com conexão própria do pool do SQLAlchemy. No modo
+    "staging" as cinco tabelas continuam sendo trocadas juntas, em conn, no final.
+    """
+    if mode not in IMPORT_MODES:
+        raise ValueError(f"Modo de importação inválido '{mode}'. Modos válidos: {', '.join(IMPORT_MODES)}.")
+    try:
+        with ProcessPoolExecutor(max_workers=parallelism, mp_context=multiprocessing.get_context("spawn")) as processes, \
+                ThreadPoolExecutor(max_workers=parallelism) as threads:
+            parsing = {processes.submit(prepare_module, module): module for module in MODULE_FILES}
+            loading = []
+            for future in as_completed(parsing):
+                module = parsing[future]
+                loading.append(threads.submit(_store_module_on_own_connection, module, future.result(), mode))
+            for future in loading:
+                future.result()
+        if mode == "staging":
+            swap_staging_tables(conn, list(MODULE_FILES))
+    except Exception:
+        if mode == "staging":
+            conn.rollback()
+            for module in MODULE_FILES:
+                drop_staging_table(conn, module)
+            conn.commit()
+        raise
+
+def insert_all_data_staging(conn: Connection):
+    """
+    Carrega todos os módulos em tabelas de staging e troca as cinco tabelas de uma vez.
+
+    Enquanto as stagings são carregadas e indexadas, os leitores continuam usando as
+    tabelas reais sem bloqueio. Se qualquer módulo falhar, nenhuma tabela real é tocada.
+    """
+    prepared = {module: MODULE_PREPARERS[module](load_data(module)) for module in MODULE_FILES}
+    try:
+        for module, records in prepared.items():
+            load_into_staging(conn, module, records, MODULE_LABELS[module])
+        conn.commit()
+        swap_staging_tables(conn, list(prepared))
+    except Exception:
+        conn.rollback()
+        for module in MODULE_FILES:
+            drop_staging_table(conn, module)
+        conn.commit()
+        raise
+
+def insert_all_data(conn: Connection, mode: str = None, parallelism: int = None):
+    """
+    Recarrega todas as tabelas a partir dos JSONs gerados pelo scraper.
+
+    Args:
+        mode: "insert" (linha a linha), "copy" (em lote), "staging" (em lote nas
+            stagings, com troca atômica) ou "incremental" (upsert só do que mudou);
+            padrão: settings.IMPORT_MODE
+        parallelism: Quantidade de módulos processados ao mesmo tempo;
+            padrão: settings.IMPORT_PARALLELISM (1 = sequencial)
+    """
+    mode = mode or settings.IMPORT_MODE
+    parallelism = parallelism or settings.IMPORT_PARALLELISM
+    if mode not in IMPORT_MODES:
+        raise ValueError(f"Modo de importação inválido '{mode}'. Modos válidos: {', '.join(IMPORT_MODES)}.")
+    try:
+        if parallelism > 1:
+            insert_all_data_parallel(conn, mode, min(parallelism, len(MODULE_FILES)))
+        elif mode == "staging":
+            insert_all_data_staging(conn)
+        else:
+            insert_product_data(conn, mode)
+            insert_process_data(conn, mode)
+            insert_sales_data(conn, mode)
+            insert_import_data(conn, mode)
+            insert_export_data(conn, mode)
+        # No modo "staging" as materialized views são recriadas na própria troca
+        if mode != "staging":
+            refresh_rollups(conn)
+    finally:
+        # Mesmo numa falha alguns módulos podem já ter sido gravados
+        publish_dataset_version(conn)
+
+def refresh_rollups(conn: Connection):
+    """
+    Atualiza as materialized views de totais sem bloquear as leituras (CONCURRENTLY).
+
+    Os dados já foram gravados: uma falha só deixa a view do módulo desatualizada
+    (as agregações que ela cobre ficam defasadas até a próxima importação) e é logada.
+    """
+    for module in MODULE_FILES:
         try:
-            insert_into_export(conn, record)
+            refresh_rollup(conn, module)
+            conn.commit()
         except Exception as e:
-            raise RuntimeError(f"Erro ao inserir exportação {record}: {e}")
-
-    conn.commit()
-
-def insert_all_data(conn: Connection):
-    insert_product_data(conn)
-    insert_process_data(conn)
-    insert_sales_data(conn)
-    insert_import_data(conn)
-    insert_export_data(conn)
-
-def get_data_by_module(module: str, conn: Connection, year_no: int = None, skip: int = 0, limit: int = 100):
+            conn.rollback()
+            logger.warning(f"Falha ao atualizar a materialized view de totais do módulo {module}: {e}")
+
+def publish_dataset_version(conn: Connection):
+    """
+    Incrementa a versão dos dados após a carga, invalidando o cache do /api/data
+    neste processo na hora e nos demais na próxima verificação de versão.
+
+    A transação pendente é desfeita antes: após a falha de um módulo ela está
+    abortada, e o que já foi gravado pelos outros módulos está commitado.
+    """
+    version = None
+    try:
+        conn.rollback()
+        version = bump_dataset_version(conn)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logger.warning(f"Não foi possível atualizar a versão dos dados: {e}")
+    data_cache.invalidate(version)
+
+def encode_cursor(last_id: int) -> str:
+    """Cursor opaco (base64 url-safe) apontando para o último id retornado."""
+    payload = json.dumps({"id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        last_id = json.loads(base64.urlsafe_b64decode(padded))["id"]
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise ValueError("Cursor inválido.")
+    if not isinstance(last_id, int) or isinstance(last_id, bool) or last_id < 0:
+        raise ValueError("Cursor inválido.")
+    return last_id
+
+def next_cursor(rows: list, limit: int):
+    """Cursor da próxima página, ou None quando a página veio incompleta (fim dos dados)."""
+    if len(rows) < limit or not rows:
+        return None
+    return encode_cursor(rows[-1]["id"])
+
+def _validate_module(module: str):
     if module not in MODULE_FILES:
         raise ValueError(f"Invalid module '{module}'. Valid modules are: {', '.join(MODULE_FILES.keys())}.")
-    return get_all_from_table(module, conn, year_no=year_no, skip=skip, limit=limit)
\ No newline at end of file
+
+def get_data_by_module(module: str, conn: Connection, year_no: int = None, skip: int = 0, limit: int = 100, after_id: int = None):
+    _validate_module(module)
+    if after_id is not None:
+        return get_page_after_id(module, conn, year_no=year_no, after_id=after_id, limit=limit)
+    return get_all_from_table(module, conn, year_no=year_no, skip=skip, limit=limit)
+
+async def get_data_by_module_async(module: str, conn: AsyncConnection, year_no: int = None, skip: int = 0, limit: int = 100, after_id: int = None):
+    _validate_module(module)
+    if after_id is not None:
+        return await get_page_after_id_async(module, conn, year_no=year_no, after_id=after_id, limit=limit)
+    return await get_all_from_table_async(module, conn, year_no=year_no, skip=skip, limit=limit)
+
+def module_page_key(module: str, year_no: int = None, skip: int = 0, limit: int = 100, after_id: int = None) -> tuple:
+    return (module, year_no, skip, limit, after_id)
+
+def get_module_page_etag(conn: Connection, key: tuple):
+    """
+    ETag forte da página: muda quando a versão dos dados ou os parâmetros mudam.
+    Retorna None se a versão dos dados não puder ser lida.
+    """
+    return _etag(data_cache.version(conn), key)
+
+async def get_module_page_etag_async(conn: AsyncConnection, key: tuple):
+    return _etag(await data_cache.version_async(conn), key)
+
+def _etag(version, key: tuple):
+    if version is None:
+        return None
+    digest = hashlib.sha256(repr(key).encode()).hexdigest()[:16]
+    return f'"{version}-{digest}"'
+
+def get_module_page(module: str, conn: Connection, year_no: int = None, skip: int = 0, limit: int = 100, after_id: int = None):
+    """get_data_by_module com cache read-through por (módulo, ano, skip, limite, after_id)."""
+    key = module_page_key(module, year_no=year_no, skip=skip, limit=limit, after_id=after_id)
+    return data_cache.get_or_load(
+        conn,
+        key,
+        lambda: get_data_by_module(module, conn, year_no=year_no, skip=skip, limit=limit, after_id=after_id)
+    )
+
+async def get_module_page_async(module: str, conn: AsyncConnection, year_no: int = None, skip: int = 0, limit: int = 100, after_id: int = None):
+    key = module_page_key(module, year_no=year_no, skip=skip, limit=limit, after_id=after_id)
+    return await data_cache.get_or_load_async(
+        conn,
+        key,
+        lambda: get_data_by_module_async(module, conn, year_no=year_no, skip=skip, limit=limit, after_id=after_id)
+    )
+
+def warm_cache(conn: Connection) -> int:
+    """
+    Pré-carrega no cache a primeira página e a série anual (soma por ano) de cada
+    módulo, as leituras mais comuns. Retorna a quantidade de leituras feitas.
+    """
+    warmed = 0
+    for module in MODULE_FILES:
+        get_module_page(module, conn)
+        aggregate_module(module, conn, ["year_no"])
+        warmed += 2
+    return warmed
+
+def parse_group_by(group_by: str) -> list:
+    """Converte "year_no, country" em ["year_no", "country"], sem repetições."""
+    columns = [column.strip() for column in (group_by or "").split(",") if column.strip()]
+    return list(dict.fromkeys(columns))
+
+def aggregate_module(module: str, conn: Connection, group_by: list, agg: str = "sum", year_from: int = None, year_to: int = None):
+    """Totais/séries do módulo calculados no banco, com o mesmo cache das páginas."""
+    _validate_module(module)
+    key = aggregate_key(module, group_by, agg, year_from, year_to)
+    return data_cache.get_or_load(
+        conn,
+        key,
+        lambda: aggregate_table(module, conn, group_by, agg=agg, year_from=year_from, year_to=year_to)
+    )
+
+async def aggregate_module_async(module: str, conn: AsyncConnection, group_by: list, agg: str = "sum", year_from: int = None, year_to: int = None):
+    _validate_module(module)
+    key = aggregate_key(module, group_by, agg, year_from, year_to)
+    return await data_cache.get_or_load_async(
+        conn,
+        key,
+        lambda: aggregate_table_async(module, conn, group_by, agg=agg, year_from=year_from, year_to=year_to)
+    )
+
+def aggregate_key(module: str, group_by: list, agg: str = "sum", year_from: int = None, year_to: int = None) -> tuple:
+    return (module, "aggregate", tuple(group_by), agg, year_from, year_to)
+
+# Formatos da exportação em streaming (/api/data/{module}/export) e seus media types
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "arrow": ARROW_MEDIA_TYPE,
+    "parquet": PARQUET_MEDIA_TYPE,
+}
+
+# Formatos colunares, que dependem do pyarrow
+ARROW_FORMATS = ("arrow", "parquet")
+
+def export_columns(module: str) -> list:
+    return ["id"] + TABLE_COLUMNS[module]
+
+def encode_export_batch(fmt: str, columns: list, rows: list) -> bytes:
+    """Serializa um lote de linhas (tuplas) em NDJSON ou CSV."""
+    if fmt == "ndjson":
+        return b"".join(dumps_json(dict(zip(columns, row))) + b"\n" for row in rows)
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows(rows)
+    return buffer.getvalue().encode()
+
+class TextExportEncoder:
+    """Mesma interface do ArrowEncoder (start/encode/finish) para NDJSON e CSV."""
+
+    def __init__(self, module: str, fmt: str):
+        self.fmt = fmt
+        self.columns = export_columns(module)
+
+    def start(self) -> bytes:
+        return encode_export_batch("csv", self.columns, [self.columns]) if self.fmt == "csv" else b""
+
+    def encode(self, rows: list) -> bytes:
+        return encode_export_batch(self.fmt, self.columns, rows)
+
+    def finish(self) -> bytes:
+        return b""
+
+def export_encoder(module: str, fmt: str):
+    if fmt in ARROW_FORMATS:
+        return ArrowEncoder(module, fmt)
+    return TextExportEncoder(module, fmt)
+
+def export_module(module: str, fmt: str, year_no: int = None):
+    """
+    Gera a exportação do módulo em pedaços de bytes, lendo a tabela por cursor no
+    servidor numa conexão própria (a do request já foi devolvida quando o corpo é enviado).
+    """
+    _validate_module(module)
+    encoder = export_encoder(module, fmt)
+    yield encoder.start()
+    with engine.connect() as conn:
+        for rows in stream_table(module, conn, year_no=year_no):
+            yield encoder.encode(rows)
+    yield encoder.finish()
+
+async def export_module_async(module: str, fmt: str, year_no: int = None):
+    _validate_module(module)
+    encoder = export_encoder(module, fmt)
+    yield encoder.start()
+    async with get_async_engine().connect() as conn:
+        async for rows in stream_table_async(module, conn, year_no=year_no):
+            yield encoder.encode(rows)
+    yield encoder.finish()
@@ -0,0 +1,203 @@
+"""
+Normalização vetorizada (pandas/NumPy) dos registros lidos dos JSONs do scraper.
+
+Cada função recebe a lista de entradas do JSON e devolve as colunas prontas para
+carga ({coluna: lista}), com o mesmo resultado dos antigos laços por registro:
+propagação do cabeçalho em maiúsculas (forward-fill), descarte das linhas "Total",
+conversão numérica e validação dos enums por conjunto.
+"""
+import numpy as np
+import pandas as pd
+from src.db.models import ColorEnum, GrapeTypeEnum, KindEnum, WineDerivativeEnum
+
+VALID_COLORS = {e.value for e in ColorEnum}
+VALID_KINDS = {e.value for e in KindEnum}
+VALID_WINE_DERIVATIVES = {e.value for e in WineDerivativeEnum}
+VALID_GRAPE_TYPES = {e.value for e in GrapeTypeEnum}
+
+
+def _column(data: list, key: str, default) -> pd.Series:
+    # Mesmo comportamento de entry.get(key, default), inclusive para valores None
+    return pd.Series([entry.get(key, default) for entry in data], dtype=object)
+
+
+def _raise_for(data: list, mask, label: str, reason: str):
+    positions = np.flatnonzero(np.asarray(mask))
+    if len(positions):
+        entry = data[positions[0]]
+        raise ValueError(f"Erro ao processar {label} '{entry}': {reason}")
+
+
+def _text(data: list, key: str, label: str) -> pd.Series:
+    """Equivalente a entry.get(key, "").strip(); falha se o valor não for texto."""
+    raw = _column(data, key, "")
+    stripped = raw.str.strip()
+    _raise_for(data, stripped.isna(), label, f"valor inválido para '{key}'")
+    return stripped
+
+
+def _collapse_spaces(values: pd.Series) -> pd.Series:
+    """Reduz espaços repetidos a um só (ex.: "VINHO  FINO DE MESA"), para comparar com os enums."""
+    return values.str.split().str.join(" ")
+
+
+def _is_none(values: pd.Series) -> np.ndarray:
+    return values.to_numpy() == None  # noqa: E711 - comparação elemento a elemento
+
+
+def _is_falsy(values: pd.Series) -> np.ndarray:
+    """Máscara dos valores falsos em Python (None, 0, 0.0, False, "")."""
+    array = values.to_numpy()
+    return (array == None) | (array == 0) | (array == "")  # noqa: E711
+
+
+def _to_float(values: pd.Series) -> pd.Series:
+    """
+    Equivalente a float(valor), com NaN onde float() levantaria ValueError.
+
+    A conversão é vetorizada; só os textos que o pandas não reconhece (ex.: "1_000")
+    passam pelo float() do Python.
+    """
+    numeric = pd.to_numeric(values, errors="coerce").astype(float)
+    retry = numeric.isna() & values.map(type).eq(str).to_numpy()
+    for index in np.flatnonzero(retry.to_numpy()):
+        try:
+            numeric.iat[index] = float(values.iat[index])
+        except ValueError:
+            pass
+    return numeric
+
+
+def _to_int(data: list, values: pd.Series, rows, label: str) -> pd.Series:
+    """
+    Equivalente a int(float(valor)) com ValueError -> 0, avaliado só nas linhas de rows.
+    """
+    _raise_for(data, _is_none(values) & rows, label, "float() argument must be a string or a real number, not 'NoneType'")
+    numeric = _to_float(values)
+    _raise_for(data, np.isinf(numeric.to_numpy()) & rows, label, "cannot convert float infinity to integer")
+    # Valores fora de rows (ex.: "inf" numa linha Total descartada) não são convertidos
+    finite = numeric.where(np.isfinite(numeric.to_numpy()), 0)
+    return np.trunc(finite).astype(np.int64)
+
+
+def _year(data: list) -> pd.Series:
+    """Equivalente a `ano if ano else None`."""
+    raw = _column(data, "ano", 0)
+    return raw.where(~_is_falsy(raw), None)
+
+
+def _columns(frame: pd.DataFrame) -> dict:
+    return {column: frame[column].tolist() for column in frame.columns}
+
+
+def to_records(columns: dict) -> list:
+    """Converte as colunas normalizadas em lista de registros (dicts)."""
+    names = list(columns)
+    return [dict(zip(names, values)) for values in zip(*columns.values())]
+
+
+def _forward_fill_header(names: pd.Series, is_header) -> pd.Series:
+    """Propaga o último cabeçalho visto para as linhas seguintes (None antes do primeiro)."""
+    positions = np.where(np.asarray(is_header, dtype=bool), np.arange(len(names)), -1)
+    last = np.maximum.accumulate(positions) if len(positions) else positions
+    headers = names.to_numpy()[np.maximum(last, 0)] if len(names) else names.to_numpy()
+    return pd.Series(np.where(last >= 0, headers, None), index=names.index, dtype=object)
+
+
+def normalize_product(data: list) -> dict:
+    label = "produto"
+    produto = _text(data, "produto", label)
+    rows = (produto != "Total").to_numpy()
+    quantity = _to_int(data, _column(data, "valor", 0), rows, label)
+    year = _year(data)
+
+    produto, quantity, year = produto[rows], quantity[rows], year[rows]
+    wine_derivative = _forward_fill_header(_collapse_spaces(produto), produto.str.isupper())
+    keep = wine_derivative.notna()  # ignorar registros antes do primeiro UPPERCASE
+
+    return _columns(pd.DataFrame({
+        "name": produto[keep],
+        "wine_derivative_name": wine_derivative[keep],
+        "quantity": quantity[keep],
+        "year_no": year[keep],
+    }))
+
+
+def normalize_process(data: list) -> dict:
+    label = "processo"
+    cultivar = _text(data, "cultivar", label)
+    raw = _column(data, "Quantidade (Kg)", None)
+    raw = raw.where(~_is_falsy(raw), "0").astype(str)
+    raw = raw.str.replace(".", "", regex=False).str.replace(",", ".", regex=False).str.replace("-", "0", regex=False)
+    kind = _text(data, "type", label)
+    year = _year(data)
+
+    rows = (cultivar != "Total").to_numpy()
+    quantity = _to_int(data, raw, rows, label)
+
+    header = _collapse_spaces(cultivar)
+    color = _forward_fill_header(header, cultivar.str.isupper() & header.isin(VALID_COLORS))
+    keep = rows & color.notna().to_numpy() & (kind != "").to_numpy()
+    invalid = keep & ~kind.isin(VALID_KINDS).to_numpy()
+    if invalid.any():
+        kind_raw = kind.iat[np.flatnonzero(invalid)[0]]
+        _raise_for(data, invalid, label, f"Tipo inválido encontrado: '{kind_raw}'")
+
+    return _columns(pd.DataFrame({
+        "color_name": color[keep],
+        "kind_name": kind[keep],
+        "cultivar": cultivar[keep],
+        "quantity_kg": quantity[keep],
+        "year_no": year[keep],
+    }))
+
+
+def normalize_sales(data: list) -> dict:
+    label = "comercialização"
+    produto = _text(data, "Produto", label)
+    rows = (produto != "Total").to_numpy()
+    quantity = _to_int(data, _column(data, "valor", 0), rows, label)
+    year = _year(data)
+
+    produto, quantity, year = produto[rows], quantity[rows], year[rows]
+    header = _collapse_spaces(produto)
+    wine_derivative = _forward_fill_header(header, produto.str.isupper() & header.isin(VALID_WINE_DERIVATIVES))
+    keep = wine_derivative.notna()
+
+    return _columns(pd.DataFrame({
+        "name": produto[keep],
+        "wine_derivative_name": wine_derivative[keep],
+        "quantity_liters": quantity[keep],
+        "year_no": year[keep],
+    }))
+
+
+def normalize_trade(data: list, label: str) -> dict:
+    """Normaliza importação ou exportação (mesmo layout de colunas)."""
+    country = _text(data, "País", label)
+    quantity_raw = _column(data, "Quantidade (Kg)", 0)
+    value_raw = _column(data, "Valor (US$)", 0)
+    grape_type = _text(data, "type", label)
+    year = _year(data)
+
+    rows = (country != "Total").to_numpy()
+    quantity = _to_int(data, quantity_raw, rows, label)
+    value = _to_float(value_raw).fillna(0.0)
+
+    keep = rows & grape_type.isin(VALID_GRAPE_TYPES).to_numpy()
+
+    return _columns(pd.DataFrame({
+        "grape_type_name": grape_type[keep],
+        "country": country[keep],
+        "quantity_kg": quantity[keep],
+        "value_usd": value[keep],
+        "year_no": year[keep],
+    }))
+
+
+def normalize_import(data: list) -> dict:
+    return normalize_trade(data, "importação")
+
+
+def normalize_export(data: list) -> dict:
+    return normalize_trade(data, "exportação")
@@ -1,46 +1,226 @@
+import csv
+import io
 from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.orm import Session
 from sqlalchemy import text
 
+# Colunas de dados de cada tabela, na ordem usada pelas leituras e carregamentos em lote
+TABLE_COLUMNS = {
+    "product": ["name", "wine_derivative_name", "quantity", "year_no"],
+    "process": ["color_name", "kind_name", "cultivar", "quantity_kg", "year_no"],
+    "sales": ["name", "wine_derivative_name", "quantity_liters", "year_no"],
+    "import": ["grape_type_name", "country", "quantity_kg", "value_usd", "year_no"],
+    "export": ["grape_type_name", "country", "quantity_kg", "value_usd", "year_no"],
+}
+
+# Chave natural de cada tabela (constraint uq_<tabela>_natural_key), usada no upsert.
+# As demais colunas se repetem nos dados da Embrapa (ex.: dois blocos "TINTAS" por ano
+# no processamento); seq_no numera essas ocorrências na ordem do arquivo
+TABLE_KEYS = {
+    "product": ["wine_derivative_name", "name", "year_no", "seq_no"],
+    "process": ["color_name", "kind_name", "cultivar", "year_no", "seq_no"],
+    "sales": ["wine_derivative_name", "name", "year_no", "seq_no"],
+    "import": ["grape_type_name", "country", "year_no", "seq_no"],
+    "export": ["grape_type_name", "country", "year_no", "seq_no"],
+}
+
+# Colunas gravadas pela importação: as de dados mais seq_no
+LOAD_COLUMNS = {table: columns + ["seq_no"] for table, columns in TABLE_COLUMNS.items()}
+
+# Colunas da chave natural que podem ser NULL (ano ausente no JSON)
+NULLABLE_KEYS = ("year_no",)
+
+# Marcador de NULL no CSV enviado ao COPY (o campo vazio continua sendo texto vazio)
+COPY_NULL = "\\N"
+
+# Tamanho dos lotes do INSERT multi-linha usado quando o COPY não está disponível
+BULK_BATCH_SIZE = 5000
+
+# Linhas por lote lidas do cursor no servidor nas exportações em streaming
+STREAM_BATCH_SIZE = 1000
+
 def insert_into_product(conn: Connection, record: dict):
     query = text("""
-        INSERT INTO product (name, wine_derivative_name, quantity, year_no)
-        VALUES (:name, :wine_derivative_name, :quantity, :year_no)
+        INSERT INTO product (name, wine_derivative_name, quantity, year_no, seq_no)
+        VALUES (:name, :wine_derivative_name, :quantity, :year_no, :seq_no)
     """)
     conn.execute(query, record)
 
 def insert_into_process(conn: Connection, record: dict):
     query = text("""
-        INSERT INTO process (color_name, kind_name, cultivar, quantity_kg, year_no)
-        VALUES (:color_name, :kind_name, :cultivar, :quantity_kg, :year_no)
+        INSERT INTO process (color_name, kind_name, cultivar, quantity_kg, year_no, seq_no)
+        VALUES (:color_name, :kind_name, :cultivar, :quantity_kg, :year_no, :seq_no)
     """)
     conn.execute(query, record)
 
 def insert_into_sales(conn: Connection, record: dict):
     query = text("""
-        INSERT INTO sales (name, wine_derivative_name, quantity_liters, year_no)
-        VALUES (:name, :wine_derivative_name, :quantity_liters, :year_no)
+        INSERT INTO sales (name, wine_derivative_name, quantity_liters, year_no, seq_no)
+        VALUES (:name, :wine_derivative_name, :quantity_liters, :year_no, :seq_no)
     """)
     conn.execute(query, record)
 
 def insert_into_import(conn: Connection, record: dict):
     query = text("""
-        INSERT INTO import (grape_type_name, country, quantity_kg, value_usd, year_no)
-        VALUES (:grape_type_name, :country, :quantity_kg, :value_usd, :year_no)
+        INSERT INTO import (grape_type_name, country, quantity_kg, value_usd, year_no, seq_no)
+        VALUES (:grape_type_name, :country, :quantity_kg, :value_usd, :year_no, :seq_no)
     """)
     conn.execute(query, record)
 
 def insert_into_export(conn: Connection, record: dict):
     query = text("""
-        INSERT INTO export (grape_type_name, country, quantity_kg, value_usd, year_no)
-        VALUES (:grape_type_name, :country, :quantity_kg, :value_usd, :year_no)
+        INSERT INTO export (grape_type_name, country, quantity_kg, value_usd, year_no, seq_no)
+        VALUES (:grape_type_name, :country, :quantity_kg, :value_usd, :year_no, :seq_no)
     """)
     conn.execute(query, record)
 
+def _dbapi_connection(conn: Connection):
+    if isinstance(conn, Session):
+        conn = conn.connection()
+    return conn.connection.dbapi_connection
+
+def supports_copy(conn: Connection) -> bool:
+    """Indica se o driver da conexão oferece COPY FROM STDIN (copy_expert)."""
+    cursor = _dbapi_connection(conn).cursor()
+    try:
+        return hasattr(cursor, "copy_expert")
+    finally:
+        cursor.close()
+
+def copy_into_table(conn: Connection, table: str, records: list, columns: list = None) -> int:
+    """
+    Carrega os registros com COPY FROM STDIN (psycopg2 copy_expert) na transação corrente.
+
+    Returns:
+        int: Quantidade de linhas carregadas
+    """
+    columns = columns or LOAD_COLUMNS[table]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    for record in records:
+        writer.writerow([COPY_NULL if record[column] is None else record[column] for column in columns])
+    buffer.seek(0)
+
+    cursor = _dbapi_connection(conn).cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')",
+            buffer
+        )
+    finally:
+        cursor.close()
+    return len(records)
+
+def insert_many_into_table(conn: Connection, table: str, records: list, columns: list = None,
+                           batch_size: int = None) -> int:
+    """
+    Carrega os registros com INSERTs multi-linha (executemany) em lotes de batch_size.
+
+    Returns:
+        int: Quantidade de linhas carregadas
+    """
+    columns = columns or LOAD_COLUMNS[table]
+    batch_size = batch_size or BULK_BATCH_SIZE
+    query = text(f"""
+        INSERT INTO {table} ({', '.join(columns)})
+        VALUES ({', '.join(f':{column}' for column in columns)})
+    """)
+    for start in range(0, len(records), batch_size):
+        conn.execute(query, records[start:start + batch_size])
+    return len(records)
+
+def bulk_insert_into_table(conn: Connection, table: str, records: list, columns: list = None) -> int:
+    """
+    Carrega os registros em lote: COPY quando o driver suporta, senão executemany.
+    """
+    if not records:
+        return 0
+    if supports_copy(conn):
+        return copy_into_table(conn, table, records, columns)
+    return insert_many_into_table(conn, table, records, columns)
+
+def upsert_into_table(conn: Connection, table: str, records: list) -> dict:
+    """
+    Aplica os registros pela chave natural: carrega-os numa tabela temporária,
+    faz INSERT ... ON CONFLICT DO UPDATE só das linhas novas ou alteradas e remove
+    as linhas que não vieram na carga. A comparação roda no banco, sem ler a tabela.
+
+    Returns:
+        dict: {"upserted": linhas inseridas ou alteradas, "deleted": linhas removidas}
+    """
+    keys = TABLE_KEYS[table]
+    columns = LOAD_COLUMNS[table]
+    values = [column for column in columns if column not in keys]
+    incoming = f"{table}_incoming"
+    conn.execute(text(f"DROP TABLE IF EXISTS {incoming}"))
+    conn.execute(text(
+        f"CREATE TEMP TABLE {incoming} ON COMMIT DROP AS SELECT {', '.join(columns)} FROM {table} WITH NO DATA"
+    ))
+    bulk_insert_into_table(conn, incoming, records, columns)
+
+    upserted = conn.execute(text(f"""
+        INSERT INTO {table} AS t ({', '.join(columns)})
+        SELECT {', '.join(columns)} FROM {incoming}
+        ON CONFLICT ({', '.join(keys)}) DO UPDATE
+        SET {', '.join(f'{column} = EXCLUDED.{column}' for column in values)}
+        WHERE ({', '.join(f't.{column}' for column in values)})
+            IS DISTINCT FROM ({', '.join(f'EXCLUDED.{column}' for column in values)})
+    """)).rowcount
+    same_key = " AND ".join(
+        f"t.{key} IS NOT DISTINCT FROM i.{key}" if key in NULLABLE_KEYS else f"t.{key} = i.{key}"
+        for key in keys
+    )
+    deleted = conn.execute(text(f"""
+        DELETE FROM {table} AS t
+        WHERE NOT EXISTS (SELECT 1 FROM {incoming} AS i WHERE {same_key})
+    """)).rowcount
+    return {"upserted": upserted, "deleted": deleted}
+
+def staging_table_name(table: str) -> str:
+    return f"{table}_staging"
+
+# A criação, indexação, troca e remoção das stagings passam pelas funções da migration
+# 0049, que rodam com o dono das tabelas: a aplicação conecta com um papel só de DML,
+# sem CREATE no schema, e as tabelas trocadas continuam pertencendo ao dono
+
+def create_staging_table(conn: Connection, table: str) -> str:
+    """
+    Cria (ou recria vazia) a tabela de staging com a mesma estrutura da tabela real,
+    sem índices, e com os mesmos privilégios concedidos.
+    """
+    conn.execute(text("SELECT create_staging_table(:table)"), {"table": table})
+    return staging_table_name(table)
+
+def build_staging_indexes(conn: Connection, table: str):
+    """
+    Cria na staging, já carregada, os mesmos índices e constraints da tabela real
+    (com o sufixo _staging no nome) e atualiza as estatísticas.
+    """
+    conn.execute(text("SELECT build_staging_indexes(:table)"), {"table": table})
+
+def swap_staging_table(conn: Connection, table: str):
+    """
+    Troca a tabela real pela staging com RENAME, na transação corrente.
+
+    A tabela antiga é removida; a sequence do id passa a pertencer à nova tabela, a
+    materialized view de totais é recriada sobre ela e os índices/constraints da
+    staging recebem os nomes originais. Nada fica visível para os leitores até o commit.
+    """
+    conn.execute(text("SELECT swap_staging_table(:table)"), {"table": table})
+
+def drop_staging_table(conn: Connection, table: str):
+    conn.execute(text("SELECT drop_staging_table(:table)"), {"table": table})
+
 def delete_all_from_table(table: str, conn: Connection):
+    # Sem commit: a limpeza e a recarga ficam na mesma transação, e os leitores
+    # continuam vendo os dados antigos até o commit de quem chamou
     conn.execute(text(f"DELETE FROM {table};"))
-    conn.commit()
 
-def get_all_from_table(table: str, conn: Connection, year_no: int = None, skip: int = 0, limit: int = 100):
+def _rows(result) -> list:
+    return [dict(row._mapping) for row in result]
+
+def _all_from_table_query(table: str, year_no: int = None, skip: int = 0, limit: int = 100):
     base_query = f"SELECT * FROM {table}"
     params = {}
 
@@ -50,10 +230,162 @@ def get_all_from_table(table: str, conn: Connection, year_no: int = None, skip:
 
     base_query += " ORDER BY id OFFSET :skip LIMIT :limit"
     params.update({"skip": skip, "limit": limit})
+    return text(base_query), params
 
-    query = text(base_query)
-    result = conn.execute(query, params)
-    return [dict(row._mapping) for row in result]
+def get_all_from_table(table: str, conn: Connection, year_no: int = None, skip: int = 0, limit: int = 100):
+    return _rows(conn.execute(*_all_from_table_query(table, year_no, skip, limit)))
+
+async def get_all_from_table_async(table: str, conn: AsyncConnection, year_no: int = None, skip: int = 0, limit: int = 100):
+    return _rows(await conn.execute(*_all_from_table_query(table, year_no, skip, limit)))
+
+def _page_after_id_query(table: str, year_no: int = None, after_id: int = 0, limit: int = 100):
+    """
+    Paginação por cursor (keyset): lê as linhas com id > after_id em ordem de id.
+
+    Com o índice (year_no, id), cada página é uma varredura de intervalo no índice,
+    sem percorrer e descartar as linhas das páginas anteriores como no OFFSET.
+    """
+    base_query = f"SELECT * FROM {table} WHERE id > :after_id"
+    params = {"after_id": after_id, "limit": limit}
+
+    if year_no is not None:
+        base_query += " AND year_no = :year_no"
+        params["year_no"] = year_no
+
+    base_query += " ORDER BY id LIMIT :limit"
+    return text(base_query), params
+
+def get_page_after_id(table: str, conn: Connection, year_no: int = None, after_id: int = 0, limit: int = 100):
+    return _rows(conn.execute(*_page_after_id_query(table, year_no, after_id, limit)))
+
+async def get_page_after_id_async(table: str, conn: AsyncConnection, year_no: int = None, after_id: int = 0, limit: int = 100):
+    return _rows(await conn.execute(*_page_after_id_query(table, year_no, after_id, limit)))
+
+def _stream_query(table: str, year_no: int = None):
+    base_query = f"SELECT {', '.join(['id'] + TABLE_COLUMNS[table])} FROM {table}"
+    params = {}
+
+    if year_no is not None:
+        base_query += " WHERE year_no = :year_no"
+        params["year_no"] = year_no
+
+    base_query += " ORDER BY id"
+    return text(base_query), params
+
+def stream_table(table: str, conn: Connection, year_no: int = None, batch_size: int = None):
+    """
+    Lê a tabela inteira por um cursor no servidor (stream_results/yield_per), entregando
+    lotes de tuplas (id + TABLE_COLUMNS) sem carregar o resultado todo em memória.
+    """
+    query, params = _stream_query(table, year_no)
+    result = conn.execution_options(stream_results=True, yield_per=batch_size or STREAM_BATCH_SIZE).execute(query, params)
+    for partition in result.partitions():
+        yield [tuple(row) for row in partition]
+
+async def stream_table_async(table: str, conn: AsyncConnection, year_no: int = None, batch_size: int = None):
+    query, params = _stream_query(table, year_no)
+    result = await conn.stream(query, params, execution_options={"yield_per": batch_size or STREAM_BATCH_SIZE})
+    async for partition in result.partitions():
+        yield [tuple(row) for row in partition]
+
+# Colunas permitidas no GROUP BY e colunas numéricas agregadas em cada tabela
+AGGREGATE_DIMENSIONS = {
+    "product": ["year_no", "wine_derivative_name", "name"],
+    "process": ["year_no", "color_name", "kind_name", "cultivar"],
+    "sales": ["year_no", "wine_derivative_name", "name"],
+    "import": ["year_no", "grape_type_name", "country"],
+    "export": ["year_no", "grape_type_name", "country"],
+}
+
+AGGREGATE_MEASURES = {
+    "product": ["quantity"],
+    "process": ["quantity_kg"],
+    "sales": ["quantity_liters"],
+    "import": ["quantity_kg", "value_usd"],
+    "export": ["quantity_kg", "value_usd"],
+}
+
+AGGREGATE_FUNCTIONS = ("sum", "avg", "min", "max", "count")
+
+# Materialized views com os totais por ano e categoria (SUM das medidas e COUNT(*)),
+# atualizadas após cada importação
+ROLLUP_VIEWS = {
+    "product": {"name": "product_rollup", "dimensions": ["year_no", "wine_derivative_name"]},
+    "process": {"name": "process_rollup", "dimensions": ["year_no", "color_name", "kind_name"]},
+    "sales": {"name": "sales_rollup", "dimensions": ["year_no", "wine_derivative_name"]},
+    "import": {"name": "import_rollup", "dimensions": ["year_no", "grape_type_name"]},
+    "export": {"name": "export_rollup", "dimensions": ["year_no", "grape_type_name"]},
+}
+
+def refresh_rollup(conn: Connection, table: str):
+    """REFRESH ... CONCURRENTLY da view do módulo, pela função refresh_rollup (migration 0045)."""
+    conn.execute(text("SELECT refresh_rollup(:module)"), {"module": table})
+
+def rollup_for(table: str, group_by: list, agg: str):
+    """Nome da materialized view que responde à agregação, ou None se ela não cobrir."""
+    rollup = ROLLUP_VIEWS.get(table)
+    if rollup and agg in ("sum", "count") and set(group_by) <= set(rollup["dimensions"]):
+        return rollup["name"]
+    return None
+
+def _aggregate_query(table: str, group_by: list, agg: str = "sum", year_from: int = None, year_to: int = None):
+    """
+    Agrega a tabela no banco (GROUP BY), com colunas e função validadas pelas listas acima.
+
+    Com agg="count" retorna a quantidade de registros por grupo; nas demais funções,
+    uma coluna por medida da tabela (ex.: quantity_kg e value_usd). SUM e COUNT
+    agrupados só por dimensões da materialized view (ROLLUP_VIEWS) são lidos dela.
+    """
+    invalid = [column for column in group_by if column not in AGGREGATE_DIMENSIONS[table]]
+    if invalid:
+        raise ValueError(f"Colunas inválidas para agrupar '{table}': {', '.join(invalid)}. Válidas: {', '.join(AGGREGATE_DIMENSIONS[table])}.")
+    if agg not in AGGREGATE_FUNCTIONS:
+        raise ValueError(f"Agregação inválida '{agg}'. Válidas: {', '.join(AGGREGATE_FUNCTIONS)}.")
+
+    # SUM e COUNT por ano/categoria saem da materialized view: só re-somam os totais já
+    # calculados, sem varrer a tabela
+    source = rollup_for(table, group_by, agg)
+    if source and agg == "count":
+        measures = ["CAST(SUM(count) AS BIGINT) AS count"]
+    elif source:
+        measures = [f"SUM({column}) AS {column}" for column in AGGREGATE_MEASURES[table]]
+    elif agg == "count":
+        measures = ["COUNT(*) AS count"]
+    else:
+        measures = [f"{agg.upper()}({column}) AS {column}" for column in AGGREGATE_MEASURES[table]]
+    query = f"SELECT {', '.join(group_by + measures)} FROM {source or table}"
+
+    conditions, params = [], {}
+    if year_from is not None:
+        conditions.append("year_no >= :year_from")
+        params["year_from"] = year_from
+    if year_to is not None:
+        conditions.append("year_no <= :year_to")
+        params["year_to"] = year_to
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    if group_by:
+        query += f" GROUP BY {', '.join(group_by)} ORDER BY {', '.join(group_by)}"
+    return text(query), params
+
+def aggregate_table(table: str, conn: Connection, group_by: list, agg: str = "sum", year_from: int = None, year_to: int = None):
+    return _rows(conn.execute(*_aggregate_query(table, group_by, agg, year_from, year_to)))
+
+async def aggregate_table_async(table: str, conn: AsyncConnection, group_by: list, agg: str = "sum", year_from: int = None, year_to: int = None):
+    return _rows(await conn.execute(*_aggregate_query(table, group_by, agg, year_from, year_to)))
+
+DATASET_VERSION_QUERY = text("SELECT version FROM dataset_version WHERE id = 1")
+
+def get_dataset_version(conn: Connection) -> int:
+    return conn.execute(DATASET_VERSION_QUERY).scalar_one()
+
+async def get_dataset_version_async(conn: AsyncConnection) -> int:
+    return (await conn.execute(DATASET_VERSION_QUERY)).scalar_one()
+
+def bump_dataset_version(conn: Connection) -> int:
+    """Incrementa a versão dos dados (sem commit) e retorna a nova versão."""
+    query = text("UPDATE dataset_version SET version = version + 1, updated_at = now() WHERE id = 1 RETURNING version")
+    return conn.execute(query).scalar_one()
 
 def delete_product_data(conn: Connection):
     delete_all_from_table("product", conn)
@@ -0,0 +1,202 @@
+import json
+from sqlalchemy.engine import Connection
+from sqlalchemy import text
+
+# Status em que um job ainda está ativo (e bloqueia outro job com a mesma dedupe_key)
+ACTIVE_STATUSES = ("pendente", "em_andamento")
+FINISHED_STATUSES = ("concluído", "erro", "cancelado")
+
+JOB_COLUMNS = """
+    id, status, dedupe_key, params, progress, result, error, cancel_requested,
+    worker, created_at, started_at, finished_at
+"""
+
+def _job(row) -> dict:
+    job = dict(row._mapping)
+    job["id"] = str(job["id"])
+    return job
+
+def enqueue_job(conn: Connection, job_id: str, dedupe_key: str, params: dict) -> tuple:
+    """
+    Enfileira um job, a menos que já exista um ativo com a mesma dedupe_key.
+
+    Returns:
+        tuple: (id do job, True se foi criado agora ou False se reaproveitou o ativo)
+    """
+    insert = text(f"""
+        INSERT INTO scraper_job (id, dedupe_key, params)
+        VALUES (:id, :dedupe_key, CAST(:params AS JSONB))
+        ON CONFLICT (dedupe_key) WHERE status IN {ACTIVE_STATUSES} DO NOTHING
+        RETURNING id
+    """)
+    active = text(f"SELECT id FROM scraper_job WHERE dedupe_key = :dedupe_key AND status IN {ACTIVE_STATUSES}")
+    # O job ativo pode terminar entre o INSERT e o SELECT: tenta de novo
+    for _ in range(3):
+        created = conn.execute(insert, {"id": job_id, "dedupe_key": dedupe_key, "params": json.dumps(params)}).scalar()
+        if created is not None:
+            return str(created), True
+        existing = conn.execute(active, {"dedupe_key": dedupe_key}).scalar()
+        if existing is not None:
+            return str(existing), False
+    raise RuntimeError(f"Não foi possível enfileirar o job '{dedupe_key}'.")
+
+def dequeue_job(conn: Connection, worker: str):
+    """
+    Marca o job pendente mais antigo como em andamento para este worker e o retorna
+    (None se a fila estiver vazia). Jobs já travados por outro worker são pulados.
+    """
+    query = text(f"""
+        UPDATE scraper_job
+        SET status = 'em_andamento', worker = :worker, started_at = now(), heartbeat_at = now()
+        WHERE id = (
+            SELECT id FROM scraper_job
+            WHERE status = 'pendente'
+            ORDER BY created_at
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING {JOB_COLUMNS}
+    """)
+    row = conn.execute(query, {"worker": worker}).first()
+    return _job(row) if row is not None else None
+
+def heartbeat_job(conn: Connection, job_id: str, worker: str, progress: float) -> bool:
+    """
+    Atualiza o progresso do job em andamento neste worker; retorna True se ele deve
+    parar (cancelamento pedido ou o job não está mais em andamento com este worker).
+    """
+    query = text("""
+        UPDATE scraper_job SET progress = :progress, heartbeat_at = now()
+        WHERE id = :id AND status = 'em_andamento' AND worker = :worker
+        RETURNING cancel_requested
+    """)
+    cancel_requested = conn.execute(query, {"id": job_id, "worker": worker, "progress": progress}).scalar()
+    return cancel_requested is None or cancel_requested
+
+def finish_job(conn: Connection, job_id: str, worker: str, status: str, result: dict = None, error: str = None) -> bool:
+    """
+    Grava o status final do job, se ele ainda pertence a este worker (um job devolvido
+    à fila e retomado por outro worker não é sobrescrito). Retorna False se não gravou.
+    """
+    if status not in FINISHED_STATUSES:
+        raise ValueError(f"Status final inválido '{status}'.")
+    query = text("""
+        UPDATE scraper_job
+        SET status = :status, result = CAST(:result AS JSONB), error = :error, finished_at = now(),
+            progress = CASE WHEN :status = 'concluído' THEN 100 ELSE progress END
+        WHERE id = :id AND worker = :worker
+    """)
+    return conn.execute(query, {
+        "id": job_id,
+        "worker": worker,
+        "status": status,
+        "result": json.dumps(result, default=str) if result is not None else None,
+        "error": error
+    }).rowcount > 0
+
+def cancel_job(conn: Connection, job_id: str):
+    """
+    Cancela um job: o pendente sai da fila na hora; no em andamento, o cancelamento
+    é sinalizado e o worker o interrompe no próximo heartbeat.
+
+    Returns:
+        str: status resultante ou None se o job não existir
+    """
+    query = text("""
+        UPDATE scraper_job
+        SET status = CASE WHEN status = 'pendente' THEN 'cancelado' ELSE status END,
+            finished_at = CASE WHEN status = 'pendente' THEN now() ELSE finished_at END,
+            cancel_requested = cancel_requested OR status IN ('pendente', 'em_andamento')
+        WHERE id = :id
+        RETURNING status
+    """)
+    return conn.execute(query, {"id": job_id}).scalar()
+
+def get_job(conn: Connection, job_id: str):
+    row = conn.execute(text(f"SELECT {JOB_COLUMNS} FROM scraper_job WHERE id = :id"), {"id": job_id}).first()
+    return _job(row) if row is not None else None
+
+def list_jobs(conn: Connection, skip: int = 0, limit: int = 20, status: str = None) -> tuple:
+    """Jobs do mais recente ao mais antigo, paginados. Retorna (jobs, total)."""
+    where = "WHERE status = :status" if status else ""
+    params = {"skip": skip, "limit": limit, "status": status}
+    rows = conn.execute(text(f"""
+        SELECT {JOB_COLUMNS} FROM scraper_job {where}
+        ORDER BY created_at DESC, id
+        OFFSET :skip LIMIT :limit
+    """), params).fetchall()
+    total = conn.execute(text(f"SELECT COUNT(*) FROM scraper_job {where}"), params).scalar_one()
+    return [_job(row) for row in rows], total
+
+def requeue_stale_jobs(conn: Connection, stale_seconds: float) -> int:
+    """Devolve à fila os jobs em andamento sem heartbeat recente (worker que morreu)."""
+    query = text("""
+        UPDATE scraper_job SET status = 'pendente', worker = NULL, started_at = NULL, progress = 0
+        WHERE status = 'em_andamento' AND heartbeat_at < now() - make_interval(secs => :stale_seconds)
+    """)
+    return conn.execute(query, {"stale_seconds": stale_seconds}).rowcount
+
+def purge_jobs(conn: Connection, retention_seconds: float, max_finished: int) -> int:
+    """
+    Remove os jobs finalizados há mais de retention_seconds e os que excedem os
+    max_finished mais recentes. Jobs ativos nunca são removidos.
+    """
+    query = text(f"""
+        DELETE FROM scraper_job
+        WHERE status IN {FINISHED_STATUSES}
+          AND (
+            finished_at < now() - make_interval(secs => :retention_seconds)
+            OR id NOT IN (
+                SELECT id FROM scraper_job
+                WHERE status IN {FINISHED_STATUSES}
+                ORDER BY finished_at DESC
+                LIMIT :max_finished
+            )
+          )
+    """)
+    return conn.execute(query, {"retention_seconds": retention_seconds, "max_finished": max_finished}).rowcount
+
+def insert_job_event(conn: Connection, job_id: str, stage: str, payload: dict):
+    query = text("""
+        INSERT INTO scraper_job_event (job_id, stage, payload)
+        VALUES (:job_id, :stage, CAST(:payload AS JSONB))
+    """)
+    conn.execute(query, {"job_id": job_id, "stage": stage, "payload": json.dumps(payload, default=str)})
+
+def list_job_events(conn: Connection, job_id: str, after_id: int = 0, limit: int = 500) -> list:
+    """Eventos do job com id maior que after_id, em ordem de emissão."""
+    query = text("""
+        SELECT id, stage, payload, created_at FROM scraper_job_event
+        WHERE job_id = :job_id AND id > :after_id
+        ORDER BY id
+        LIMIT :limit
+    """)
+    rows = conn.execute(query, {"job_id": job_id, "after_id": after_id, "limit": limit})
+    return [dict(row._mapping) for row in rows]
+
+def get_job_status(conn: Connection, job_id: str):
+    return conn.execute(text("SELECT status FROM scraper_job WHERE id = :id"), {"id": job_id}).scalar()
+
+def try_advisory_xact_lock(conn: Connection, key: int) -> bool:
+    """Tenta o lock consultivo da transação atual, sem esperar (liberado no commit/rollback)."""
+    return conn.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": key}).scalar()
+
+def get_last_scheduled_run(conn: Connection, name: str):
+    query = text("SELECT last_run_at FROM scheduler_state WHERE name = :name")
+    return conn.execute(query, {"name": name}).scalar()
+
+def record_scheduled_run(conn: Connection, name: str, job_id: str, manifest_sha256: str = None):
+    query = text("""
+        INSERT INTO scheduler_state (name, last_run_at, last_job_id, manifest_sha256)
+        VALUES (:name, now(), :job_id, :manifest_sha256)
+        ON CONFLICT (name) DO UPDATE SET
+            last_run_at = EXCLUDED.last_run_at,
+            last_job_id = EXCLUDED.last_job_id,
+            manifest_sha256 = EXCLUDED.manifest_sha256
+    """)
+    conn.execute(query, {"name": name, "job_id": job_id, "manifest_sha256": manifest_sha256})
+
+def get_imported_manifest(conn: Connection, name: str):
+    """Assinatura do manifesto gravada com a última execução (None se nunca importou)."""
+    query = text("SELECT manifest_sha256 FROM scheduler_state WHERE name = :name")
+    return conn.execute(query, {"name": name}).scalar()
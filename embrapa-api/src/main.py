@@ -1,18 +1,45 @@
 import uvicorn
 import os
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from src.api.routes import router as api_router
+from src.api.responses import DataJSONResponse
+from src.api.compression import CompressionMiddleware
+from src.config.settings import settings
+from src.tasks.jobs import encerrar_executor, worker_loop
+from src.tasks.scheduler import scheduler_loop
 from prometheus_fastapi_instrumentator import Instrumentator
 
 # Garantir que os diretórios necessários existam
 os.makedirs("data/vitibrasil", exist_ok=True)
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Worker da fila de jobs do scraper (com JOB_WORKER_ENABLED) e agendador da
+    # atualização periódica (só a réplica que obtém o lock enfileira o job)
+    parar = asyncio.Event()
+    tarefas = []
+    if settings.JOB_WORKER_ENABLED:
+        tarefas.append(asyncio.create_task(worker_loop(parar)))
+    if settings.REFRESH_SCHEDULE_ENABLED:
+        tarefas.append(asyncio.create_task(scheduler_loop(parar)))
+    yield
+    parar.set()
+    for tarefa in tarefas:
+        tarefa.cancel()
+    await asyncio.gather(*tarefas, return_exceptions=True)
+    encerrar_executor()
+
+
 app = FastAPI(
     title="Embrapa API",
     description="API REST para o projeto de pós-graduação FIAP-Embrapa",
-    version="0.1.0"
+    version="0.1.0",
+    default_response_class=DataJSONResponse,
+    lifespan=lifespan
 )
 
 # Initialize and expose metrics
@@ -27,6 +54,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compressão gzip/br conforme o Accept-Encoding (ver COMPRESSION_* nas settings)
+app.add_middleware(CompressionMiddleware)
+
 app.include_router(api_router, prefix="/api")
 
 @app.get("/")
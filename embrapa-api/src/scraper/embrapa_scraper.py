@@ -1,14 +1,21 @@
 import os
 import logging
+import threading
 import requests
 from bs4 import BeautifulSoup
-from urllib.parse import urljoin
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urljoin, urlparse
+import numpy as np
 import pandas as pd
 import chardet
 import re
+import io
+import time
 import json
+import hashlib
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
+from src.config.settings import settings
 
 logging.basicConfig(
     level=logging.INFO,
@@ -20,8 +27,25 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-session = requests.Session()
-session.headers.update({'User-Agent': 'Mozilla/5.0'})
+# requests.Session não é thread-safe: cada thread do pool usa a sua própria sessão
+_thread_local = threading.local()
+
+# Semáforos que limitam as requisições simultâneas por host
+_host_semaphores = {}
+_host_semaphores_lock = threading.Lock()
+
+# Manifesto com ETag, Last-Modified e SHA-256 de cada CSV baixado
+MANIFEST_FILE = ".manifest.json"
+_manifest_lock = threading.Lock()
+
+# Opções do VitiBrasil e o tipo de página de cada uma
+opcoes = {
+    "opt_02": "principal",
+    "opt_04": "principal",
+    "opt_03": "suboptions",
+    "opt_05": "suboptions",
+    "opt_06": "suboptions"
+}
 
 # Labels das subopções
 suboption_labels = {
@@ -46,6 +70,48 @@ suboption_labels = {
     }
 }
 
+def _criar_sessao(max_por_host):
+    sessao = requests.Session()
+    sessao.headers.update({'User-Agent': 'Mozilla/5.0'})
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504])
+    adapter = HTTPAdapter(max_retries=retry, pool_maxsize=max_por_host)
+    sessao.mount("http://", adapter)
+    sessao.mount("https://", adapter)
+    return sessao
+
+def get_session():
+    """
+    Retorna a sessão HTTP da thread atual, criando-a no primeiro uso.
+    """
+    sessao = getattr(_thread_local, "session", None)
+    if sessao is None:
+        sessao = _criar_sessao(settings.SCRAPER_MAX_CONCURRENCY_PER_HOST)
+        _thread_local.session = sessao
+    return sessao
+
+def _semaforo_host(url, max_por_host):
+    chave = (urlparse(url).netloc, max_por_host)
+    with _host_semaphores_lock:
+        semaforo = _host_semaphores.get(chave)
+        if semaforo is None:
+            semaforo = threading.BoundedSemaphore(max_por_host)
+            _host_semaphores[chave] = semaforo
+    return semaforo
+
+def http_get(url, max_por_host=None, **kwargs):
+    """
+    Faz um GET respeitando o limite de requisições simultâneas por host.
+
+    Args:
+        url: URL a ser requisitada
+        max_por_host: Máximo de requisições simultâneas para o mesmo host
+            (padrão: settings.SCRAPER_MAX_CONCURRENCY_PER_HOST)
+    """
+    max_por_host = max_por_host or settings.SCRAPER_MAX_CONCURRENCY_PER_HOST
+    kwargs.setdefault("timeout", settings.SCRAPER_REQUEST_TIMEOUT)
+    with _semaforo_host(url, max_por_host):
+        return get_session().get(url, **kwargs)
+
 def fetch_csv_link(html, base_url):
     soup = BeautifulSoup(html, 'html.parser')
     link_tag = soup.find('a', href=True, text=lambda x: x and 'CSV' in x.upper())
@@ -55,35 +121,170 @@ def fetch_csv_link(html, base_url):
         return urljoin(base_url, link_tag['href'])
     return None
 
-def download_csv(csv_url, dest_path):
-    response = session.get(csv_url)
-    if response.status_code == 200:
+def carregar_manifesto(output_dir):
+    caminho = os.path.join(output_dir, MANIFEST_FILE)
+    if not os.path.exists(caminho):
+        return {}
+    try:
+        with open(caminho, encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning(f"Manifesto inválido em {caminho}, ignorando: {str(e)}")
+        return {}
+
+def salvar_manifesto(output_dir, manifesto):
+    caminho = os.path.join(output_dir, MANIFEST_FILE)
+    temp = f"{caminho}.tmp"
+    with _manifest_lock:
+        with open(temp, "w", encoding='utf-8') as f:
+            json.dump(manifesto, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(temp, caminho)
+
+def assinatura_manifesto(manifesto):
+    """SHA-256 do conjunto (URL, SHA-256 do CSV) do manifesto: muda quando algum CSV muda."""
+    itens = sorted(f"{url} {entrada.get('sha256')}" for url, entrada in manifesto.items())
+    return hashlib.sha256("\n".join(itens).encode("utf-8")).hexdigest()
+
+def baixar_csv(csv_url, max_por_host=None, manifesto=None):
+    """
+    Baixa o CSV em memória com GET condicional (If-None-Match / If-Modified-Since).
+
+    Quando um manifesto é informado, a entrada da URL é usada para montar os
+    cabeçalhos condicionais e é atualizada após um download bem-sucedido. Quem
+    grava o conteúdo deve passar um manifesto pendente (ver _manifesto_pendente)
+    e só confirmar a entrada depois de gravar: senão uma falha na gravação deixaria
+    no manifesto o ETag/SHA de um conteúdo que não está em disco.
+
+    Returns:
+        bytes: Conteúdo do CSV, ou None se não mudou desde o último download
+    """
+    entrada = manifesto.get(csv_url) if manifesto is not None else None
+    headers = {}
+    if entrada:
+        if entrada.get("etag"):
+            headers["If-None-Match"] = entrada["etag"]
+        if entrada.get("last_modified"):
+            headers["If-Modified-Since"] = entrada["last_modified"]
+
+    response = http_get(csv_url, max_por_host=max_por_host, headers=headers)
+    if response.status_code == 304:
+        logger.info(f"CSV inalterado (304): {csv_url}")
+        return None
+    if response.status_code != 200:
+        raise Exception(f"Erro ao baixar CSV. Status: {response.status_code}")
+
+    sha256 = hashlib.sha256(response.content).hexdigest()
+    if manifesto is not None:
+        with _manifest_lock:
+            manifesto[csv_url] = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "sha256": sha256,
+            }
+    if entrada and entrada.get("sha256") == sha256:
+        logger.info(f"CSV inalterado (mesmo SHA-256): {csv_url}")
+        return None
+    return response.content
+
+def _manifesto_pendente(manifesto, csv_url):
+    """Cópia da entrada da URL para o baixar_csv atualizar antes da confirmação."""
+    if manifesto is None:
+        return None
+    with _manifest_lock:
+        return {csv_url: manifesto[csv_url]} if csv_url in manifesto else {}
+
+def _confirmar_manifesto(manifesto, csv_url, pendente):
+    """Grava no manifesto a entrada baixada, depois que o conteúdo foi salvo."""
+    if manifesto is not None and csv_url in pendente:
+        with _manifest_lock:
+            manifesto[csv_url] = pendente[csv_url]
+
+def download_csv(csv_url, dest_path, max_por_host=None, manifesto=None):
+    """
+    Baixa o CSV para dest_path (ver baixar_csv).
+
+    Returns:
+        bool: True se o conteúdo foi gravado em dest_path, False se não mudou
+    """
+    pendente = _manifesto_pendente(manifesto, csv_url)
+    conteudo = baixar_csv(csv_url, max_por_host=max_por_host, manifesto=pendente)
+    if conteudo is not None:
         with open(dest_path, 'wb') as f:
-            f.write(response.content)
+            f.write(conteudo)
         logger.info(f"CSV salvo em: {dest_path}")
-    else:
-        raise Exception(f"Erro ao baixar CSV. Status: {response.status_code}")
+    _confirmar_manifesto(manifesto, csv_url, pendente)
+    return conteudo is not None
+
+def _esta_atualizado(caminho_saida, caminhos_entrada):
+    """Indica se caminho_saida existe e é mais recente que todas as entradas."""
+    if not os.path.exists(caminho_saida):
+        return False
+    mtime_saida = os.path.getmtime(caminho_saida)
+    return all(os.path.getmtime(c) <= mtime_saida for c in caminhos_entrada)
+
+def decodificar_csv(conteudo):
+    """
+    Detecta, uma única vez, a codificação e o separador de um CSV em memória.
+
+    UTF-8 é tentado primeiro; o chardet só é consultado quando o conteúdo não
+    é UTF-8 válido.
 
-def detectar_separador_e_codificacao(filepath):
-    with open(filepath, 'rb') as f:
-        result = chardet.detect(f.read(2048))
-    encoding = result['encoding'] or 'utf-8'
-    if encoding.lower() == 'ascii':
+    Returns:
+        tuple: (texto decodificado, separador, codificação)
+    """
+    try:
+        texto = conteudo.decode('utf-8')
         encoding = 'utf-8'
-    with open(filepath, 'r', encoding=encoding, errors='ignore') as f:
-        amostra = [f.readline() for _ in range(5)]
-        conteudo = ''.join(amostra)
-        if conteudo.count(';') > conteudo.count('\t'):
-            sep = ';'
-        elif conteudo.count('\t') > conteudo.count(';'):
-            sep = '\t'
-        else:
-            sep = ','
-    return sep, encoding
+    except UnicodeDecodeError:
+        result = chardet.detect(conteudo[:2048])
+        encoding = result['encoding'] or 'utf-8'
+        if encoding.lower() == 'ascii':
+            encoding = 'utf-8'
+        texto = conteudo.decode(encoding, errors='ignore')
+
+    amostra = ''.join(texto.split('\n', 5)[:5])
+    if amostra.count(';') > amostra.count('\t'):
+        sep = ';'
+    elif amostra.count('\t') > amostra.count(';'):
+        sep = '\t'
+    else:
+        sep = ','
+    return texto, sep, encoding
+
+# Opções cujos CSVs trazem, para cada ano, uma coluna de quantidade ("1970")
+# seguida de uma coluna de valor ("1970.1")
+opcoes_com_valor = ["opt_05", "opt_06"]
+
+def _derreter_quantidade_e_valor(df):
+    """
+    Reformata os pares de colunas ano/ano.1 em linhas com 'Quantidade (Kg)' e
+    'Valor (US$)' lado a lado, numa única operação vetorizada.
+    """
+    colunas = [str(col) for col in df.columns]
+    df.columns = colunas
+    anos = [col for col in colunas if col.isdigit()]
+    colunas_id = [col for col in colunas if not re.match(r'^\d{4}(\.\d+)?$', col)]
+
+    # Blocos (linhas x anos); melt empilha ano a ano, o que equivale à ordem 'F'
+    quantidades = df[anos].to_numpy()
+    valores = df.reindex(columns=[f"{ano}.1" for ano in anos]).to_numpy()
+
+    n_linhas = len(df)
+    resultado = df[colunas_id].iloc[np.tile(np.arange(n_linhas), len(anos))].reset_index(drop=True)
+    resultado["ano"] = np.repeat(anos, n_linhas)
+    resultado["Quantidade (Kg)"] = quantidades.ravel(order='F')
+    resultado["Valor (US$)"] = valores.ravel(order='F')
+    return resultado
+
+def derreter_colunas_ano(df, opt_key):
+    """
+    Converte as colunas de ano (formato largo) em linhas com as colunas 'ano' e valor.
 
-def padronizar_csv(caminho_arquivo, caminho_saida, sep_padrao=';'):
-    sep_detectado, encoding = detectar_separador_e_codificacao(caminho_arquivo)
-    df = pd.read_csv(caminho_arquivo, sep=sep_detectado, encoding=encoding)
+    Para importação e exportação, a quantidade e o valor de cada ano são mantidos
+    em colunas separadas.
+    """
+    if opt_key in opcoes_com_valor and any(re.match(r'^\d{4}\.1$', str(col)) for col in df.columns):
+        return _derreter_quantidade_e_valor(df)
 
     # Corrigir colunas "1970.1", "1980.1" para "1970", "1980"
     df.columns = [re.sub(r'^(\d{4})\.\d+$', r'\1', str(col)) for col in df.columns]
@@ -100,10 +301,6 @@ def padronizar_csv(caminho_arquivo, caminho_saida, sep_padrao=';'):
             value_name='valor'
         )
 
-        # Corrigir extração de opt_key com regex
-        match = re.search(r'(opt_\d{2})', os.path.basename(caminho_saida))
-        opt_key = match.group(1) if match else ''
-
         label_por_opt = {
             "opt_02": "Quantidade (L.)",
             "opt_03": "Quantidade (Kg)",
@@ -114,143 +311,356 @@ def padronizar_csv(caminho_arquivo, caminho_saida, sep_padrao=';'):
 
         novo_nome_valor = label_por_opt.get(opt_key, "valor")
         df.rename(columns={"valor": novo_nome_valor}, inplace=True)
+    return df
+
+def _tipar_como_csv(serie):
+    """
+    Reproduz a inferência de tipos de uma releitura do CSV: a coluna vira numérica
+    se todos os valores forem numéricos, caso contrário vira texto.
+    """
+    numerica = pd.to_numeric(serie, errors='coerce')
+    if numerica.notna().sum() == serie.notna().sum():
+        return numerica
+    return serie.where(serie.isna(), serie.astype(str))
 
-    df.to_csv(caminho_saida, sep=sep_padrao, index=False, encoding='utf-8')
-    logger.info(f"CSV padronizado e transformado salvo em: {caminho_saida}")
+def normalizar_csv(conteudo, opt_key):
+    """
+    Estágio único do pipeline: decodifica o CSV baixado, derrete as colunas de ano
+    e devolve os registros finais, sem arquivos intermediários em disco.
 
+    Args:
+        conteudo: Bytes do CSV baixado
+        opt_key: Opção do VitiBrasil (define o nome da coluna de valor)
 
-def process_principal_option(opt_key, url, output_dir):
-    html = session.get(url).text
-    csv_url = fetch_csv_link(html, url)
+    Returns:
+        pd.DataFrame: Registros no formato gravado nos JSONs
+    """
+    texto, sep, _ = decodificar_csv(conteudo)
+    df = pd.read_csv(io.StringIO(texto), sep=sep)
+    df = derreter_colunas_ano(df, opt_key)
+
+    # Remover colunas 'id' e 'control' (case-insensitive)
+    colunas_para_remover = [col for col in df.columns if col.lower() in ["id", "control"]]
+    df = df.drop(columns=colunas_para_remover, errors='ignore')
+
+    # Corrigir o nome da coluna "Pa√≠s" para "País"
+    df.columns = [col.replace("Pa√≠s", "País") for col in df.columns]
+
+    if "ano" in df.columns:
+        df["ano"] = df["ano"].astype(int)
+        colunas_valor = [col for col in df.columns if col.startswith(("Quantidade", "Valor", "valor"))]
+        for col in colunas_valor:
+            df[col] = _tipar_como_csv(df[col])
+    return df
+
+def gravar_json(df, caminho_json, tipo):
+    """
+    Grava os registros normalizados em JSON, com a coluna 'type' na frente.
+    """
+    df = df.copy()
+    df.insert(0, "type", tipo)
+    temp = f"{caminho_json}.tmp"
+    df.to_json(temp, orient='records', force_ascii=False, indent=2)
+    os.replace(temp, caminho_json)
+    logger.info(f"JSON salvo em: {caminho_json}")
+
+def montar_tarefas(output_dir):
+    """
+    Monta a lista de páginas (opções e subopções) a serem processadas.
+
+    Cada tarefa descreve a página HTML de origem e o JSON de saída.
+    """
+    tarefas = []
+    for opt_key, opt_type in opcoes.items():
+        if opt_type == "principal":
+            opt_dir = os.path.join(output_dir, opt_key)
+            tarefas.append({
+                "opt_key": opt_key,
+                "label": None,
+                "url": f"{settings.SCRAPER_BASE_URL}?opcao={opt_key}",
+                "final_path": os.path.join(opt_dir, f"{opt_key}.json"),
+            })
+        elif opt_type == "suboptions":
+            opt_dir = os.path.join(output_dir, opt_key)
+            for sub_id, label in suboption_labels.get(opt_key, {}).items():
+                tarefas.append({
+                    "opt_key": opt_key,
+                    "label": label,
+                    "url": f"{settings.SCRAPER_BASE_URL}?subopcao={sub_id}&opcao={opt_key}",
+                    "final_path": os.path.join(opt_dir, f"{opt_key}_{label}.json".replace(" ", "_")),
+                })
+    return tarefas
+
+def _emitir(ao_evento, etapa, tarefa, inicio, **dados):
+    """Envia ao callback um evento de progresso da tarefa (falhas do callback só são logadas)."""
+    if ao_evento is None:
+        return
+    evento = {
+        "etapa": etapa,
+        "opt_key": tarefa["opt_key"],
+        "label": tarefa["label"],
+        "segundos": round(time.perf_counter() - inicio, 4),
+        **dados
+    }
+    try:
+        ao_evento(evento)
+    except Exception as e:
+        logger.warning(f"Falha ao registrar o evento '{etapa}': {str(e)}")
+
+def processar_tarefa(tarefa, max_por_host=None, manifesto=None, ao_evento=None):
+    """
+    Acessa a página da tarefa, resolve o link do CSV, baixa e normaliza os dados.
+
+    O CSV é processado em memória e os registros são gravados direto no JSON de
+    saída. A normalização é pulada quando o CSV não mudou desde o último download.
+
+    Args:
+        ao_evento: Callback chamado com um dict ao fim de cada etapa ("acessada",
+            "baixado", "normalizado", "convertido"), com a duração da etapa em
+            "segundos" e, conforme a etapa, "bytes" ou "linhas"
+
+    Returns:
+        str: "atualizado", "inalterado" ou "sem_csv" (subopção sem link de CSV)
+    """
+    url = tarefa["url"]
+    logger.info(f"Acessando {url} ({tarefa['label'] or tarefa['opt_key']})")
+    inicio = time.perf_counter()
+    resposta = http_get(url, max_por_host=max_por_host)
+    csv_url = fetch_csv_link(resposta.text, url)
+    _emitir(ao_evento, "acessada", tarefa, inicio, url=url, bytes=len(resposta.content), csv_url=csv_url)
     if not csv_url:
-        raise Exception("Link para CSV não encontrado.")
-    os.makedirs(output_dir, exist_ok=True)
-    temp_path = os.path.join(output_dir, f"{opt_key}_temp.csv")
-    final_path = os.path.join(output_dir, f"{opt_key}.csv")
-    download_csv(csv_url, temp_path)
-    padronizar_csv(temp_path, final_path)
-    os.remove(temp_path)
+        if tarefa["label"] is None:
+            raise Exception("Link para CSV não encontrado.")
+        logger.warning(f"Nenhum CSV encontrado em {url}")
+        return "sem_csv"
+
+    os.makedirs(os.path.dirname(tarefa["final_path"]), exist_ok=True)
+    # Sem o JSON em disco não há o que reaproveitar: baixa sem condicional
+    if manifesto is not None and not os.path.exists(tarefa["final_path"]):
+        with _manifest_lock:
+            manifesto.pop(csv_url, None)
+    inicio = time.perf_counter()
+    # A entrada só vai para o manifesto depois que o JSON foi gravado: se a
+    # normalização ou a gravação falharem, a próxima execução baixa o CSV de novo
+    pendente = _manifesto_pendente(manifesto, csv_url)
+    conteudo = baixar_csv(csv_url, max_por_host=max_por_host, manifesto=pendente)
+    _emitir(ao_evento, "baixado", tarefa, inicio, bytes=len(conteudo or b""), inalterado=conteudo is None)
+    if conteudo is None:
+        _confirmar_manifesto(manifesto, csv_url, pendente)
+        return "inalterado"
+    inicio = time.perf_counter()
+    df = normalizar_csv(conteudo, tarefa["opt_key"])
+    _emitir(ao_evento, "normalizado", tarefa, inicio, linhas=len(df))
+    inicio = time.perf_counter()
+    gravar_json(df, tarefa["final_path"], tarefa["label"] or "principal")
+    _emitir(
+        ao_evento, "convertido", tarefa, inicio,
+        linhas=len(df), bytes=os.path.getsize(tarefa["final_path"]), caminho=tarefa["final_path"]
+    )
+    _confirmar_manifesto(manifesto, csv_url, pendente)
+    return "atualizado"
+
+def process_principal_option(opt_key, url, output_dir):
+    processar_tarefa({
+        "opt_key": opt_key,
+        "label": None,
+        "url": url,
+        "final_path": os.path.join(output_dir, f"{opt_key}.json"),
+    })
 
 def process_suboptions(opt_key, output_dir):
-    suboptions = suboption_labels.get(opt_key, {})
-    total = len(suboptions)
-    for i in range(1, total + 1):
-        sub_id = f"subopt_0{i}"
-        label = suboptions.get(sub_id, sub_id)
-        sub_url = f"http://vitibrasil.cnpuv.embrapa.br/index.php?subopcao={sub_id}&opcao={opt_key}"
-        logger.info(f"Acessando {sub_url} ({label})")
-
-        html = session.get(sub_url).text
-        csv_url = fetch_csv_link(html, sub_url)
-        if not csv_url:
-            logger.warning(f"Nenhum CSV encontrado em {sub_url}")
-            continue
+    for tarefa in montar_tarefas(output_dir):
+        if tarefa["opt_key"] == opt_key and tarefa["label"] is not None:
+            processar_tarefa(tarefa)
+
+def juntar_jsons_por_opcao(diretorio_base, opcoes_agrupadas=None):
+    """
+    Junta os JSONs de cada opção em um único arquivo {opt_key}.json no diretório base.
 
-        opt_dir = os.path.join(output_dir, opt_key)
-        os.makedirs(opt_dir, exist_ok=True)
-        temp_path = os.path.join(opt_dir, f"{opt_key}_{label}_temp.csv".replace(" ", "_"))
-        final_path = os.path.join(opt_dir, f"{opt_key}_{label}.csv".replace(" ", "_"))
-        download_csv(csv_url, temp_path)
-        padronizar_csv(temp_path, final_path)
-        os.remove(temp_path)
-
-def converter_csvs_para_json(diretorio_base):
-    for root, _, files in os.walk(diretorio_base):
-        for file in files:
-            if file.endswith(".csv"):
-                caminho_csv = os.path.join(root, file)
-                caminho_json = os.path.splitext(caminho_csv)[0] + ".json"
-                sep_detectado, encoding = detectar_separador_e_codificacao(caminho_csv)
-                df = pd.read_csv(caminho_csv, sep=sep_detectado, encoding=encoding)
-
-                # Remover colunas 'id' e 'control' (case-insensitive)
-                colunas_para_remover = [col for col in df.columns if col.lower() in ["id", "control"]]
-                df.drop(columns=colunas_para_remover, inplace=True, errors='ignore')
-
-                # Corrigir o nome da coluna "Pa√≠s" para "País"
-                df.columns = [col.replace("Pa√≠s", "País") for col in df.columns]
-
-                # Inferir tipo
-                tipo = "principal"
-                partes = file.split('_')
-                for opt, subs in suboption_labels.items():
-                    for sub_id, sub_label in subs.items():
-                        if sub_label in file:
-                            tipo = sub_label
-
-                df.insert(0, "type", tipo)
-                df.to_json(caminho_json, orient='records', force_ascii=False, indent=2)
-                logger.info(f"Convertido para JSON: {caminho_json}")
-
-
-
-def juntar_jsons_por_opcao(diretorio_base, opcoes_agrupadas=["opt_03", "opt_05", "opt_06"]):
-    for opt_key in opcoes_agrupadas:
+    Por padrão todas as opções são agrupadas, inclusive as principais, cujo
+    único JSON é copiado para o diretório base.
+    """
+    for opt_key in opcoes_agrupadas or list(opcoes):
         opt_path = os.path.join(diretorio_base, opt_key)
         if not os.path.exists(opt_path):
             logger.warning(f"Pasta não encontrada: {opt_path}")
             continue
 
+        caminho_saida = os.path.join(diretorio_base, f"{opt_key}.json")
+        caminhos_json = [
+            os.path.join(opt_path, file) for file in os.listdir(opt_path) if file.endswith(".json")
+        ]
+        if caminhos_json and _esta_atualizado(caminho_saida, caminhos_json):
+            logger.info(f"Arquivo JSON combinado já atualizado: {caminho_saida}")
+            continue
+
         registros_total = []
-        for file in os.listdir(opt_path):
-            if file.endswith(".json"):
-                caminho_json = os.path.join(opt_path, file)
-                try:
-                    with open(caminho_json, encoding='utf-8') as f:
-                        dados = json.load(f)
-                        registros_total.extend(dados)
-                except Exception as e:
-                    logger.error(f"Erro ao ler {caminho_json}: {str(e)}")
+        for caminho_json in caminhos_json:
+            try:
+                with open(caminho_json, encoding='utf-8') as f:
+                    dados = json.load(f)
+                    registros_total.extend(dados)
+            except Exception as e:
+                logger.error(f"Erro ao ler {caminho_json}: {str(e)}")
 
         if registros_total:
-            caminho_saida = os.path.join(diretorio_base, f"{opt_key}.json")
             with open(caminho_saida, "w", encoding='utf-8') as f_out:
                 json.dump(registros_total, f_out, ensure_ascii=False, indent=2)
             logger.info(f"Arquivo JSON combinado salvo: {caminho_saida}")
         else:
             logger.warning(f"Nenhum dado encontrado para juntar em {opt_key}")
 
-def run_csv_downloader(output_dir="data/vitibrasil"):
+def run_csv_downloader(output_dir="data/vitibrasil", max_workers=None, max_por_host=None, forcar=False):
+    """
+    Baixa e normaliza os CSVs de todas as opções e subopções em paralelo.
+
+    As páginas HTML e os CSVs são requisitados por um pool de threads limitado,
+    respeitando o máximo de requisições simultâneas por host. Os CSVs são
+    baixados com GET condicional a partir do manifesto salvo em output_dir.
+
+    Args:
+        output_dir: Diretório onde os dados serão salvos
+        max_workers: Tamanho do pool de threads (padrão: settings.SCRAPER_MAX_WORKERS)
+        max_por_host: Máximo de requisições simultâneas por host
+            (padrão: settings.SCRAPER_MAX_CONCURRENCY_PER_HOST)
+        forcar: Ignora o manifesto e baixa todos os CSVs novamente
+
+    Returns:
+        dict: Status do processamento por opção, indicando se houve alteração
+    """
     os.makedirs(output_dir, exist_ok=True)
-    options = {
-        "opt_02": "principal",
-        "opt_04": "principal",
-        "opt_03": "suboptions",
-        "opt_05": "suboptions",
-        "opt_06": "suboptions"
-    }
-    resultados = {}
-    for opt_key, opt_type in options.items():
+    max_workers = max_workers or settings.SCRAPER_MAX_WORKERS
+    tarefas = montar_tarefas(output_dir)
+    manifesto = {} if forcar else carregar_manifesto(output_dir)
+    resultados = {opt_key: {"status": "sucesso", "alterado": False} for opt_key in opcoes}
+
+    logger.info(f"Processando {len(tarefas)} páginas com {max_workers} workers...")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(processar_tarefa, tarefa, max_por_host, manifesto): tarefa
+            for tarefa in tarefas
+        }
+        for future in as_completed(futures):
+            opt_key = futures[future]["opt_key"]
+            try:
+                status = future.result()
+            except Exception as e:
+                _registrar_resultado(resultados, opt_key, erro=e)
+            else:
+                _registrar_resultado(resultados, opt_key, status=status)
+
+    salvar_manifesto(output_dir, manifesto)
+    return resultados
+
+def _registrar_resultado(resultados, opt_key, status=None, erro=None):
+    """Consolida o resultado de uma página no status da opção (uma falha prevalece)."""
+    if erro is not None:
+        logger.error(f"Erro ao processar {opt_key}: {str(erro)}")
+        resultados[opt_key] = {"status": "falha", "erro": str(erro)}
+    elif status == "atualizado" and resultados[opt_key]["status"] == "sucesso":
+        resultados[opt_key]["alterado"] = True
+
+def particionar_tarefas(tarefas, partes):
+    """
+    Divide as tarefas em até `partes` grupos disjuntos (distribuição round-robin),
+    de modo que cada página seja processada por um único worker.
+    """
+    partes = max(1, min(partes, len(tarefas)))
+    return [tarefas[i::partes] for i in range(partes)]
+
+def processar_parte(tarefas, max_por_host=None, manifesto=None, pausa=0.0, ao_concluir=None, ao_evento=None):
+    """
+    Processa em sequência as páginas de uma parte, com `pausa` segundos entre elas.
+
+    Args:
+        ao_concluir: Chamado como ao_concluir(tarefa, status, erro) após cada página
+        ao_evento: Repassado a processar_tarefa (eventos de cada etapa)
+
+    Returns:
+        list: (tarefa, status, erro) de cada página da parte
+    """
+    concluidas = []
+    for i, tarefa in enumerate(tarefas):
+        if i and pausa:
+            time.sleep(pausa)
+        status, erro = None, None
         try:
-            logger.info(f"Processando {opt_key} ({opt_type})...")
-            if opt_type == "principal":
-                url = f"http://vitibrasil.cnpuv.embrapa.br/index.php?opcao={opt_key}"
-                process_principal_option(opt_key, url, os.path.join(output_dir, opt_key))
-            elif opt_type == "suboptions":
-                process_suboptions(opt_key, output_dir)
-            resultados[opt_key] = {"status": "sucesso"}
+            status = processar_tarefa(tarefa, max_por_host, manifesto, ao_evento=ao_evento)
         except Exception as e:
-            logger.error(f"Erro ao processar {opt_key}: {str(e)}")
-            resultados[opt_key] = {"status": "falha", "erro": str(e)}
-    return resultados
+            erro = e
+        concluidas.append((tarefa, status, erro))
+        if ao_concluir is not None:
+            ao_concluir(tarefa, status, erro)
+    return concluidas
+
+def run_scraper_particionado(output_dir="data/vitibrasil", partes=3, pausa=0.0, max_por_host=None, forcar=False, ao_concluir=None, ao_evento=None):
+    """
+    Executa o scraping dividindo a lista de páginas entre `partes` workers simultâneos.
 
-def run_scraper(output_dir="data/vitibrasil"):
+    Cada worker processa só as suas páginas (com `pausa` entre elas) e grava no mesmo
+    output_dir; o manifesto é compartilhado e os JSONs são juntados uma única vez no
+    final, como em run_scraper.
+
+    Returns:
+        dict: "resultados" por opção (como run_scraper) e as páginas de cada parte
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    grupos = particionar_tarefas(montar_tarefas(output_dir), partes)
+    manifesto = {} if forcar else carregar_manifesto(output_dir)
+
+    logger.info(f"Processando {sum(len(g) for g in grupos)} páginas em {len(grupos)} partes...")
+    with ThreadPoolExecutor(max_workers=len(grupos)) as executor:
+        futures = [
+            executor.submit(processar_parte, grupo, max_por_host, manifesto, pausa, ao_concluir, ao_evento)
+            for grupo in grupos
+        ]
+        concluidas = [future.result() for future in futures]
+
+    return consolidar_partes(output_dir, manifesto, concluidas)
+
+def consolidar_partes(output_dir, manifesto, concluidas):
+    """
+    Junta o resultado das partes (listas de (tarefa, status, erro)), salva o manifesto
+    e gera os JSONs por opção em output_dir.
+    """
+    resultados = {opt_key: {"status": "sucesso", "alterado": False} for opt_key in opcoes}
+    detalhes = []
+    for parte, paginas in enumerate(concluidas):
+        for tarefa, status, erro in paginas:
+            _registrar_resultado(resultados, tarefa["opt_key"], status=status, erro=erro)
+        detalhes.append({
+            "parte": parte,
+            "paginas": [
+                {"url": tarefa["url"], "status": status or "falha", **({"erro": str(erro)} if erro else {})}
+                for tarefa, status, erro in paginas
+            ]
+        })
+
+    salvar_manifesto(output_dir, manifesto)
+    logger.info("Juntando JSONs por subopção...")
+    juntar_jsons_por_opcao(output_dir)
+    return {"resultados": resultados, "partes": detalhes}
+
+def run_scraper(output_dir="data/vitibrasil", max_workers=None, max_por_host=None, forcar=False):
     """
     Executa o scraping do VitiBrasil da Embrapa, realizando o download,
     padronização e conversão dos dados para JSON.
+
+    Arquivos cujo CSV de origem não mudou desde a última execução não são
+    reprocessados.
     
     Args:
         output_dir: Diretório onde os dados serão salvos
+        max_workers: Número de downloads em paralelo
+        max_por_host: Máximo de requisições simultâneas por host
+        forcar: Baixa e reprocessa todos os arquivos, ignorando o manifesto
     
     Returns:
         dict: Resultado da operação
     """
     os.makedirs(output_dir, exist_ok=True)
 
-    resultados = run_csv_downloader(output_dir)
-
-    logger.info("Iniciando conversão dos CSVs padronizados para JSON...")
-    converter_csvs_para_json(output_dir)
+    resultados = run_csv_downloader(output_dir, max_workers=max_workers, max_por_host=max_por_host, forcar=forcar)
 
     logger.info("Juntando JSONs por subopção...")
     juntar_jsons_por_opcao(output_dir)
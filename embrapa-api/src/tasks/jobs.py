@@ -1,6 +1,288 @@
-from src.scraper.embrapa_scraper import run_scraper
+"""
+Execução dos jobs do scraper fora do event loop.
+
+O trabalho bloqueante (HTTP, parsing e escrita em disco) roda num pool de threads
+dedicado (SCRAPER_EXECUTOR_WORKERS), separado do threadpool usado pelos endpoints
+síncronos; as pausas entre páginas são feitas com asyncio.sleep, sem ocupar threads.
+
+Os jobs ficam na tabela scraper_job: a API enfileira e cada processo roda um
+worker (worker_loop) que retira jobs com FOR UPDATE SKIP LOCKED, atualiza o
+progresso periodicamente e atende pedidos de cancelamento.
+"""
+import asyncio
+import functools
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from src.config.database import SessionLocal, engine
+from src.config.settings import settings
+from src.db.repositories.job_repository import (
+    FINISHED_STATUSES,
+    dequeue_job,
+    enqueue_job,
+    finish_job,
+    get_imported_manifest,
+    get_job,
+    heartbeat_job,
+    insert_job_event,
+    purge_jobs,
+    record_scheduled_run,
+    requeue_stale_jobs
+)
+from src.core.services.data_service import insert_all_data, warm_cache
+from src.scraper.embrapa_scraper import (
+    assinatura_manifesto,
+    carregar_manifesto,
+    consolidar_partes,
+    montar_tarefas,
+    particionar_tarefas,
+    processar_tarefa,
+    run_scraper
+)
+
+logger = logging.getLogger(__name__)
+
+# Pool do scraper, criado no primeiro uso e descartado por encerrar_executor: um novo
+# lifespan (outro TestClient, reload) cria outro em vez de usar o já encerrado
+scraper_executor = None
+_executor_lock = threading.Lock()
+
+def executor_do_scraper() -> ThreadPoolExecutor:
+    global scraper_executor
+    with _executor_lock:
+        if scraper_executor is None:
+            scraper_executor = ThreadPoolExecutor(max_workers=settings.SCRAPER_EXECUTOR_WORKERS, thread_name_prefix="scraper")
+        return scraper_executor
 
 def run_scraper_task_bg(output_dir):
     return run_scraper(output_dir=output_dir)
 
+async def no_executor(funcao, *args, **kwargs):
+    """Executa funcao(*args, **kwargs) no pool do scraper, sem bloquear o event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor_do_scraper(), functools.partial(funcao, *args, **kwargs))
+
+async def processar_parte_async(tarefas, manifesto, pausa=0.0, ao_concluir=None, ao_evento=None):
+    """Equivalente assíncrono de processar_parte: cada página no executor, pausa no event loop."""
+    concluidas = []
+    for i, tarefa in enumerate(tarefas):
+        if i and pausa:
+            await asyncio.sleep(pausa)
+        status, erro = None, None
+        try:
+            status = await no_executor(processar_tarefa, tarefa, None, manifesto, ao_evento=ao_evento)
+        except Exception as e:
+            erro = e
+        concluidas.append((tarefa, status, erro))
+        if ao_concluir is not None:
+            ao_concluir(tarefa, status, erro)
+    return concluidas
+
+async def run_scraper_particionado_async(output_dir, partes=3, pausa=0.0, forcar=False, ao_concluir=None, ao_evento=None):
+    """
+    Equivalente assíncrono de run_scraper_particionado: as partes avançam em paralelo
+    como corrotinas, cada página é processada no executor do scraper.
+    """
+    await no_executor(os.makedirs, output_dir, exist_ok=True)
+    grupos = particionar_tarefas(montar_tarefas(output_dir), partes)
+    manifesto = {} if forcar else await no_executor(carregar_manifesto, output_dir)
+    concluidas = await asyncio.gather(*(
+        processar_parte_async(grupo, manifesto, pausa, ao_concluir, ao_evento) for grupo in grupos
+    ))
+    return await no_executor(consolidar_partes, output_dir, manifesto, concluidas)
+
+# Intervalo mínimo entre limpezas da tabela de jobs (por processo)
+LIMPEZA_INTERVALO_SECONDS = 60
+
+# Linha da scheduler_state com a assinatura do manifesto da última importação
+IMPORTACAO = "importacao"
+
+def em_transacao(funcao, *args, **kwargs):
+    """Executa funcao(conn, ...) numa transação própria (síncrono, para o executor)."""
+    with engine.begin() as conn:
+        return funcao(conn, *args, **kwargs)
+
+def chave_scraping(output_dir: str) -> str:
+    """Pedidos de scraping para o mesmo diretório são o mesmo job enquanto ele estiver ativo."""
+    return f"scraping:{os.path.normpath(output_dir)}"
+
+def enfileirar_scraping(output_dir: str, workers: int, sleep_time: float) -> tuple:
+    """Enfileira um scraping; retorna (id do job, True se criado ou False se já havia um ativo)."""
+    params = {"output_dir": output_dir, "workers": workers, "sleep_time": sleep_time}
+    return em_transacao(enqueue_job, str(uuid.uuid4()), chave_scraping(output_dir), params)
+
+async def aguardar_job(job_id: str) -> dict:
+    """
+    Espera o job ser finalizado pelo worker que o executa, consultando a tabela a
+    cada JOB_POLL_SECONDS; retorna a linha do job finalizado.
+    """
+    while True:
+        job = await no_executor(em_transacao, get_job, job_id)
+        if job is None:
+            raise RuntimeError(f"Job {job_id} não encontrado.")
+        if job["status"] in FINISHED_STATUSES:
+            return job
+        await asyncio.sleep(settings.JOB_POLL_SECONDS)
+
+def registrar_evento(job_id: str, etapa: str, dados: dict):
+    """Grava um evento do job para os streams SSE; falhas só são logadas."""
+    try:
+        em_transacao(insert_job_event, job_id, etapa, dados)
+    except Exception as e:
+        logger.warning(f"Falha ao gravar o evento '{etapa}' do job {job_id}: {str(e)}")
+
+def importar_e_aquecer(job_id: str) -> dict:
+    """Importa os JSONs do scraping para o banco e aquece o cache de respostas."""
+    inicio = time.perf_counter()
+    db = SessionLocal()
+    try:
+        insert_all_data(db)
+        registrar_evento(job_id, "importado", {"segundos": round(time.perf_counter() - inicio, 4)})
+        inicio = time.perf_counter()
+        leituras = warm_cache(db)
+        registrar_evento(job_id, "cache_aquecido", {"leituras": leituras, "segundos": round(time.perf_counter() - inicio, 4)})
+    finally:
+        db.close()
+    return {"importado": True, "cache_aquecido": leituras}
+
+async def importar_se_alterado(job_id: str, output_dir: str) -> dict:
+    """
+    Etapa final dos jobs com "importar": importa se o manifesto do scraping for
+    diferente do da última importação bem-sucedida. A comparação é com o que foi
+    importado, não com o que este job baixou: uma mudança baixada por um scraping
+    manual, ou cuja importação falhou, é importada na próxima execução.
+    """
+    assinatura = assinatura_manifesto(await no_executor(carregar_manifesto, output_dir))
+    if assinatura == await no_executor(em_transacao, get_imported_manifest, IMPORTACAO):
+        await no_executor(registrar_evento, job_id, "importacao_ignorada", {"motivo": "manifesto igual ao da última importação"})
+        return {"importado": False}
+    logger.info(f"Job {job_id}: manifesto alterado desde a última importação, importando os dados")
+    resultado = await no_executor(importar_e_aquecer, job_id)
+    await no_executor(em_transacao, record_scheduled_run, IMPORTACAO, job_id, assinatura)
+    return resultado
+
+async def executar_job(job: dict, worker: str) -> None:
+    """
+    Executa um job de scraping já marcado como em andamento para este worker,
+    registrando progresso, resultado e erro na tabela; interrompe o job se o
+    cancelamento for pedido. Com params["importar"] (atualização agendada), encadeia
+    a importação e o aquecimento do cache quando o manifesto mudou desde a última
+    importação. O heartbeat roda durante o job inteiro, importação inclusive, para
+    que o job não seja devolvido à fila enquanto ainda está sendo executado.
+    """
+    params = job["params"]
+    estado = {"progress": 0.0, "concluidas": 0, "cancelado": False}
+    gravacoes = set()
+    total_paginas = len(montar_tarefas(params["output_dir"])) or 1
+
+    def ao_evento(evento):
+        # Chamado nas threads do executor, dentro de processar_tarefa
+        registrar_evento(job["id"], evento.pop("etapa"), evento)
+
+    def ao_concluir(tarefa, status, erro):
+        estado["concluidas"] += 1
+        estado["progress"] = estado["concluidas"] / total_paginas * 100
+        logger.info(f"Job {job['id']} - página {tarefa['url']}: {status or f'erro ({erro})'} - progresso: {estado['progress']:.1f}%")
+        evento = {"opt_key": tarefa["opt_key"], "label": tarefa["label"], "status": status or "falha", "progress": estado["progress"]}
+        if erro is not None:
+            evento["erro"] = str(erro)
+        # Chamado no event loop: grava o evento no executor, sem esperar
+        gravacao = asyncio.ensure_future(no_executor(registrar_evento, job["id"], "pagina_concluida", evento))
+        gravacoes.add(gravacao)
+        gravacao.add_done_callback(gravacoes.discard)
+
+    await no_executor(registrar_evento, job["id"], "iniciado", {"paginas": total_paginas, **params})
+    execucao = asyncio.ensure_future(run_scraper_particionado_async(
+        params["output_dir"],
+        partes=params.get("workers") or 1,
+        pausa=params.get("sleep_time") or 0.0,
+        ao_concluir=ao_concluir,
+        ao_evento=ao_evento
+    ))
+
+    async def batimentos():
+        while True:
+            await asyncio.sleep(settings.JOB_HEARTBEAT_SECONDS)
+            try:
+                parar = await no_executor(em_transacao, heartbeat_job, job["id"], worker, estado["progress"])
+            except Exception as e:
+                logger.warning(f"Falha no heartbeat do job {job['id']}: {str(e)}")
+                continue
+            # O cancelamento interrompe o scraping; a importação, já iniciada, vai até o fim
+            if parar and not execucao.done():
+                logger.info(f"Cancelando o job {job['id']}")
+                estado["cancelado"] = True
+                execucao.cancel()
+
+    heartbeat = asyncio.ensure_future(batimentos())
+    try:
+        await asyncio.wait({execucao})
+        await asyncio.gather(*gravacoes, return_exceptions=True)
+        if estado["cancelado"]:
+            status, dados = "cancelado", {}
+        elif execucao.exception() is not None:
+            logger.error(f"Erro no job {job['id']}: {execucao.exception()}")
+            status, dados = "erro", {"error": str(execucao.exception())}
+        else:
+            status, dados = "concluído", {"result": execucao.result()}
+            if params.get("importar"):
+                try:
+                    dados["result"]["importacao"] = await importar_se_alterado(job["id"], params["output_dir"])
+                except Exception as e:
+                    logger.error(f"Erro na importação do job {job['id']}: {str(e)}")
+                    status, dados["error"] = "erro", f"Erro na importação: {str(e)}"
+    except asyncio.CancelledError:
+        # Desligamento do processo: o job fica em andamento e volta à fila quando ficar sem heartbeat
+        execucao.cancel()
+        raise
+    finally:
+        heartbeat.cancel()
+
+    await no_executor(registrar_evento, job["id"], "finalizado", {"status": status, "error": dados.get("error")})
+    if not await no_executor(em_transacao, finish_job, job["id"], worker, status, **dados):
+        logger.warning(f"Job {job['id']} não pertence mais ao worker {worker}: status final '{status}' descartado")
+
+def _manutencao():
+    """Devolve à fila jobs órfãos e aplica a retenção dos finalizados."""
+    requeue = em_transacao(requeue_stale_jobs, settings.JOB_STALE_SECONDS)
+    removidos = em_transacao(purge_jobs, settings.JOB_RETENTION_SECONDS, settings.JOB_MAX_FINISHED)
+    if requeue or removidos:
+        logger.info(f"Jobs devolvidos à fila: {requeue}; jobs antigos removidos: {removidos}")
+
+async def worker_loop(parar: asyncio.Event, nome: str = None):
+    """
+    Retira e executa jobs da fila até `parar` ser sinalizado. Com a fila vazia,
+    espera JOB_POLL_SECONDS; a manutenção da tabela roda a cada LIMPEZA_INTERVALO_SECONDS.
+    """
+    nome = nome or f"{socket.gethostname()}:{os.getpid()}"
+    ultima_limpeza = 0.0
+    while not parar.is_set():
+        try:
+            if time.monotonic() - ultima_limpeza >= LIMPEZA_INTERVALO_SECONDS:
+                ultima_limpeza = time.monotonic()
+                await no_executor(_manutencao)
+            job = await no_executor(em_transacao, dequeue_job, nome)
+            if job is not None:
+                logger.info(f"Worker {nome} executando o job {job['id']}")
+                await executar_job(job, nome)
+                continue
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Erro no worker de jobs: {str(e)}")
+        try:
+            await asyncio.wait_for(parar.wait(), timeout=settings.JOB_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
 
+def encerrar_executor():
+    """Encerra o pool do scraper no desligamento da aplicação, descartando o que não começou."""
+    global scraper_executor
+    with _executor_lock:
+        executor, scraper_executor = scraper_executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,106 @@
+"""
+Agendador interno da atualização dos dados (scraping -> importação -> cache).
+
+Cada réplica verifica o agendamento a cada REFRESH_CHECK_SECONDS. A verificação
+roda numa transação que tenta pg_try_advisory_xact_lock: só a réplica que obtém o
+lock (a líder naquela verificação) consulta a última execução e, se a próxima já
+venceu e o horário está na janela fora de pico (REFRESH_WINDOW), enfileira o job
+de scraping e registra a execução, tudo na mesma transação. O job segue pela fila
+(scraper_job) e, se o manifesto mudou desde a última importação, importa os dados
+e aquece o cache.
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, time as dtime, timedelta
+from src.config.settings import settings
+from src.db.repositories.job_repository import (
+    enqueue_job,
+    get_last_scheduled_run,
+    record_scheduled_run,
+    try_advisory_xact_lock
+)
+from src.tasks.jobs import chave_scraping, em_transacao, no_executor
+
+try:
+    from croniter import croniter
+except ImportError:  # pragma: no cover - depende do ambiente
+    croniter = None
+
+logger = logging.getLogger(__name__)
+
+AGENDAMENTO = "refresh"
+# Chave do lock consultivo da eleição do líder do agendador
+LOCK_KEY = 0x656D6272  # "embr"
+
+
+def proxima_execucao(ultima: datetime, agora: datetime) -> datetime:
+    """Momento da próxima execução a partir da última (None = nunca executou: agora)."""
+    if ultima is None:
+        return agora
+    if settings.REFRESH_CRON:
+        if croniter is None:
+            raise RuntimeError("REFRESH_CRON exige o pacote croniter.")
+        return croniter(settings.REFRESH_CRON, ultima).get_next(datetime)
+    return ultima + timedelta(seconds=settings.REFRESH_INTERVAL_SECONDS)
+
+
+def dentro_da_janela(agora: datetime, janela: str) -> bool:
+    """Indica se o horário de agora está na janela "HH:MM-HH:MM" (pode cruzar a meia-noite)."""
+    if not janela:
+        return True
+    inicio, fim = (dtime.fromisoformat(parte.strip()) for parte in janela.split("-"))
+    hora = agora.time()
+    if inicio <= fim:
+        return inicio <= hora < fim
+    return hora >= inicio or hora < fim
+
+
+def verificar_agendamento(agora: datetime = None):
+    """
+    Uma verificação do agendador (síncrona, para o executor). Retorna o id do job
+    enfileirado ou None (não é a líder, não venceu, fora da janela ou já há um
+    scraping ativo para o diretório).
+    """
+    agora = agora or datetime.now().astimezone()
+    if not dentro_da_janela(agora, settings.REFRESH_WINDOW):
+        return None
+
+    def verificar(conn):
+        if not try_advisory_xact_lock(conn, LOCK_KEY):
+            return None
+        if proxima_execucao(get_last_scheduled_run(conn, AGENDAMENTO), agora) > agora:
+            return None
+        params = {
+            "output_dir": settings.REFRESH_OUTPUT_DIR,
+            "workers": settings.REFRESH_WORKERS,
+            "sleep_time": settings.REFRESH_SLEEP_SECONDS,
+            "importar": True,
+            "origem": "agendador",
+        }
+        job_id, criado = enqueue_job(conn, str(uuid.uuid4()), chave_scraping(settings.REFRESH_OUTPUT_DIR), params)
+        if not criado:
+            # Já há um scraping ativo (ex.: manual, sem importação): a execução não é
+            # registrada e a próxima verificação, depois que ele terminar, enfileira a nossa
+            return None
+        record_scheduled_run(conn, AGENDAMENTO, job_id)
+        return job_id
+
+    return em_transacao(verificar)
+
+
+async def scheduler_loop(parar: asyncio.Event):
+    """Verifica o agendamento a cada REFRESH_CHECK_SECONDS até `parar` ser sinalizado."""
+    while not parar.is_set():
+        try:
+            job_id = await no_executor(verificar_agendamento)
+            if job_id is not None:
+                logger.info(f"Atualização agendada enfileirada: job {job_id}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Erro no agendador: {str(e)}")
+        try:
+            await asyncio.wait_for(parar.wait(), timeout=settings.REFRESH_CHECK_SECONDS)
+        except asyncio.TimeoutError:
+            pass
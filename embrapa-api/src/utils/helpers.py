@@ -0,0 +1,15 @@
+from decimal import Decimal
+import orjson
+
+# Opções do orjson nas respostas e exportações: chaves não-texto viram texto e
+# arrays do NumPy (ex.: colunas do pandas) são serializados diretamente
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+def json_default(value):
+    """Tipos que o orjson não serializa sozinho: Decimal (colunas NUMERIC) vira número."""
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Tipo não serializável em JSON: {type(value).__name__}")
+
+def dumps_json(content) -> bytes:
+    return orjson.dumps(content, default=json_default, option=ORJSON_OPTIONS)
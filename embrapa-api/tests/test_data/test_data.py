@@ -1,7 +1,9 @@
 import unittest
 from unittest.mock import patch, MagicMock
 from sqlalchemy.engine import Connection
-from src.core.services import data_service
+from src.api import compression
+from src.core.services import arrow_service, cache_service, data_service, normalization
+from src.db.repositories import data_repository
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -29,13 +31,15 @@ class TestDataServiceWithGet(unittest.TestCase):
                 "name": "VINHO DE MESA",
                 "wine_derivative_name": "VINHO DE MESA",
                 "quantity": 1000,
-                "year_no": 2023
+                "year_no": 2023,
+                "seq_no": 1
             },
             {
                 "name": "Tinto",
                 "wine_derivative_name": "VINHO DE MESA",
                 "quantity": 500,
-                "year_no": 2023
+                "year_no": 2023,
+                "seq_no": 1
             }
         ]
 
@@ -64,14 +68,16 @@ class TestDataServiceWithGet(unittest.TestCase):
                 "kind_name": "Americanas e híbridas",
                 "cultivar": "TINTAS",
                 "quantity_kg": 2000,
-                "year_no": 2022
+                "year_no": 2022,
+                "seq_no": 1
             },
             {
                 "color_name": "TINTAS",
                 "kind_name": "Americanas e híbridas",
                 "cultivar": "Bacarina",
                 "quantity_kg": 1500,
-                "year_no": 2022
+                "year_no": 2022,
+                "seq_no": 1
             }
         ]
 
@@ -99,13 +105,15 @@ class TestDataServiceWithGet(unittest.TestCase):
                 "name": "VINHO DE MESA",
                 "wine_derivative_name": "VINHO DE MESA",
                 "quantity_liters": 3000,
-                "year_no": 2021
+                "year_no": 2021,
+                "seq_no": 1
             },
             {
                 "name": "Rosado",
                 "wine_derivative_name": "VINHO DE MESA",
                 "quantity_liters": 1200,
-                "year_no": 2021
+                "year_no": 2021,
+                "seq_no": 1
             }
         ]
 
@@ -134,14 +142,16 @@ class TestDataServiceWithGet(unittest.TestCase):
                 "country": "Africa do Sul",
                 "quantity_kg": 500,
                 "value_usd": 0,
-                "year_no": 2020
+                "year_no": 2020,
+                "seq_no": 1
             },
             {
                 "grape_type_name": "Espumantes",
                 "country": "Alemanha",
                 "quantity_kg": 800,
                 "value_usd": 0,
-                "year_no": 2020
+                "year_no": 2020,
+                "seq_no": 1
             }
         ]
 
@@ -170,14 +180,16 @@ class TestDataServiceWithGet(unittest.TestCase):
                 "country": "Mauritânia",
                 "quantity_kg": 100,
                 "value_usd": 0,
-                "year_no": 2019
+                "year_no": 2019,
+                "seq_no": 1
             },
             {
                 "grape_type_name": "Uvas frescas",
                 "country": "Mexico",
                 "quantity_kg": 200,
                 "value_usd": 0,
-                "year_no": 2019
+                "year_no": 2019,
+                "seq_no": 1
             }
         ]
 
@@ -186,5 +198,715 @@ class TestDataServiceWithGet(unittest.TestCase):
         self.assertEqual(mock_insert.call_count, 2)
         mock_delete.assert_called_once()
 
+    @patch("src.core.services.data_service.load_data")
+    @patch("src.core.services.data_service.insert_into_import")
+    @patch("src.core.services.data_service.delete_import_data")
+    def test_insert_import_data_with_value(self, mock_delete, mock_insert, mock_load):
+        logger.info("Rodando teste de para inserção de importação com valor")
+        mock_conn = MagicMock(spec=Connection)
+        mock_data = [
+            {"País": "Chile", "Quantidade (Kg)": 800, "Valor (US$)": 1250, "type": "Vinhos de mesa", "ano": 2020},
+            {"País": "Peru", "Quantidade (Kg)": 10, "Valor (US$)": "nd", "type": "Vinhos de mesa", "ano": 2020},
+            {"País": "Total", "Quantidade (Kg)": 810, "Valor (US$)": 1250, "type": "Vinhos de mesa", "ano": 2020},
+        ]
+        mock_load.return_value = mock_data
+
+        data_service.insert_import_data(mock_conn)
+
+        actual_calls = [call[0][1] for call in mock_insert.call_args_list]
+        self.assertEqual([c["value_usd"] for c in actual_calls], [1250.0, 0.0])
+        self.assertEqual(mock_insert.call_count, 2)
+
+    @patch("src.core.services.data_service.load_data")
+    @patch("src.core.services.data_service.bulk_insert_into_table")
+    @patch("src.core.services.data_service.insert_into_sales")
+    @patch("src.core.services.data_service.delete_sales_data")
+    def test_insert_sales_data_copy_mode(self, mock_delete, mock_insert, mock_bulk, mock_load):
+        logger.info("Rodando teste de para carga em lote de comercialização")
+        mock_conn = MagicMock(spec=Connection)
+        mock_load.return_value = [
+            {"Produto": "VINHO DE MESA", "valor": 3000, "ano": 2021},
+            {"Produto": "Rosado", "valor": 1200, "ano": 2021},
+        ]
+
+        data_service.insert_sales_data(mock_conn, mode="copy")
+
+        mock_insert.assert_not_called()
+        table, records = mock_bulk.call_args[0][1:]
+        self.assertEqual(table, "sales")
+        self.assertEqual([r["name"] for r in records], ["VINHO DE MESA", "Rosado"])
+        mock_conn.commit.assert_called_once()
+
+    def test_insert_all_data_invalid_mode(self):
+        with patch("src.core.services.data_service.load_data", return_value=[]), \
+                patch("src.core.services.data_service.delete_product_data"):
+            with self.assertRaises(ValueError):
+                data_service.insert_all_data(MagicMock(spec=Connection), mode="upsert")
+
+    @patch("src.core.services.data_service.load_data", return_value=[])
+    @patch("src.core.services.data_service.swap_staging_table")
+    @patch("src.core.services.data_service.load_into_staging")
+    def test_insert_all_data_staging_swaps_all_tables_at_once(self, mock_load_staging, mock_swap, _):
+        mock_conn = MagicMock(spec=Connection)
+
+        data_service.insert_all_data(mock_conn, mode="staging")
+
+        modules = list(data_service.MODULE_FILES)
+        self.assertEqual([c[0][1] for c in mock_load_staging.call_args_list], modules)
+        self.assertEqual([c[0][1] for c in mock_swap.call_args_list], modules)
+        # stagings carregadas, troca das tabelas e versão dos dados
+        self.assertEqual(mock_conn.commit.call_count, 3)
+
+    @patch("src.core.services.data_service.load_data", return_value=[])
+    @patch("src.core.services.data_service.drop_staging_table")
+    @patch("src.core.services.data_service.swap_staging_table")
+    @patch("src.core.services.data_service.load_into_staging")
+    def test_insert_all_data_staging_failure_keeps_live_tables(self, mock_load_staging, mock_swap, mock_drop, _):
+        mock_conn = MagicMock(spec=Connection)
+        mock_load_staging.side_effect = [None, None, RuntimeError("falha no COPY")]
+
+        with self.assertRaises(RuntimeError):
+            data_service.insert_all_data(mock_conn, mode="staging")
+
+        mock_swap.assert_not_called()
+        # a carga desfeita e, antes de gravar a nova versão, a transação abortada
+        self.assertEqual(mock_conn.rollback.call_count, 2)
+        self.assertEqual(mock_drop.call_count, len(data_service.MODULE_FILES))
+
+    @patch("src.core.services.data_service.load_data")
+    @patch("src.core.services.data_service.upsert_into_table", return_value={"upserted": 2, "deleted": 0})
+    @patch("src.core.services.data_service.delete_product_data")
+    def test_insert_product_data_incremental_mode(self, mock_delete, mock_upsert, mock_load):
+        mock_conn = MagicMock(spec=Connection)
+        mock_load.return_value = [
+            {"produto": "VINHO DE MESA", "valor": 1000, "ano": 2023},
+            {"produto": "Tinto", "valor": 600, "ano": 2023},
+        ]
+
+        data_service.insert_product_data(mock_conn, mode="incremental")
+
+        mock_delete.assert_not_called()
+        upserted = mock_upsert.call_args[0][2]
+        self.assertEqual([(r["name"], r["quantity"]) for r in upserted], [("VINHO DE MESA", 1000), ("Tinto", 600)])
+        mock_conn.commit.assert_called_once()
+
+    def test_number_occurrences_completes_natural_key(self):
+        records = [
+            {"color_name": "TINTAS", "kind_name": "principal", "cultivar": "TINTAS", "quantity_kg": 10, "year_no": 1970},
+            {"color_name": "TINTAS", "kind_name": "principal", "cultivar": "TINTAS", "quantity_kg": 20, "year_no": 1970},
+            {"color_name": "TINTAS", "kind_name": "principal", "cultivar": "TINTAS", "quantity_kg": 30, "year_no": 1971},
+        ]
+
+        data_service.number_occurrences("process", records)
+
+        self.assertEqual([r["seq_no"] for r in records], [1, 2, 1])
+
+    def test_incremental_mode_on_shipped_data(self):
+        # process repete os blocos TINTAS e import separa quantidade e valor em linhas
+        for module in ("product", "process", "sales", "import"):
+            with self.subTest(module=module):
+                records = data_service.prepare_module(module)
+                keys = {tuple(r[k] for k in data_repository.TABLE_KEYS[module]) for r in records}
+                self.assertEqual(len(keys), len(records))
+
+                mock_conn = MagicMock(spec=Connection)
+                with patch.object(data_repository, "bulk_insert_into_table") as mock_bulk:
+                    data_service.store_records(mock_conn, module, records, "incremental", None, None, module)
+                self.assertEqual(len(mock_bulk.call_args[0][2]), len(records))
+
+    @patch("src.core.services.data_service.bulk_insert_into_table")
+    @patch("src.core.services.data_service.delete_sales_data")
+    def test_full_load_keeps_repeated_natural_keys(self, _, mock_bulk):
+        records = data_service.number_occurrences("sales", [
+            {"wine_derivative_name": "VINHO DE MESA", "name": "Tinto", "quantity_liters": 5, "year_no": 2023},
+            {"wine_derivative_name": "VINHO DE MESA", "name": "Tinto", "quantity_liters": 6, "year_no": 2023},
+        ])
+
+        data_service.store_records(MagicMock(spec=Connection), "sales", records, "copy",
+                                   data_service.delete_sales_data, data_service.insert_into_sales, "comercialização")
+
+        self.assertEqual([r["seq_no"] for r in mock_bulk.call_args[0][2]], [1, 2])
+
+    def test_upsert_uses_on_conflict_and_skips_unchanged_rows(self):
+        mock_conn = MagicMock(spec=Connection)
+        records = [
+            {"grape_type_name": "Espumantes", "country": "Peru", "quantity_kg": 4, "value_usd": 1.0, "year_no": 2020, "seq_no": 1},
+        ]
+
+        with patch.object(data_repository, "bulk_insert_into_table") as mock_bulk:
+            data_repository.upsert_into_table(mock_conn, "import", records)
+
+        self.assertEqual(mock_bulk.call_args[0][1], "import_incoming")
+        statements = [str(call[0][0]) for call in mock_conn.execute.call_args_list]
+        upsert = next(sql for sql in statements if "ON CONFLICT" in sql)
+        self.assertIn("ON CONFLICT (grape_type_name, country, year_no, seq_no) DO UPDATE", upsert)
+        self.assertIn("IS DISTINCT FROM (EXCLUDED.quantity_kg, EXCLUDED.value_usd)", upsert)
+        delete = next(sql for sql in statements if sql.strip().startswith("DELETE"))
+        self.assertIn("t.year_no IS NOT DISTINCT FROM i.year_no", delete)
+
+    @patch("src.core.services.data_service.ProcessPoolExecutor")
+    @patch("src.core.services.data_service.engine")
+    @patch("src.core.services.data_service.load_data", return_value=[])
+    @patch("src.core.services.data_service.store_records")
+    def test_insert_all_data_parallel_uses_one_connection_per_module(self, mock_store, _, mock_engine, mock_pool):
+        from concurrent.futures import ThreadPoolExecutor
+        mock_pool.side_effect = lambda max_workers, mp_context: ThreadPoolExecutor(max_workers=max_workers)
+        mock_conn = MagicMock(spec=Connection)
+
+        data_service.insert_all_data(mock_conn, mode="copy", parallelism=3)
+
+        mock_pool.assert_called_once()
+        self.assertEqual(mock_pool.call_args.kwargs["max_workers"], 3)
+        self.assertEqual(sorted(c[0][1] for c in mock_store.call_args_list), sorted(data_service.MODULE_FILES))
+        self.assertEqual(mock_engine.connect.call_count, len(data_service.MODULE_FILES))
+        # conn só atualiza as materialized views (um commit por view) e grava a nova versão dos dados
+        self.assertEqual(mock_conn.commit.call_count, len(data_service.MODULE_FILES) + 1)
+
+
+class TestDataRepositoryBulk(unittest.TestCase):
+
+    def test_copy_into_table_serializes_csv(self):
+        cursor = MagicMock()
+        mock_conn = MagicMock(spec=Connection)
+        mock_conn.connection.dbapi_connection.cursor.return_value = cursor
+        records = [
+            {"grape_type_name": "Espumantes", "country": "Chile, Rep.", "quantity_kg": 10, "value_usd": 2.5, "year_no": None, "seq_no": 1},
+        ]
+
+        total = data_repository.copy_into_table(mock_conn, "import", records)
+
+        self.assertEqual(total, 1)
+        sql, buffer = cursor.copy_expert.call_args[0]
+        self.assertIn("COPY import (grape_type_name, country, quantity_kg, value_usd, year_no, seq_no) FROM STDIN", sql)
+        self.assertEqual(buffer.getvalue(), 'Espumantes,"Chile, Rep.",10,2.5,\\N,1\n')
+
+    def test_bulk_insert_falls_back_to_executemany(self):
+        mock_conn = MagicMock(spec=Connection)
+        mock_conn.connection.dbapi_connection.cursor.return_value = MagicMock(spec=["execute", "close"])
+        records = [{"name": f"p{i}", "wine_derivative_name": "SUCO", "quantity": i, "year_no": 2020} for i in range(5)]
+
+        with patch.object(data_repository, "BULK_BATCH_SIZE", 2):
+            data_repository.bulk_insert_into_table(mock_conn, "product", records)
+
+        batches = [call[0][1] for call in mock_conn.execute.call_args_list]
+        self.assertEqual([len(b) for b in batches], [2, 2, 1])
+
+
+class TestNormalization(unittest.TestCase):
+
+    def test_normalize_sales_forward_fills_header_and_skips_total(self):
+        data = [
+            {"Produto": "Tinto", "valor": 1, "ano": 2020},
+            {"Produto": "VINHO DE MESA", "valor": "10.9", "ano": 2020},
+            {"Produto": " Tinto ", "valor": "-", "ano": 0},
+            {"Produto": "Total", "valor": None, "ano": 2020},
+            {"Produto": "OUTROS", "valor": 5, "ano": 2020},
+        ]
+
+        columns = normalization.normalize_sales(data)
+
+        self.assertEqual(columns, {
+            "name": ["VINHO DE MESA", "Tinto", "OUTROS"],
+            "wine_derivative_name": ["VINHO DE MESA", "VINHO DE MESA", "VINHO DE MESA"],
+            "quantity_liters": [10, 0, 5],
+            "year_no": [2020, None, 2020],
+        })
+
+    def test_normalize_sales_ignores_non_finite_value_on_total_row(self):
+        data = [
+            {"Produto": "VINHO DE MESA", "valor": 10, "ano": 2020},
+            {"Produto": "Total", "valor": "inf", "ano": 2020},
+        ]
+
+        columns = normalization.normalize_sales(data)
+
+        self.assertEqual(columns["quantity_liters"], [10])
+
+    def test_normalize_sales_collapses_spaces_in_header(self):
+        data = [
+            {"Produto": "VINHO DE MESA", "valor": 1, "ano": 2020},
+            {"Produto": "Tinto", "valor": 2, "ano": 2020},
+            {"Produto": "VINHO  FINO DE MESA", "valor": 3, "ano": 2020},
+            {"Produto": "Tinto", "valor": 4, "ano": 2020},
+        ]
+
+        columns = normalization.normalize_sales(data)
+
+        self.assertEqual(columns["wine_derivative_name"], ["VINHO DE MESA", "VINHO DE MESA", "VINHO FINO DE MESA", "VINHO FINO DE MESA"])
+
+    def test_normalize_process_rejects_invalid_kind(self):
+        data = [
+            {"cultivar": "TINTAS", "Quantidade (Kg)": "1.000", "type": "Viníferas", "ano": 2020},
+            {"cultivar": "Bordo", "Quantidade (Kg)": "2.500", "type": "Inexistente", "ano": 2020},
+        ]
+
+        with self.assertRaises(ValueError) as ctx:
+            normalization.normalize_process(data)
+        self.assertIn("Tipo inválido encontrado: 'Inexistente'", str(ctx.exception))
+
+def data_api_client(db=None):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from src.api.endpoints import data as data_endpoints
+    from src.config.database import get_data_db
+    from src.core.auth.auth_bearer import get_current_user
+
+    app = FastAPI()
+    app.include_router(data_endpoints.router)
+    app.dependency_overrides[get_data_db] = lambda: db if db is not None else MagicMock()
+    app.dependency_overrides[get_current_user] = lambda: "user"
+    return TestClient(app)
+
+
+class TestCursorPagination(unittest.TestCase):
+
+    def test_cursor_roundtrip_and_invalid(self):
+        cursor = data_service.encode_cursor(4242)
+        self.assertEqual(data_service.decode_cursor(cursor), 4242)
+        for invalid in ["nao-e-cursor", data_service.encode_cursor(-1), "e30"]:
+            with self.assertRaises(ValueError):
+                data_service.decode_cursor(invalid)
+
+    def test_get_data_by_module_uses_keyset_query(self):
+        mock_conn = MagicMock(spec=Connection)
+
+        data_service.get_data_by_module("import", mock_conn, year_no=2020, limit=50, after_id=10)
+
+        query, params = mock_conn.execute.call_args[0]
+        self.assertIn("WHERE id > :after_id AND year_no = :year_no ORDER BY id LIMIT :limit", str(query))
+        self.assertNotIn("OFFSET", str(query))
+        self.assertEqual(params, {"after_id": 10, "limit": 50, "year_no": 2020})
+
+    @patch("src.api.endpoints.data.get_module_page_etag", return_value=None)
+    @patch("src.api.endpoints.data.get_module_page")
+    def test_endpoint_returns_next_cursor(self, mock_get, _):
+        client = data_api_client()
+        mock_get.return_value = [{"id": 7}, {"id": 9}]
+
+        first = client.get("/export", params={"qtd_por_pagina": 2}).json()
+        self.assertEqual(first["pagina"], 1)
+        self.assertEqual(data_service.decode_cursor(first["next_cursor"]), 9)
+
+        mock_get.return_value = [{"id": 11}]
+        second = client.get("/export", params={"qtd_por_pagina": 2, "cursor": first["next_cursor"]}).json()
+        self.assertEqual(mock_get.call_args.kwargs["after_id"], 9)
+        self.assertEqual(second["after_id"], 9)
+        self.assertIsNone(second["next_cursor"])
+
+        self.assertEqual(client.get("/export", params={"cursor": "???"}).status_code, 400)
+
+
+class TestAsyncReads(unittest.TestCase):
+
+    def test_get_data_by_module_async_awaits_query(self):
+        import asyncio
+        from unittest.mock import AsyncMock
+        from sqlalchemy.ext.asyncio import AsyncConnection
+        mock_conn = MagicMock(spec=AsyncConnection)
+        row = MagicMock(_mapping={"id": 1, "year_no": 2020})
+        mock_conn.execute = AsyncMock(return_value=[row])
+
+        rows = asyncio.run(data_service.get_data_by_module_async("sales", mock_conn, year_no=2020, skip=100, limit=10))
+
+        self.assertEqual(rows, [{"id": 1, "year_no": 2020}])
+        query, params = mock_conn.execute.await_args[0]
+        self.assertIn("FROM sales WHERE year_no = :year_no ORDER BY id OFFSET :skip LIMIT :limit", str(query))
+        self.assertEqual(params, {"year_no": 2020, "skip": 100, "limit": 10})
+
+    @patch("src.api.endpoints.data.get_module_page")
+    @patch("src.api.endpoints.data.get_module_page_etag_async")
+    @patch("src.api.endpoints.data.get_module_page_async")
+    def test_endpoint_uses_async_path_for_async_connection(self, mock_page_async, mock_etag_async, mock_page):
+        from unittest.mock import AsyncMock
+        from sqlalchemy.ext.asyncio import AsyncConnection
+        mock_page_async.side_effect = AsyncMock(return_value=[{"id": 3}])
+        mock_etag_async.side_effect = AsyncMock(return_value=None)
+        client = data_api_client(MagicMock(spec=AsyncConnection))
+
+        body = client.get("/import", params={"ano": 2020}).json()
+
+        self.assertEqual(body["dados"], [{"id": 3}])
+        self.assertEqual(mock_page_async.call_args.kwargs["year_no"], 2020)
+        mock_page.assert_not_called()
+
+
+class TestPoolSettings(unittest.TestCase):
+
+    def test_null_pool_strategy(self):
+        from sqlalchemy.pool import NullPool
+        from src.config import database
+        with patch.object(database.settings, "DB_POOL_STRATEGY", "null"):
+            options = database.pool_options("teste")
+        self.assertTrue(issubclass(options["poolclass"], NullPool))
+        self.assertNotIn("pool_size", options)
+
+    def test_queue_pool_records_wait_and_in_use(self):
+        from sqlalchemy import create_engine
+        from src.config import database
+        with patch.object(database.settings, "DB_POOL_SIZE", 2):
+            engine = database.instrument_pool(create_engine("sqlite://", **database.pool_options("teste")), "teste")
+        self.assertEqual(engine.pool.size(), 2)
+
+        with engine.connect():
+            in_use = database.POOL_IN_USE.labels(engine="teste")._value.get()
+        self.assertEqual(in_use, 1)
+        self.assertEqual(database.POOL_IN_USE.labels(engine="teste")._value.get(), 0)
+        samples = {s.name: s.value for s in database.POOL_CHECKOUT_WAIT.collect()[0].samples if s.labels.get("engine") == "teste"}
+        self.assertEqual(samples["db_pool_checkout_wait_seconds_count"], 1)
+
+
+class TestStreamingExport(unittest.TestCase):
+
+    def test_stream_table_uses_server_side_cursor(self):
+        mock_conn = MagicMock(spec=Connection)
+        result = mock_conn.execution_options.return_value.execute.return_value
+        result.partitions.return_value = iter([[(1, "a")], [(2, "b")]])
+
+        batches = list(data_repository.stream_table("sales", mock_conn, batch_size=500))
+
+        self.assertEqual(batches, [[(1, "a")], [(2, "b")]])
+        mock_conn.execution_options.assert_called_once_with(stream_results=True, yield_per=500)
+
+    @patch.object(data_service.settings, "DB_ASYNC_READS", False)
+    @patch("src.core.services.data_service.engine")
+    @patch("src.core.services.data_service.stream_table")
+    def test_export_endpoint_streams_csv_and_ndjson(self, mock_stream, _):
+        from decimal import Decimal
+        rows = [(1, "Espumantes", "Chile, Rep.", 10, Decimal("2.50"), 2020)]
+        mock_stream.side_effect = lambda *args, **kwargs: iter([rows])
+        client = data_api_client()
+
+        csv_response = client.get("/export/export", params={"format": "csv"})
+        self.assertEqual(csv_response.headers["content-type"], "text/csv; charset=utf-8")
+        self.assertEqual(
+            csv_response.text,
+            'id,grape_type_name,country,quantity_kg,value_usd,year_no\n1,Espumantes,"Chile, Rep.",10,2.50,2020\n'
+        )
+
+        ndjson_response = client.get("/export/export", params={"ano": 2020})
+        self.assertEqual(
+            ndjson_response.text,
+            '{"id":1,"grape_type_name":"Espumantes","country":"Chile, Rep.","quantity_kg":10,"value_usd":2.5,"year_no":2020}\n'
+        )
+        self.assertEqual(mock_stream.call_args.kwargs["year_no"], 2020)
+        self.assertEqual(client.get("/vinhos/export").status_code, 404)
+
+
+class TestArrowResponses(unittest.TestCase):
+
+    def test_format_negotiation_honours_q_values(self):
+        from src.api.endpoints.data import formato_negociado
+        self.assertEqual(formato_negociado(None), "json")
+        self.assertEqual(formato_negociado("*/*"), "json")
+        self.assertEqual(formato_negociado("application/vnd.apache.arrow.stream"), "arrow")
+        self.assertEqual(formato_negociado("application/json, application/vnd.apache.arrow.stream;q=0"), "json")
+        self.assertEqual(formato_negociado("application/vnd.apache.arrow.stream;q=0"), "json")
+        self.assertEqual(formato_negociado("application/vnd.apache.arrow.stream;q=0.5, application/vnd.apache.parquet"), "parquet")
+        self.assertEqual(formato_negociado("application/json;q=0.9, application/vnd.apache.parquet; q=0.8"), "json")
+
+    @unittest.skipUnless(arrow_service.arrow_available(), "pyarrow não instalado")
+    @patch("src.api.endpoints.data.get_module_page_etag", return_value='"1-abc"')
+    @patch("src.api.endpoints.data.get_module_page")
+    def test_page_in_arrow_stream(self, mock_get, mock_etag):
+        import pyarrow as pa
+        from decimal import Decimal
+        mock_get.return_value = [
+            {"id": 5, "name": "Tinto", "wine_derivative_name": "VINHO DE MESA", "quantity_liters": Decimal("10.50"), "year_no": 2020},
+        ]
+        client = data_api_client()
+
+        response = client.get("/sales", params={"qtd_por_pagina": 1}, headers={"Accept": "application/vnd.apache.arrow.stream"})
+
+        self.assertEqual(response.headers["content-type"], "application/vnd.apache.arrow.stream")
+        self.assertEqual(response.headers["etag"], '"1-abc"')
+        self.assertEqual(data_service.decode_cursor(response.headers["x-next-cursor"]), 5)
+        self.assertEqual(mock_etag.call_args[0][1][-1], "arrow")
+        table = pa.ipc.open_stream(response.content).read_all()
+        self.assertEqual(str(table.schema.field("year_no").type), "int16")
+        self.assertTrue(pa.types.is_dictionary(table.schema.field("wine_derivative_name").type))
+        self.assertEqual(table.to_pydict()["quantity_liters"], [10.5])
+
+    @unittest.skipUnless(arrow_service.arrow_available(), "pyarrow não instalado")
+    @patch.object(data_service.settings, "DB_ASYNC_READS", False)
+    @patch("src.core.services.data_service.engine")
+    @patch("src.core.services.data_service.stream_table")
+    def test_parquet_export(self, mock_stream, _):
+        import io
+        import pyarrow.parquet as pq
+        mock_stream.side_effect = lambda *args, **kwargs: iter([[(1, "TINTAS", "Viníferas", "Bordo", 100, 2020)], [(2, "TINTAS", "Viníferas", "Isabel", 50, 2021)]])
+        client = data_api_client()
+
+        response = client.get("/process/export", params={"format": "parquet"})
+
+        table = pq.read_table(io.BytesIO(response.content))
+        self.assertEqual(table.to_pydict()["cultivar"], ["Bordo", "Isabel"])
+        self.assertEqual(str(table.schema.field("quantity_kg").type), "int64")
+
+    @patch("src.api.endpoints.data.arrow_available", return_value=False)
+    def test_arrow_without_pyarrow_returns_406(self, _):
+        client = data_api_client()
+        self.assertEqual(client.get("/product", headers={"Accept": "application/vnd.apache.arrow.stream"}).status_code, 406)
+        self.assertEqual(client.get("/product/export", params={"format": "parquet"}).status_code, 406)
+
+
+class TestETag(unittest.TestCase):
+
+    @patch("src.core.services.data_service.data_cache")
+    def test_etag_depends_on_version_and_params(self, mock_cache):
+        key = data_service.module_page_key("product", year_no=2020, skip=0, limit=100)
+        mock_cache.version.return_value = 3
+        etag = data_service.get_module_page_etag(MagicMock(), key)
+
+        self.assertRegex(etag, r'^"3-[0-9a-f]{16}"$')
+        self.assertNotEqual(etag, data_service.get_module_page_etag(MagicMock(), key[:-1] + (10,)))
+        mock_cache.version.return_value = 4
+        self.assertNotEqual(etag, data_service.get_module_page_etag(MagicMock(), key))
+
+    @patch("src.api.endpoints.data.get_module_page_etag", return_value='"3-abc"')
+    @patch("src.api.endpoints.data.get_module_page", return_value=[{"id": 1}])
+    def test_if_none_match_returns_304_without_reading_data(self, mock_get, _):
+        client = data_api_client()
+
+        first = client.get("/product")
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.headers["etag"], '"3-abc"')
+
+        second = client.get("/product", headers={"If-None-Match": 'W/"x", "3-abc"'})
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.headers["etag"], '"3-abc"')
+        mock_get.assert_called_once()
+
+
+class TestAggregation(unittest.TestCase):
+
+    def test_aggregate_table_builds_group_by_query(self):
+        mock_conn = MagicMock(spec=Connection)
+
+        data_repository.aggregate_table("export", mock_conn, ["year_no", "country"], agg="sum", year_from=2010)
+
+        query, params = mock_conn.execute.call_args[0]
+        self.assertEqual(
+            str(query),
+            "SELECT year_no, country, SUM(quantity_kg) AS quantity_kg, SUM(value_usd) AS value_usd FROM export "
+            "WHERE year_no >= :year_from GROUP BY year_no, country ORDER BY year_no, country"
+        )
+        self.assertEqual(params, {"year_from": 2010})
+
+    def test_aggregate_table_rejects_unknown_column(self):
+        with self.assertRaises(ValueError):
+            data_repository.aggregate_table("product", MagicMock(spec=Connection), ["year_no; DROP TABLE product"])
+
+    def test_aggregate_table_reads_rollup_view(self):
+        mock_conn = MagicMock(spec=Connection)
+
+        data_repository.aggregate_table("import", mock_conn, ["year_no"], agg="count")
+
+        query = str(mock_conn.execute.call_args[0][0])
+        self.assertEqual(
+            query,
+            "SELECT year_no, CAST(SUM(count) AS BIGINT) AS count FROM import_rollup GROUP BY year_no ORDER BY year_no"
+        )
+        data_repository.aggregate_table("import", mock_conn, ["year_no"], agg="avg")
+        self.assertIn("FROM import GROUP BY", str(mock_conn.execute.call_args[0][0]))
+
+    @patch("src.core.services.data_service.refresh_rollup")
+    @patch("src.core.services.data_service.load_data", return_value=[])
+    @patch("src.core.services.data_service.store_records")
+    def test_insert_all_data_refreshes_rollups(self, _, __, mock_refresh):
+        data_service.insert_all_data(MagicMock(spec=Connection), mode="incremental", parallelism=1)
+
+        self.assertEqual([c[0][1] for c in mock_refresh.call_args_list], list(data_service.MODULE_FILES))
+
+    @patch("src.core.services.data_service.refresh_rollup", side_effect=[Exception("must be owner"), None, None, None, None])
+    def test_refresh_rollups_logs_failures(self, mock_refresh):
+        mock_conn = MagicMock(spec=Connection)
+
+        with self.assertLogs("src.core.services.data_service", level="WARNING"):
+            data_service.refresh_rollups(mock_conn)
+
+        self.assertEqual(mock_refresh.call_count, len(data_service.MODULE_FILES))
+        mock_conn.rollback.assert_called_once()
+        self.assertEqual(mock_conn.commit.call_count, len(data_service.MODULE_FILES) - 1)
+
+    def test_staging_ddl_goes_through_security_definer_functions(self):
+        mock_conn = MagicMock(spec=Connection)
+
+        self.assertEqual(data_repository.create_staging_table(mock_conn, "sales"), "sales_staging")
+        data_repository.build_staging_indexes(mock_conn, "sales")
+        data_repository.swap_staging_table(mock_conn, "sales")
+        data_repository.drop_staging_table(mock_conn, "sales")
+
+        calls = [(str(c[0][0]), c[0][1]) for c in mock_conn.execute.call_args_list]
+        self.assertEqual(calls, [
+            ("SELECT create_staging_table(:table)", {"table": "sales"}),
+            ("SELECT build_staging_indexes(:table)", {"table": "sales"}),
+            ("SELECT swap_staging_table(:table)", {"table": "sales"}),
+            ("SELECT drop_staging_table(:table)", {"table": "sales"}),
+        ])
+
+    @patch.object(data_service.data_cache, "version", return_value=None)
+    @patch("src.api.endpoints.data.get_module_page_etag", return_value=None)
+    @patch("src.core.services.data_service.aggregate_table", return_value=[{"year_no": 2020, "count": 3}])
+    def test_aggregate_endpoint(self, mock_aggregate, _, __):
+        client = data_api_client()
+
+        ok = client.get("/sales/aggregate", params={"group_by": "year_no, year_no", "agg": "count"})
+        self.assertEqual(ok.status_code, 200)
+        self.assertEqual(ok.json()["group_by"], ["year_no"])
+        self.assertEqual(mock_aggregate.call_args[0][2], ["year_no"])
+
+        mock_aggregate.side_effect = ValueError("coluna inválida")
+        self.assertEqual(client.get("/sales/aggregate", params={"group_by": "country"}).status_code, 400)
+        self.assertEqual(client.get("/vinhos/aggregate").status_code, 404)
+
+
+class TestDataCache(unittest.TestCase):
+
+    def _cache(self, **kwargs):
+        options = {"max_entries": 2, "ttl_seconds": 60, "version_check_seconds": 60}
+        options.update(kwargs)
+        return cache_service.DataCache(**options)
+
+    @patch("src.core.services.cache_service.get_dataset_version", return_value=1)
+    def test_hit_skips_loader_and_db(self, mock_version):
+        cache = self._cache()
+        loader = MagicMock(return_value=[{"id": 1}])
+
+        first = cache.get_or_load(MagicMock(), ("product", None, 0, 100, None), loader)
+        second = cache.get_or_load(MagicMock(), ("product", None, 0, 100, None), loader)
+
+        self.assertEqual(first, second)
+        loader.assert_called_once()
+        mock_version.assert_called_once()  # versão consultada uma vez dentro do intervalo
+
+    @patch("src.core.services.cache_service.get_dataset_version", return_value=1)
+    def test_lru_eviction_and_invalidation(self, _):
+        cache = self._cache()
+        loader = MagicMock(side_effect=lambda: [{"id": loader.call_count}])
+        for key in ["a", "b", "a", "c"]:  # "b" é o menos usado quando "c" entra
+            cache.get_or_load(MagicMock(), (key,), loader)
+        self.assertEqual(list(cache._entries), [("a",), ("c",)])
+
+        cache.invalidate(2)
+        self.assertEqual(len(cache._entries), 0)
+        self.assertEqual(cache.version(MagicMock()), 2)
+
+    @patch("src.core.services.cache_service.get_dataset_version", side_effect=RuntimeError("sem tabela"))
+    def test_version_failure_bypasses_cache(self, _):
+        cache = self._cache()
+        conn = MagicMock()
+        loader = MagicMock(return_value=[])
+
+        cache.get_or_load(conn, ("sales",), loader)
+        cache.get_or_load(conn, ("sales",), loader)
+
+        self.assertEqual(loader.call_count, 2)
+        conn.rollback.assert_called()
+
+    @patch("src.core.services.data_service.data_cache")
+    @patch("src.core.services.data_service.bump_dataset_version", return_value=8)
+    @patch("src.core.services.data_service.load_data", return_value=[])
+    @patch("src.core.services.data_service.store_records")
+    def test_insert_all_data_publishes_new_version(self, _, __, mock_bump, mock_cache):
+        data_service.insert_all_data(MagicMock(spec=Connection), mode="copy", parallelism=1)
+
+        mock_bump.assert_called_once()
+        mock_cache.invalidate.assert_called_once_with(8)
+
+    @patch("src.core.services.data_service.data_cache")
+    @patch("src.core.services.data_service.bump_dataset_version", return_value=9)
+    @patch("src.core.services.data_service.load_data", return_value=[])
+    @patch("src.core.services.data_service.store_records")
+    def test_failed_import_rolls_back_before_publishing_version(self, mock_store, _, mock_bump, mock_cache):
+        mock_conn = MagicMock(spec=Connection)
+        mock_store.side_effect = [None, RuntimeError("falha no COPY")]
+        mock_bump.side_effect = lambda conn: conn.rollback.assert_called() or 9
+
+        with self.assertRaises(RuntimeError):
+            data_service.insert_all_data(mock_conn, mode="copy", parallelism=1)
+
+        mock_bump.assert_called_once()
+        mock_cache.invalidate.assert_called_once_with(9)
+
+
+class TestCompression(unittest.TestCase):
+
+    @patch.object(compression.settings, "COMPRESSION_ALGORITHMS", "br,gzip")
+    def test_negotiation_follows_server_preference_and_q_values(self):
+        expected_br = "br" if compression.brotli is not None else "gzip"
+        self.assertEqual(compression.codificacao_negociada("gzip, deflate, br"), expected_br)
+        self.assertEqual(compression.codificacao_negociada("br;q=0, gzip;q=0.5"), "gzip")
+        self.assertEqual(compression.codificacao_negociada("*"), expected_br)
+        self.assertIsNone(compression.codificacao_negociada("identity"))
+        self.assertIsNone(compression.codificacao_negociada(None))
+
+    @patch.object(compression.settings, "COMPRESSION_ALGORITHMS", "gzip")
+    @patch.object(compression.settings, "COMPRESSION_MIN_SIZE", 500)
+    def test_middleware_respects_min_size_and_streams(self):
+        from fastapi import FastAPI
+        from fastapi.responses import PlainTextResponse, StreamingResponse
+        from fastapi.testclient import TestClient
+
+        app = FastAPI()
+        app.add_middleware(compression.CompressionMiddleware)
+        app.get("/grande")(lambda: PlainTextResponse("vinho " * 200))
+        app.get("/pequeno")(lambda: PlainTextResponse("vinho"))
+        app.get("/stream")(lambda: StreamingResponse(iter([b"a" * 10, b"b" * 10]), media_type="text/csv"))
+        client = TestClient(app)
+
+        grande = client.get("/grande", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(grande.headers["content-encoding"], "gzip")
+        self.assertEqual(grande.headers["vary"], "Accept-Encoding")
+        self.assertLess(int(grande.headers["content-length"]), 100)
+        self.assertEqual(grande.text, "vinho " * 200)
+
+        self.assertNotIn("content-encoding", client.get("/pequeno", headers={"Accept-Encoding": "gzip"}).headers)
+        self.assertNotIn("content-encoding", client.get("/grande", headers={"Accept-Encoding": "identity"}).headers)
+
+        stream = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(stream.headers["content-encoding"], "gzip")
+        self.assertEqual(stream.text, "a" * 10 + "b" * 10)
+
+    @patch.object(compression.settings, "COMPRESSION_ALGORITHMS", "gzip")
+    @patch.object(compression.settings, "COMPRESSION_MIN_SIZE", 100)
+    @patch("src.api.endpoints.data.dumps_json", side_effect=lambda body: b'{"dados": "%s"}' % (b"x" * 500))
+    @patch("src.api.endpoints.data.get_module_page_etag", return_value='"1-abc"')
+    @patch("src.api.endpoints.data.get_module_page", return_value=[{"id": 1}])
+    def test_page_cache_keeps_compressed_bytes(self, _, __, mock_dumps):
+        cache = cache_service.DataCache(max_entries=10, ttl_seconds=60, version_check_seconds=60)
+        cache.invalidate(1)
+        client = data_api_client()
+
+        with patch("src.api.endpoints.data.data_cache", cache):
+            first = client.get("/product", headers={"Accept-Encoding": "gzip"})
+            second = client.get("/product", headers={"Accept-Encoding": "gzip"})
+
+        for response in (first, second):
+            self.assertEqual(response.headers["content-encoding"], "gzip")
+            self.assertEqual(response.headers["vary"], "Accept, Accept-Encoding")
+            self.assertEqual(response.json(), {"dados": "x" * 500})
+        mock_dumps.assert_called_once()  # o segundo pedido veio comprimido do cache
+        self.assertIn(("product", "encoded", '"1-abc"', "gzip"), cache._entries)
+
+    @patch.object(compression.settings, "COMPRESSION_MIN_SIZE", 100)
+    @patch("src.api.endpoints.data.dumps_json", side_effect=lambda body: b'{"dados": "%s"}' % (b"x" * 500))
+    @patch("src.api.endpoints.data.get_module_page_etag", return_value='"1-abc"')
+    @patch("src.api.endpoints.data.get_module_page", return_value=[{"id": 1}])
+    def test_etag_is_specific_to_content_encoding(self, *_):
+        client = data_api_client()
+
+        gzip_response = client.get("/product", headers={"Accept-Encoding": "gzip"})
+        identity = client.get("/product", headers={"Accept-Encoding": "identity"})
+        self.assertEqual(gzip_response.headers["etag"], '"1-abc-gzip"')
+        self.assertEqual(identity.headers["etag"], '"1-abc"')
+
+        not_modified = client.get("/product", headers={"Accept-Encoding": "gzip", "If-None-Match": '"1-abc-gzip"'})
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.headers["etag"], '"1-abc-gzip"')
+        self.assertEqual(not_modified.headers["vary"], "Accept, Accept-Encoding")
+        # O ETag gzip não vale para quem não aceita gzip
+        self.assertEqual(client.get("/product", headers={"Accept-Encoding": "identity", "If-None-Match": '"1-abc-gzip"'}).status_code, 200)
+
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
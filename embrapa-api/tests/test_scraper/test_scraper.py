@@ -1,7 +1,15 @@
 
+import asyncio
+import os
+import tempfile
+import time
 import unittest
+from urllib.parse import urljoin
 from unittest.mock import patch, Mock
 import src.scraper as scraper
+from src.scraper import embrapa_scraper
+from src.db.repositories import job_repository
+from src.tasks import jobs, scheduler
 
 
 class TestWebScraper(unittest.TestCase):
@@ -42,5 +50,485 @@ class TestWebScraper(unittest.TestCase):
         scraper.save_json(df, 'dummy.json')
         mock_open.assert_called_once()
 
+
+class TestCsvDownloader(unittest.TestCase):
+
+    def test_montar_tarefas_cobre_opcoes_e_subopcoes(self):
+        tarefas = embrapa_scraper.montar_tarefas('saida')
+        total_subopcoes = sum(len(subs) for subs in embrapa_scraper.suboption_labels.values())
+        self.assertEqual(len(tarefas), 2 + total_subopcoes)
+        self.assertEqual({t['opt_key'] for t in tarefas}, set(embrapa_scraper.opcoes))
+
+    @patch('src.scraper.embrapa_scraper.processar_tarefa')
+    def test_run_csv_downloader_status_por_opcao(self, mock_processar):
+        def processar(tarefa, max_por_host=None, manifesto=None):
+            if tarefa['opt_key'] == 'opt_05' and tarefa['label'] == 'Espumantes':
+                raise Exception('timeout')
+            return 'atualizado' if tarefa['opt_key'] == 'opt_02' else 'inalterado'
+        mock_processar.side_effect = processar
+
+        with tempfile.TemporaryDirectory() as saida:
+            resultados = embrapa_scraper.run_csv_downloader(saida, max_workers=4)
+
+        self.assertEqual(list(resultados), list(embrapa_scraper.opcoes))
+        self.assertEqual(resultados['opt_05'], {'status': 'falha', 'erro': 'timeout'})
+        self.assertEqual(resultados['opt_02'], {'status': 'sucesso', 'alterado': True})
+        self.assertEqual(resultados['opt_04'], {'status': 'sucesso', 'alterado': False})
+        self.assertEqual(mock_processar.call_count, len(embrapa_scraper.montar_tarefas('saida')))
+
+    def test_particionar_tarefas_sem_repetir_paginas(self):
+        tarefas = embrapa_scraper.montar_tarefas('saida')
+        partes = embrapa_scraper.particionar_tarefas(tarefas, 3)
+
+        self.assertEqual(len(partes), 3)
+        urls = [t['url'] for parte in partes for t in parte]
+        self.assertCountEqual(urls, [t['url'] for t in tarefas])
+        self.assertEqual(len(embrapa_scraper.particionar_tarefas(tarefas[:2], 5)), 2)
+
+    @patch('src.scraper.embrapa_scraper.juntar_jsons_por_opcao')
+    @patch('src.scraper.embrapa_scraper.processar_tarefa')
+    def test_run_scraper_particionado_processa_cada_pagina_uma_vez(self, mock_processar, mock_juntar):
+        mock_processar.side_effect = lambda tarefa, max_por_host=None, manifesto=None, ao_evento=None: (
+            'atualizado' if tarefa['opt_key'] == 'opt_06' else 'inalterado'
+        )
+        progresso = []
+
+        with tempfile.TemporaryDirectory() as saida:
+            resultado = embrapa_scraper.run_scraper_particionado(
+                saida, partes=3, ao_concluir=lambda tarefa, status, erro: progresso.append(status)
+            )
+
+        total = len(embrapa_scraper.montar_tarefas('saida'))
+        self.assertEqual(mock_processar.call_count, total)
+        self.assertEqual(len(progresso), total)
+        self.assertEqual(len(resultado['partes']), 3)
+        self.assertEqual(resultado['resultados']['opt_06'], {'status': 'sucesso', 'alterado': True})
+        self.assertEqual(resultado['resultados']['opt_03'], {'status': 'sucesso', 'alterado': False})
+        mock_juntar.assert_called_once_with(saida)
+
+
+class TestJobsNoExecutor(unittest.TestCase):
+
+    @patch('src.scraper.embrapa_scraper.juntar_jsons_por_opcao')
+    @patch('src.tasks.jobs.processar_tarefa')
+    def test_scraper_async_nao_bloqueia_o_event_loop(self, mock_processar, _):
+        mock_processar.side_effect = lambda tarefa, max_por_host=None, manifesto=None, ao_evento=None: time.sleep(0.02) or 'inalterado'
+        ticks = []
+
+        async def medir_loop(job):
+            while not job.done():
+                ticks.append(time.perf_counter())
+                await asyncio.sleep(0.005)
+
+        async def executar(saida):
+            job = asyncio.ensure_future(jobs.run_scraper_particionado_async(saida, partes=2, pausa=0.01))
+            await medir_loop(job)
+            return await job
+
+        with tempfile.TemporaryDirectory() as saida:
+            resultado = asyncio.run(executar(saida))
+
+        self.assertEqual(mock_processar.call_count, len(embrapa_scraper.montar_tarefas('saida')))
+        self.assertEqual(len(resultado['partes']), 2)
+        # O loop continuou respondendo durante o job (bloqueado, ficaria parado ~0,15s)
+        self.assertGreater(len(ticks), 10)
+        self.assertLess(max(b - a for a, b in zip(ticks, ticks[1:])), 0.1)
+
+    def test_executor_recriado_apos_encerrar(self):
+        self.assertEqual(asyncio.run(jobs.no_executor(sum, [1, 2])), 3)
+        jobs.encerrar_executor()
+
+        # Um segundo lifespan (outro TestClient, reload) volta a usar o pool
+        self.assertEqual(asyncio.run(jobs.no_executor(sum, [3, 4])), 7)
+
+
+class TestFilaDeJobs(unittest.TestCase):
+
+    def test_enqueue_reaproveita_job_ativo_com_mesma_chave(self):
+        conn = Mock()
+        conn.execute.side_effect = [Mock(scalar=Mock(return_value=None)), Mock(scalar=Mock(return_value='job-ativo'))]
+
+        job_id, criado = job_repository.enqueue_job(conn, 'novo', 'scraping:data/vitibrasil', {'workers': 3})
+
+        self.assertEqual((job_id, criado), ('job-ativo', False))
+        insert = str(conn.execute.call_args_list[0][0][0])
+        self.assertIn("ON CONFLICT (dedupe_key) WHERE status IN ('pendente', 'em_andamento') DO NOTHING", insert)
+
+    def test_dequeue_pula_jobs_travados(self):
+        conn = Mock()
+        conn.execute.return_value.first.return_value = None
+
+        self.assertIsNone(job_repository.dequeue_job(conn, 'worker-1'))
+        self.assertIn('FOR UPDATE SKIP LOCKED', str(conn.execute.call_args[0][0]))
+
+    def test_executar_job_interrompe_quando_cancelado(self):
+        finalizados = []
+
+        def em_transacao(funcao, *args, **kwargs):
+            if funcao is job_repository.heartbeat_job:
+                return True  # cancelamento pedido
+            if funcao is job_repository.finish_job:
+                finalizados.append((args, kwargs))
+                return True
+
+        async def scraping_lento(*args, **kwargs):
+            await asyncio.sleep(10)
+
+        job = {'id': 'job-1', 'params': {'output_dir': 'saida', 'workers': 2, 'sleep_time': 0}}
+        with patch('src.tasks.jobs.em_transacao', side_effect=em_transacao), \
+                patch('src.tasks.jobs.run_scraper_particionado_async', side_effect=scraping_lento), \
+                patch.object(jobs.settings, 'JOB_HEARTBEAT_SECONDS', 0.01):
+            inicio = time.perf_counter()
+            asyncio.run(jobs.executar_job(job, 'worker-1'))
+
+        self.assertLess(time.perf_counter() - inicio, 1)
+        self.assertEqual(finalizados, [(('job-1', 'worker-1', 'cancelado'), {})])
+
+    def test_executar_job_mantem_heartbeat_durante_a_importacao(self):
+        batimentos = []
+
+        def em_transacao(funcao, *args, **kwargs):
+            if funcao is job_repository.heartbeat_job:
+                batimentos.append(args)
+                return False
+            return True
+
+        async def scraping(*args, **kwargs):
+            return {'resultados': {}}
+
+        async def importacao_lenta(*args):
+            await asyncio.sleep(0.1)
+            return {'importado': True}
+
+        job = {'id': 'job-1', 'params': {'output_dir': 'saida', 'workers': 1, 'sleep_time': 0, 'importar': True}}
+        with patch('src.tasks.jobs.em_transacao', side_effect=em_transacao), \
+                patch('src.tasks.jobs.run_scraper_particionado_async', side_effect=scraping), \
+                patch('src.tasks.jobs.importar_se_alterado', side_effect=importacao_lenta), \
+                patch.object(jobs.settings, 'JOB_HEARTBEAT_SECONDS', 0.01):
+            asyncio.run(jobs.executar_job(job, 'worker-1'))
+
+        self.assertGreater(len(batimentos), 2)
+        self.assertTrue(all(args[:2] == ('job-1', 'worker-1') for args in batimentos))
+
+    def test_heartbeat_e_finalizacao_exigem_o_worker_dono(self):
+        conn = Mock()
+        conn.execute.return_value.rowcount = 0
+        conn.execute.return_value.scalar.return_value = None
+
+        self.assertTrue(job_repository.heartbeat_job(conn, 'job-1', 'worker-1', 50.0))
+        self.assertIn('AND worker = :worker', str(conn.execute.call_args[0][0]))
+        self.assertFalse(job_repository.finish_job(conn, 'job-1', 'worker-1', 'concluído'))
+        self.assertIn('AND worker = :worker', str(conn.execute.call_args[0][0]))
+        self.assertEqual(conn.execute.call_args[0][1]['worker'], 'worker-1')
+
+    @patch('src.tasks.jobs.em_transacao')
+    @patch('src.api.endpoints.scraper.enfileirar_scraping', return_value=('job-ativo', False))
+    def test_executar_sincrono_aguarda_o_job_da_fila(self, mock_enfileirar, mock_transacao):
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from src.api.endpoints import scraper as scraper_endpoints
+
+        mock_transacao.side_effect = [
+            {'status': 'em andamento', 'result': None, 'error': None},
+            {'status': 'concluído', 'result': {'resultados': {'opt_02': 'ok'}}, 'error': None},
+        ]
+        app = FastAPI()
+        app.include_router(scraper_endpoints.router)
+
+        with tempfile.TemporaryDirectory() as saida, patch.object(jobs.settings, 'JOB_POLL_SECONDS', 0):
+            resposta = TestClient(app).get('/executar', params={'output_dir': saida})
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['task_id'], 'job-ativo')
+        self.assertEqual(resposta.json()['resultados'], {'opt_02': 'ok'})
+        self.assertEqual(mock_enfileirar.call_args[0][0], saida)
+        self.assertEqual([c[0][0] for c in mock_transacao.call_args_list], [job_repository.get_job] * 2)
+
+    @patch('src.api.endpoints.scraper.get_job', return_value=None)
+    def test_status_de_tarefa_inexistente_ou_invalida_retorna_404(self, mock_get):
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from src.api.endpoints import scraper as scraper_endpoints
+        from src.config.database import get_db
+
+        app = FastAPI()
+        app.include_router(scraper_endpoints.router)
+        app.dependency_overrides[get_db] = lambda: Mock()
+        client = TestClient(app)
+
+        self.assertEqual(client.get('/status/nao-e-um-uuid').status_code, 404)
+        mock_get.assert_not_called()
+        self.assertEqual(client.get('/status/3F2504E0-4F89-11D3-9A0C-0305E82C3301').status_code, 404)
+        self.assertEqual(mock_get.call_args[0][1], '3f2504e0-4f89-11d3-9a0c-0305e82c3301')
+
+    @patch('src.api.endpoints.scraper.list_jobs')
+    def test_tarefas_paginadas(self, mock_list):
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from src.api.endpoints import scraper as scraper_endpoints
+        from src.config.database import get_db
+
+        mock_list.return_value = ([{
+            'id': 'job-1', 'status': 'concluído', 'params': {'output_dir': 'data/vitibrasil', 'workers': 3, 'sleep_time': 1.0},
+            'progress': 100, 'result': {'resultados': {}}, 'error': None, 'cancel_requested': False,
+            'created_at': None, 'started_at': None, 'finished_at': None,
+        }], 41)
+        app = FastAPI()
+        app.include_router(scraper_endpoints.router)
+        app.dependency_overrides[get_db] = lambda: Mock()
+
+        resposta = TestClient(app).get('/tarefas', params={'pagina': 3, 'qtd_por_pagina': 20})
+
+        self.assertEqual(resposta.status_code, 200)
+        corpo = resposta.json()
+        self.assertEqual((corpo['pagina'], corpo['total']), (3, 41))
+        self.assertNotIn('results', corpo['tarefas'][0])
+        self.assertEqual(mock_list.call_args[1], {'skip': 40, 'limit': 20, 'status': None})
+
+
+class TestEventosDoJob(unittest.TestCase):
+
+    @patch('src.scraper.embrapa_scraper.gravar_json')
+    @patch('src.scraper.embrapa_scraper.os.path.getsize', return_value=2048)
+    @patch('src.scraper.embrapa_scraper.normalizar_csv', return_value=[{'ano': 2020}] * 7)
+    @patch('src.scraper.embrapa_scraper.baixar_csv', return_value=b'a;b\n1;2\n')
+    @patch('src.scraper.embrapa_scraper.http_get')
+    def test_processar_tarefa_emite_evento_por_etapa(self, mock_get, *_):
+        mock_get.return_value = Mock(text='<a href="dados.csv">DOWNLOAD CSV</a>', content=b'x' * 100)
+        eventos = []
+
+        with tempfile.TemporaryDirectory() as saida:
+            tarefa = embrapa_scraper.montar_tarefas(saida)[0]
+            status = embrapa_scraper.processar_tarefa(tarefa, ao_evento=eventos.append)
+
+        self.assertEqual(status, 'atualizado')
+        self.assertEqual([e['etapa'] for e in eventos], ['acessada', 'baixado', 'normalizado', 'convertido'])
+        self.assertEqual((eventos[0]['bytes'], eventos[1]['bytes']), (100, 8))
+        self.assertEqual((eventos[2]['linhas'], eventos[3]['bytes']), (7, 2048))
+        self.assertTrue(all(e['opt_key'] == 'opt_02' and e['segundos'] >= 0 for e in eventos))
+
+    @patch('src.api.endpoints.scraper.em_transacao', side_effect=lambda funcao, *args: funcao(None, *args))
+    @patch('src.api.endpoints.scraper.list_job_events')
+    @patch('src.api.endpoints.scraper.get_job_status')
+    def test_stream_envia_eventos_e_termina_com_o_job(self, mock_status, mock_eventos, _):
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from src.api.endpoints import scraper as scraper_endpoints
+        from src.config.database import get_db
+
+        mock_status.side_effect = ['em_andamento'] * 4 + ['concluído']
+        mock_eventos.side_effect = [
+            [{'id': 4, 'stage': 'baixado', 'payload': {'bytes': 10}, 'created_at': None}],
+            [],
+            [{'id': 5, 'stage': 'finalizado', 'payload': {'status': 'concluído'}, 'created_at': None}],
+            [],
+        ]
+        app = FastAPI()
+        app.include_router(scraper_endpoints.router)
+        app.dependency_overrides[get_db] = lambda: Mock()
+        task_id = '6f1c2f4e-8f43-4a53-9a8e-0d0e8f1b2c3d'
+
+        with patch.object(scraper_endpoints.settings, 'JOB_EVENTS_POLL_SECONDS', 0):
+            resposta = TestClient(app).get(f'/status/{task_id}/stream', headers={'Last-Event-ID': '3'})
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertTrue(resposta.headers['content-type'].startswith('text/event-stream'))
+        self.assertEqual(resposta.text, (
+            'id: 4\nevent: baixado\ndata: {"bytes":10,"created_at":null}\n\n'
+            'id: 5\nevent: finalizado\ndata: {"status":"concluído","created_at":null}\n\n'
+            'event: fim\ndata: {"status":"concluído"}\n\n'
+        ))
+        self.assertEqual(mock_eventos.call_args_list[0][0][1:], (task_id, 3))
+        self.assertEqual(mock_eventos.call_args_list[2][0][1:], (task_id, 4))
+
+
+class TestAgendador(unittest.TestCase):
+
+    def test_janela_fora_de_pico_cruzando_a_meia_noite(self):
+        from datetime import datetime
+        self.assertTrue(scheduler.dentro_da_janela(datetime(2025, 1, 1, 23, 30), '23:00-04:00'))
+        self.assertTrue(scheduler.dentro_da_janela(datetime(2025, 1, 1, 3, 59), '23:00-04:00'))
+        self.assertFalse(scheduler.dentro_da_janela(datetime(2025, 1, 1, 12, 0), '23:00-04:00'))
+        self.assertTrue(scheduler.dentro_da_janela(datetime(2025, 1, 1, 12, 0), ''))
+
+    @patch('src.tasks.scheduler.record_scheduled_run')
+    @patch('src.tasks.scheduler.enqueue_job', return_value=('job-1', True))
+    @patch('src.tasks.scheduler.get_last_scheduled_run')
+    @patch('src.tasks.scheduler.try_advisory_xact_lock')
+    @patch('src.tasks.scheduler.em_transacao', side_effect=lambda funcao: funcao(Mock()))
+    def test_so_a_lider_enfileira_quando_venceu(self, _, mock_lock, mock_ultima, mock_enqueue, mock_record):
+        from datetime import datetime, timedelta
+        agora = datetime(2025, 1, 2, 3, 0)
+
+        mock_lock.return_value = False
+        self.assertIsNone(scheduler.verificar_agendamento(agora))
+        mock_ultima.assert_not_called()
+
+        mock_lock.return_value = True
+        with patch.object(scheduler.settings, 'REFRESH_INTERVAL_SECONDS', 3600), \
+                patch.object(scheduler.settings, 'REFRESH_CRON', ''):
+            mock_ultima.return_value = agora - timedelta(minutes=30)
+            self.assertIsNone(scheduler.verificar_agendamento(agora))
+            mock_ultima.return_value = agora - timedelta(hours=2)
+            self.assertEqual(scheduler.verificar_agendamento(agora), 'job-1')
+
+        params = mock_enqueue.call_args[0][3]
+        self.assertTrue(params['importar'])
+        mock_record.assert_called_once()
+        self.assertEqual(mock_record.call_args[0][1:], ('refresh', 'job-1'))
+
+        # Scraping manual ativo no mesmo diretório: nada é registrado
+        mock_enqueue.return_value = ('job-manual', False)
+        with patch.object(scheduler.settings, 'REFRESH_INTERVAL_SECONDS', 3600), \
+                patch.object(scheduler.settings, 'REFRESH_CRON', ''):
+            self.assertIsNone(scheduler.verificar_agendamento(agora))
+        mock_record.assert_called_once()
+
+    @patch('src.tasks.jobs.em_transacao', side_effect=lambda funcao, *args: funcao(None, *args))
+    @patch('src.tasks.jobs.record_scheduled_run')
+    @patch('src.tasks.jobs.get_imported_manifest')
+    @patch('src.tasks.jobs.carregar_manifesto', return_value={'http://x/a.csv': {'sha256': 'a1'}})
+    @patch('src.tasks.jobs.registrar_evento')
+    @patch('src.tasks.jobs.importar_e_aquecer', return_value={'importado': True, 'cache_aquecido': 10})
+    def test_importa_quando_manifesto_difere_da_ultima_importacao(self, mock_importar, _, __, mock_importado, mock_record, ___):
+        assinatura = embrapa_scraper.assinatura_manifesto({'http://x/a.csv': {'sha256': 'a1'}})
+
+        mock_importado.return_value = assinatura
+        self.assertEqual(asyncio.run(jobs.importar_se_alterado('job-1', 'saida')), {'importado': False})
+        mock_importar.assert_not_called()
+
+        # Mudança ainda não importada (baixada por outro job ou importação anterior com erro)
+        mock_importado.return_value = 'outra'
+        self.assertTrue(asyncio.run(jobs.importar_se_alterado('job-1', 'saida'))['importado'])
+        mock_importar.assert_called_once_with('job-1')
+        mock_record.assert_called_once_with(None, jobs.IMPORTACAO, 'job-1', assinatura)
+
+        # Importação com erro: a assinatura não é gravada
+        mock_importar.side_effect = RuntimeError('falha')
+        with self.assertRaises(RuntimeError):
+            asyncio.run(jobs.importar_se_alterado('job-2', 'saida'))
+        mock_record.assert_called_once()
+
+
+class TestDownloadCondicional(unittest.TestCase):
+
+    @patch('src.scraper.embrapa_scraper.http_get')
+    def test_download_csv_envia_cabecalhos_e_respeita_304(self, mock_get):
+        url = 'http://fakeurl.com/dados.csv'
+        manifesto = {url: {'etag': '"abc"', 'last_modified': 'Mon, 01 Jan 2024 00:00:00 GMT', 'sha256': 'x'}}
+        mock_get.return_value.status_code = 304
+
+        with tempfile.TemporaryDirectory() as saida:
+            destino = os.path.join(saida, 'dados.csv')
+            alterado = embrapa_scraper.download_csv(url, destino, manifesto=manifesto)
+            self.assertFalse(os.path.exists(destino))
+
+        self.assertFalse(alterado)
+        headers = mock_get.call_args.kwargs['headers']
+        self.assertEqual(headers['If-None-Match'], '"abc"')
+        self.assertEqual(headers['If-Modified-Since'], 'Mon, 01 Jan 2024 00:00:00 GMT')
+
+    @patch('src.scraper.embrapa_scraper.http_get')
+    def test_download_csv_atualiza_manifesto(self, mock_get):
+        url = 'http://fakeurl.com/dados.csv'
+        manifesto = {}
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.content = b'id;produto\n1;Tinto\n'
+        mock_get.return_value.headers = {'ETag': '"v2"'}
+
+        with tempfile.TemporaryDirectory() as saida:
+            destino = os.path.join(saida, 'dados.csv')
+            self.assertTrue(embrapa_scraper.download_csv(url, destino, manifesto=manifesto))
+            self.assertTrue(os.path.exists(destino))
+            # Mesmo conteúdo na segunda chamada: nada é regravado
+            self.assertFalse(embrapa_scraper.download_csv(url, destino, manifesto=manifesto))
+
+        self.assertEqual(manifesto[url]['etag'], '"v2"')
+        self.assertEqual(len(manifesto[url]['sha256']), 64)
+
+    @patch('src.scraper.embrapa_scraper.normalizar_csv', side_effect=ValueError('CSV inválido'))
+    @patch('src.scraper.embrapa_scraper.http_get')
+    def test_processar_tarefa_nao_registra_manifesto_se_falhar(self, mock_get, _):
+        pagina = Mock(text='<a href="dados.csv">DOWNLOAD CSV</a>', content=b'x')
+        csv = Mock(status_code=200, content=b'id;produto\n1;Tinto\n', headers={'ETag': '"v2"'})
+        mock_get.side_effect = [pagina, csv]
+        manifesto = {}
+
+        with tempfile.TemporaryDirectory() as saida:
+            tarefa = embrapa_scraper.montar_tarefas(saida)[0]
+            with self.assertRaises(ValueError):
+                embrapa_scraper.processar_tarefa(tarefa, manifesto=manifesto)
+
+        self.assertEqual(manifesto, {})
+
+
+    @patch('src.scraper.embrapa_scraper.gravar_json')
+    @patch('src.scraper.embrapa_scraper.os.path.getsize', return_value=10)
+    @patch('src.scraper.embrapa_scraper.normalizar_csv')
+    @patch('src.scraper.embrapa_scraper.http_get')
+    def test_processar_tarefa_altera_manifesto_sob_o_lock(self, mock_get, *_):
+        class ManifestoVigiado(dict):
+            # O manifesto é compartilhado pelas threads: toda alteração exige o lock
+            def __setitem__(self, chave, valor):
+                assert embrapa_scraper._manifest_lock.locked()
+                super().__setitem__(chave, valor)
+
+            def pop(self, *args):
+                assert embrapa_scraper._manifest_lock.locked()
+                return super().pop(*args)
+
+        pagina = Mock(text='<a href="dados.csv">DOWNLOAD CSV</a>', content=b'x')
+        csv = Mock(status_code=200, content=b'id;produto\n1;Tinto\n', headers={'ETag': '"v2"'})
+        mock_get.side_effect = [pagina, csv]
+
+        with tempfile.TemporaryDirectory() as saida:
+            tarefa = embrapa_scraper.montar_tarefas(saida)[0]
+            csv_url = urljoin(tarefa['url'], 'dados.csv')
+            # Sem o JSON em disco, a entrada antiga é descartada antes do download
+            manifesto = ManifestoVigiado({csv_url: {'sha256': 'antigo', 'etag': '"v1"'}})
+            self.assertEqual(embrapa_scraper.processar_tarefa(tarefa, manifesto=manifesto), 'atualizado')
+
+        self.assertEqual(manifesto[csv_url]['etag'], '"v2"')
+        self.assertNotIn('If-None-Match', mock_get.call_args.kwargs['headers'])
+
+class TestNormalizacaoCsv(unittest.TestCase):
+
+    def test_normalizar_csv_em_memoria(self):
+        conteudo = (
+            'id;control;produto;1970;1971\n'
+            '1;VINHO DE MESA;VINHO DE MESA;100;200\n'
+            '2;vm_Tinto;Tinto;50;70\n'
+        ).encode('utf-8')
+
+        df = embrapa_scraper.normalizar_csv(conteudo, 'opt_02')
+
+        self.assertListEqual(list(df.columns), ['produto', 'ano', 'Quantidade (L.)'])
+        self.assertEqual(df.to_dict('records')[0], {'produto': 'VINHO DE MESA', 'ano': 1970, 'Quantidade (L.)': 100})
+        self.assertEqual(len(df), 4)
+
+    def test_normalizar_csv_latin1_com_tabulacao(self):
+        conteudo = 'Id\tPaís\t2020\n1\tAlemanha\t800\n'.encode('latin-1')
+
+        df = embrapa_scraper.normalizar_csv(conteudo, 'opt_06')
+
+        self.assertEqual(df.to_dict('records'), [{'País': 'Alemanha', 'ano': 2020, 'Quantidade (Kg)': 800}])
+
+    def test_normalizar_csv_mantem_valor_de_importacao(self):
+        conteudo = (
+            'Id;País;1970;1970;1971;1971\n'
+            '1;Chile;5;7;8;9\n'
+            '2;Peru;0;0;10;25\n'
+        ).encode('utf-8')
+
+        df = embrapa_scraper.normalizar_csv(conteudo, 'opt_05')
+
+        self.assertListEqual(list(df.columns), ['País', 'ano', 'Quantidade (Kg)', 'Valor (US$)'])
+        self.assertEqual(df.to_dict('records'), [
+            {'País': 'Chile', 'ano': 1970, 'Quantidade (Kg)': 5, 'Valor (US$)': 7},
+            {'País': 'Peru', 'ano': 1970, 'Quantidade (Kg)': 0, 'Valor (US$)': 0},
+            {'País': 'Chile', 'ano': 1971, 'Quantidade (Kg)': 8, 'Valor (US$)': 9},
+            {'País': 'Peru', 'ano': 1971, 'Quantidade (Kg)': 10, 'Valor (US$)': 25},
+        ])
+
 if __name__ == '__main__':
     unittest.main()